@@ -1,110 +1,75 @@
 """
 This code ranks the 30 NFL teams by average attention
 It also graphs the top 5 teams
+With --sample P it runs on a fraction P of the tweets and reports
+whether the team ordering holds up at that sample, and with
+--bootstrap N the top 5 curves are shaded with bootstrap bands over games
 Last Modified 10/27/2025 by EK
 """
 
+import argparse
 import pandas as pd
 from datetime import datetime, timedelta
-from data_mountain_query.query import get_ambient_tweets
 from data_mountain_query.connection import get_connection
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ekthesis.games import load_games
+from ekthesis.analyses import team_ranking
+from ekthesis.cache import DEFAULT_CACHE_DIR, TweetCache
+from ekthesis.counts import DEFAULT_PATH, count_matrix_for
+from ekthesis.sampling import sample_path
 import matplotlib.pyplot as plt
 import warnings
 warnings.filterwarnings("ignore", message="use an explicit session with no_cursor_timeout=True")
 
 
-def main():
-    games = pd.read_csv("/Users/elisabethkollrack/Thesis/EK-thesis/games.csv")
+def main(p=1.0, bootstrap=0):
+    games = load_games()
     # Only want regular season
     games = games[games['game_type'] == 'REG']
-    games['gameday'] = pd.to_datetime(games['gameday'], format='%m/%d/%y')
-
-    p = 1.0
-    collection, client = get_connection(p=p)
-
-    # Initialize storage for tweets per team
-    teams_times = {} 
-    teams_games_count = {}  
 
     # 2013-2017
     all_games = games[(games['season'] >= 2013) & (games['season'] <= 2017)]
 
-    # loop through all games
-    for _, row in all_games.iterrows():
-        away = row['away_team']
-        home = row['home_team']
-        gameday = row['gameday']
-        gametime = row['gametime']
-
-        kickoff = pd.to_datetime(str(gameday.date()) + " " + str(gametime))
-        kickoff = kickoff.tz_localize('US/Eastern')
-
-        start_time = kickoff - timedelta(hours=5)
-        end_time = kickoff + timedelta(hours=14)
-        dates = pd.date_range(start_time, end_time, freq='h')
-
-        anchors = [f"#{away}vs{home}", f"#{home}vs{away}"]
-
-        # Collect tweets for both anchors
-        tweets = []
-        for anchor in anchors:
-            tweets.extend([t for t in get_ambient_tweets(anchor, dates, collection)])
-
-        if not tweets:
-            continue
-
-        tweets_df = pd.DataFrame(tweets)
-        tweets_df['tweet_created_at'] = pd.to_datetime(tweets_df['tweet_created_at'], utc=True)
-        tweets_df['tweet_created_at'] = tweets_df['tweet_created_at'].dt.tz_convert('US/Eastern')
-        tweets_df['hour'] = tweets_df['tweet_created_at'].dt.floor('h')
-
-        # Group by hour
-        hourly_counts = tweets_df.groupby('hour').size().reset_index(name='count')
-        hourly_dict = dict(zip(hourly_counts['hour'], hourly_counts['count']))
-
-        # Initialize storage for teams if not exist
-        for team in [away, home]:
-            if team not in teams_times:
-                teams_times[team] = {h: 0 for h in range(-5, 15)}
-                teams_games_count[team] = 0
-
-        # Align tweet counts relative to kickoff
-        for time in range(-5, 15):
-            time_point = kickoff + timedelta(hours=time)
-            count = hourly_dict.get(time_point.floor('h'), 0)
-            teams_times[away][time] += count
-            teams_times[home][time] += count
-
-        # Increment game count
-        teams_games_count[away] += 1
-        teams_games_count[home] += 1
-
-
-    # Compute average tweets per hour per team
-    avg_tweets_per_team = {}
-    for team in teams_times:
-        avg_tweets_per_team[team] = {time: teams_times[team][time] / teams_games_count[team]
-                                     for time in teams_times[team]}
-
-    # Compute overall attention for sorting 
-    team_total_attention = {}
-    for team, counts in avg_tweets_per_team.items():
-        team_total_attention[team] = sum(counts[time] for time in range(-5, 15))
-
-    # Sort teams by total attention
-    sorted_teams = sorted(team_total_attention.items(), key=lambda x: x[1], reverse=True)
+    # Per-game 5-minute counts, built once through the tweet cache and then read from disk
+    # (a sampled run gets a cache and matrix of its own)
+    matrix = count_matrix_for(
+        all_games, lambda: get_connection(p=p)[0], path=sample_path(DEFAULT_PATH, p),
+        query=TweetCache(cache_dir=sample_path(DEFAULT_CACHE_DIR, p)).get_ambient_tweets
+    )
+
+    # Tweets per game per hour, 5h before kickoff to 14h after. Each game's
+    # counts go to both teams: one sparse (teams x games) product gives every
+    # team's average per game with tweets, sorted by its total
+    curves = team_ranking(matrix, all_games.reset_index(drop=True), '1h', '-5h', '15h', sample=p,
+                          bootstrap=bootstrap)
+    avg_tweets_per_team = {team: row.to_dict() for team, row in curves[list(range(-5, 15))].iterrows()}
+    sorted_teams = list(curves['attention'].items())
 
     print("\n=== Teams Ranked by Average Attention (2013–2017) ===")
-    for team, total in sorted_teams:
-        print(f"{team:>10}: {total:.2f}")
-
-    # Plot top 5 teams
+    if p < 1:
+        for team, row in curves.iterrows():
+            print(f"{team:>10}: {row['attention']:.2f} ({row['attention_lo']:.2f}-{row['attention_hi']:.2f}),"
+                  f" rank {row['rank_lo']}-{row['rank_hi']}, above next in {row['holds']:.0%}")
+        stability = curves.attrs['stability']
+        print(f"\nOrdering {'is' if stability['stable'] else 'is NOT'} stable at p={p}: "
+              f"{stability['pairs_holding']} of {stability['pairs']} adjacent pairs hold, "
+              f"median Spearman {stability['spearman_median']:.3f}")
+    else:
+        for team, total in sorted_teams:
+            print(f"{team:>10}: {total:.2f}")
+
+    # Plot top 5 teams (overlapping bands mean the order among them is not settled)
     top_n = 5
+    bands = curves.attrs.get('bands', {})
     plt.figure(figsize=(14,6))
     for team, _ in sorted_teams[:top_n]:
         times = list(avg_tweets_per_team[team].keys())
         counts = list(avg_tweets_per_team[team].values())
-        plt.plot(times, counts, marker='o', label=team)
+        line, = plt.plot(times, counts, marker='o', label=team)
+        if team in bands:
+            plt.fill_between(times, *bands[team], color=line.get_color(), alpha=0.15)
 
     plt.axvline(0, color='red', linestyle='--', linewidth=1.5, label='Kickoff')
     plt.xticks(range(-5, 15), [f"{abs(t)}h before" if t<0 else ("Kickoff" if t==0 else f"{t}h after") for t in range(-5,15)], rotation=45)
@@ -120,4 +85,10 @@ def main():
 
 
 if __name__ == '__main__':
-    avg_per_team, ranked_teams = main()
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sample', type=float, default=1.0, metavar='P',
+                        help='fraction of tweets to sample (default: 1, all)')
+    parser.add_argument('--bootstrap', type=int, default=0, metavar='N',
+                        help='bootstrap replicates for bands around the top teams (default: none)')
+    args = parser.parse_args()
+    avg_per_team, ranked_teams = main(args.sample, args.bootstrap)
@@ -1,89 +1,50 @@
 """
 This code graphs and prints average attention of all NFL games 
 (2013-2017 seasons) per hour relative to kickoff.
+With --bootstrap N the curve is shaded with a 95% band from N
+bootstrap resamples of the games, and with --sample P it runs on a
+fraction P of the tweets, scaled up by 1/P with a 95% interval per hour.
 Last modified: 10/27/2025 by EK
 """
 
 
+import argparse
 import pandas as pd
 from datetime import datetime, timedelta
-from data_mountain_query.query import get_ambient_tweets
 from data_mountain_query.connection import get_connection
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ekthesis.games import load_games
+from ekthesis.analyses import time_windows
+from ekthesis.cache import DEFAULT_CACHE_DIR, TweetCache
+from ekthesis.counts import DEFAULT_PATH, count_matrix_for
+from ekthesis.sampling import sample_path
 import matplotlib.pyplot as plt
 import warnings
 warnings.filterwarnings("ignore", message="use an explicit session with no_cursor_timeout=True")
 
 
 
-def main():
-    games = pd.read_csv("/Users/elisabethkollrack/Thesis/EK-thesis/games.csv")
+def main(p=1.0, bootstrap=0):
+    games = load_games()
     # Only want regular season
     games = games[games['game_type'] == 'REG']
-    games['gameday'] = pd.to_datetime(games['gameday'], format='%m/%d/%y')
 
 
-    p = 1.0
-    collection, client = get_connection(p=p)
-
-    # Initialize storage for 5h before kickoff to 15h after
-    times = {}
-    for time in range(-5, 15):
-        times[time] = 0
-
-    num_games = 0
-
     # 2013-2017
     all_games = games[(games['season'] >= 2013) & (games['season'] <= 2017)]
 
-    # loop through all games in range
-    for _, row in all_games.iterrows():
-        away = row['away_team']
-        home = row['home_team']
-        gameday = row['gameday']
-        gametime = row['gametime']
-
-        kickoff = pd.to_datetime(str(gameday.date()) + " " + str(gametime))
-        kickoff = kickoff.tz_localize('US/Eastern')
-
-        start_time = kickoff - timedelta(hours=5)
-        end_time = kickoff + timedelta(hours=15)
-        dates = pd.date_range(start_time, end_time, freq='h')
-
-        anchors = [f"#{away}vs{home}", f"#{home}vs{away}"]
-
-        # Collect tweets for all hashtag combos
-        tweets = []
-        for anchor in anchors:
-            tweets.extend([t for t in get_ambient_tweets(anchor, dates, collection)])
-
-        # if no tweets are found
-        if not tweets:
-            continue
+    # Per-game 5-minute counts, built once through the tweet cache and then read from disk
+    # (a sampled run gets a cache and matrix of its own)
+    matrix = count_matrix_for(
+        all_games, lambda: get_connection(p=p)[0], path=sample_path(DEFAULT_PATH, p),
+        query=TweetCache(cache_dir=sample_path(DEFAULT_CACHE_DIR, p)).get_ambient_tweets
+    )
 
-        tweets_df = pd.DataFrame(tweets)
-        tweets_df['tweet_created_at'] = pd.to_datetime(tweets_df['tweet_created_at'], utc=True)
-        tweets_df['tweet_created_at'] = tweets_df['tweet_created_at'].dt.tz_convert('US/Eastern')
-        tweets_df['hour'] = tweets_df['tweet_created_at'].dt.floor('h')
-
-
-        # Group by hour
-        hourly_counts = tweets_df.groupby('hour').size().reset_index(name='count')
-        hourly_dict = dict(zip(hourly_counts['hour'], hourly_counts['count']))
-
-        # Align tweet counts relative to kickoff
-        for time in range(-5, 15):
-            time_point = kickoff + timedelta(hours=time)
-            count = hourly_dict.get(time_point.floor('h'), 0)
-            times[time] += count
-
-        num_games += 1
-
-    # Compute average tweets per hour 
-    avg_tweets_hour = {time: times[time] / num_games for time in times}
-
-    # Convert to DataFrame for plotting
-    attention_times = pd.DataFrame(list(avg_tweets_hour.items()), columns=['times', 'avg_tweets'])
-    attention_times = attention_times.sort_values('times')
+    # Average tweets per hour, 5h before kickoff to 15h after, over the games with tweets
+    attention_times = time_windows(matrix, all_games, '1h', '-5h', '15h', sample=p, bootstrap=bootstrap)
+    avg_tweets_hour = dict(zip(attention_times['times'], attention_times['avg_tweets']))
 
     # Print results
     print("\n=== Average Attention Relative to Kickoff (All Games 2013–2017) ===")
@@ -92,15 +53,26 @@ def main():
         if time == 0:
             label = "Kickoff"
         elif time < 0:
-            label = f"{abs(time)}h before"
+            label = f"{abs(time):g}h before"
+        else:
+            label = f"{time:g}h after"
+        if p < 1:
+            row = attention_times.set_index('times').loc[time]
+            print(f"{label:>10} | {avg:.2f} ({row['lo']:.2f}-{row['hi']:.2f})")
         else:
-            label = f"{time}h after"
-        print(f"{label:>10} | {avg:.2f}")
+            print(f"{label:>10} | {avg:.2f}")
 
 
     # Plot the attention curve
     plt.figure(figsize=(10, 6))
     plt.plot(attention_times['times'], attention_times['avg_tweets'], marker='o', color='blue', linewidth=2)
+    if p < 1:
+        plt.fill_between(attention_times['times'], attention_times['lo'], attention_times['hi'],
+                         color='blue', alpha=0.25, label=f'95% interval (p={p:g})')
+    if bootstrap:
+        # Percentile band of the average over games resampled with replacement
+        plt.fill_between(attention_times['times'], attention_times['band_lo'], attention_times['band_hi'],
+                         color='blue', alpha=0.15, label='95% bootstrap band')
 
     plt.axvline(0, color='red', linestyle='--', linewidth=1.5, label='Kickoff')
     plt.axvline(3.2, color='red', linestyle='--', linewidth=1.5, label='Avg. Game End Time')
@@ -116,4 +88,10 @@ def main():
 
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sample', type=float, default=1.0, metavar='P',
+                        help='fraction of tweets to sample (default: 1, all)')
+    parser.add_argument('--bootstrap', type=int, default=0, metavar='N',
+                        help='bootstrap replicates for a band around the curve (default: none)')
+    args = parser.parse_args()
+    main(args.sample, args.bootstrap)
@@ -1,89 +1,50 @@
 """
 This code graphs and prints average attention of all NFL games 
 (2013-2017 seasons) per half hour relative to kickoff.
+With --sample P it runs on a fraction P of the tweets, scaled up by 1/P
+with a 95% interval per half hour.
 Last modified: 10/15/2025 by EK
 """
 
+import argparse
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-from data_mountain_query.query import get_ambient_tweets
 from data_mountain_query.connection import get_connection
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ekthesis.games import load_games
+from ekthesis.analyses import time_windows
+from ekthesis.cache import DEFAULT_CACHE_DIR, TweetCache
+from ekthesis.counts import DEFAULT_PATH, count_matrix_for
+from ekthesis.sampling import sample_path
 import matplotlib.pyplot as plt
 import warnings
 warnings.filterwarnings("ignore", message="use an explicit session with no_cursor_timeout=True")
 
 
-def main():
-    games = pd.read_csv("/Users/elisabethkollrack/Thesis/EK-thesis/games.csv")
+def main(p=1.0):
+    games = load_games()
     
     # Only want regular season
     games = games[games['game_type'] == 'REG']
-    games['gameday'] = pd.to_datetime(games['gameday'], format='%m/%d/%y')
-
-    p = 1.0
-    collection, client = get_connection(p=p)
-
-    # Initialize 30-minute bins from 5 hours before to 15 hours after kickoff
-    times = {t: 0 for t in np.arange(-5, 15, 0.5)}
-    num_games = 0
 
     # 2013-2017
     all_games = games[(games['season'] >= 2013) & (games['season'] <= 2017)]
 
-    # loop through all games in range
-    for _, row in all_games.iterrows():
-        away = row['away_team']
-        home = row['home_team']
-        gameday = row['gameday']
-        gametime = row['gametime']
-
-        # Localize kickoff as EST (DST-aware)
-        kickoff = pd.to_datetime(str(gameday.date()) + " " + str(gametime))
-        kickoff = kickoff.tz_localize('US/Eastern')
-
-        start_time = kickoff - timedelta(hours=5)
-        end_time = kickoff + timedelta(hours=15)
-        dates = pd.date_range(start_time, end_time, freq='30min')
-
-        anchors = [f"#{away}vs{home}", f"#{home}vs{away}"]
-
-        # Collect tweets for all hashtag combos
-        tweets = []
-        for anchor in anchors:
-            tweets.extend([t for t in get_ambient_tweets(anchor, dates, collection)])
-
-        # if no tweets are found, skip this game
-        if not tweets:
-            continue
+    # Per-game 5-minute counts, built once through the tweet cache and then read from disk
+    # (a sampled run gets a cache and matrix of its own)
+    matrix = count_matrix_for(
+        all_games, lambda: get_connection(p=p)[0], path=sample_path(DEFAULT_PATH, p),
+        query=TweetCache(cache_dir=sample_path(DEFAULT_CACHE_DIR, p)).get_ambient_tweets
+    )
 
-        tweets_df = pd.DataFrame(tweets)
 
-        # Convert tweet timestamps from GMT/UTC to EST with DST handling
-        tweets_df['tweet_created_at'] = pd.to_datetime(tweets_df['tweet_created_at'], utc=True)
-        tweets_df['tweet_created_at'] = tweets_df['tweet_created_at'].dt.tz_convert('US/Eastern')
-
-        # Bin into 30-minute intervals
-        tweets_df['time_bin'] = tweets_df['tweet_created_at'].dt.floor('30min')
-
-        # Group by 30-minute interval
-        half_hour_counts = tweets_df.groupby('time_bin').size().reset_index(name='count')
-        count_dict = dict(zip(half_hour_counts['time_bin'], half_hour_counts['count']))
-
-        # Align counts relative to kickoff
-        for t in times.keys():
-            time_point = kickoff + timedelta(hours=t)
-            count = count_dict.get(time_point.floor('30min'), 0)
-            times[t] += count
-
-        num_games += 1
-
-    # Compute average attention per half hour
-    avg_tweets_half_hour = {t: times[t] / num_games for t in times}
-
-    # Convert to DataFrame for plotting
-    attention_times = pd.DataFrame(list(avg_tweets_half_hour.items()), columns=['times', 'avg_tweets'])
-    attention_times = attention_times.sort_values('times')
+    # Average attention per half hour from 5 hours before to 15 hours after kickoff,
+    # over the games with tweets
+    attention_times = time_windows(matrix, all_games, '30min', '-5h', '15h', sample=p)
+    avg_tweets_half_hour = dict(zip(attention_times['times'], attention_times['avg_tweets']))
 
     # Print results
     print("\n=== Average Attention Relative to Kickoff (All Games 2013–2017, 30-minute intervals) ===")
@@ -95,11 +56,18 @@ def main():
             label = f"{abs(time)}h before"
         else:
             label = f"{time}h after"
-        print(f"{label:>10} | {avg:.2f}")
+        if p < 1:
+            row = attention_times.set_index('times').loc[time]
+            print(f"{label:>10} | {avg:.2f} ({row['lo']:.2f}-{row['hi']:.2f})")
+        else:
+            print(f"{label:>10} | {avg:.2f}")
 
     # Plot the attention curve
     plt.figure(figsize=(10, 6))
     plt.plot(attention_times['times'], attention_times['avg_tweets'], marker='o', linewidth=2)
+    if p < 1:
+        plt.fill_between(attention_times['times'], attention_times['lo'], attention_times['hi'],
+                         alpha=0.25, label=f'95% interval (p={p:g})')
 
     plt.axvline(0, linestyle='--', linewidth=1.5, label='Kickoff')
     plt.title("Average Attention Around Kickoff (2013–2017, 30-minute intervals)")
@@ -114,4 +82,7 @@ def main():
 
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sample', type=float, default=1.0, metavar='P',
+                        help='fraction of tweets to sample (default: 1, all)')
+    main(parser.parse_args().sample)
@@ -1,85 +1,65 @@
 """
 This code graphs the weekly attention year over year for each season
+With --sample P it runs on a fraction P of the tweets, scaled up by 1/P
+with a 95% interval per week and per season total
 Last modified 10/15 by EK
 """
 
+import argparse
 import pandas as pd
-from datetime import timedelta
-from data_mountain_query.query import get_ambient_tweets
 from data_mountain_query.connection import get_connection
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ekthesis.games import load_games
+from ekthesis.cache import DEFAULT_CACHE_DIR, TweetCache
+from ekthesis.counts import DEFAULT_PATH, count_matrix_for
+from ekthesis.analyses import weekly
+from ekthesis.sampling import poisson_interval, sample_path
 import matplotlib.pyplot as plt
 import time
 
-def main():
+def main(p=1.0):
     start_time = time.time()
     
     # Load games
-    games = pd.read_csv("/Users/elisabethkollrack/Thesis/EK-thesis/games.csv")
+    games = load_games()
     games = games[games['game_type'] == 'REG']
-    games['gameday'] = pd.to_datetime(games['gameday'], format='%m/%d/%y')
 
-    total_counts_all = {}  # {season: {week: attention}}
+    all_games = games[games['season'].between(2013, 2017)]
 
-    p = 1.0
-    collection, client = get_connection(p=p)
+    # Per-game 5-minute counts, built once through the tweet cache and then read from disk
+    # (a sampled run gets a cache and matrix of its own)
+    matrix = count_matrix_for(
+        all_games, lambda: get_connection(p=p)[0], path=sample_path(DEFAULT_PATH, p),
+        query=TweetCache(cache_dir=sample_path(DEFAULT_CACHE_DIR, p)).get_ambient_tweets
+    )
 
-    # Loop over each season 2013–2017
-    for season in range(2013, 2018):
-        games_season = games[games['season'] == season]
-        total_counts = {}  # {week: attention}
-
-        # Unique matchups (order-insensitive)
-        games_season['matchup_key'] = games_season.apply(
-            lambda r: "_vs_".join(sorted([r['away_team'], r['home_team']])), axis=1
-        )
-        matchups = games_season['matchup_key'].unique()
-
-        for matchup in matchups:
-            teams = matchup.split("_vs_")
-            team1, team2 = teams[0], teams[1]
-
-            games_filtered = games_season[
-                ((games_season['away_team'] == team1) & (games_season['home_team'] == team2)) |
-                ((games_season['away_team'] == team2) & (games_season['home_team'] == team1))
-            ][['gameday', 'week']]
-
-            if games_filtered.empty:
-                continue
-
-            anchors = [f"#{team1}vs{team2}", f"#{team2}vs{team1}"]
-
-            start_date = games_filtered['gameday'].min() - timedelta(days=7)
-            end_date = games_filtered['gameday'].max() + timedelta(days=7)
-            dates = pd.date_range(start_date, end_date, freq='D')
-
-            counts = {}
-            for anchor in anchors:
-                tweets_list = [t for t in get_ambient_tweets(anchor, dates, collection)]
-                for tweet in tweets_list:
-                    tweet_day = pd.to_datetime(tweet['tweet_created_at']).date()
-                    counts[tweet_day] = counts.get(tweet_day, 0) + 1
-
-            # Aggregate attention by week
-            for _, row in games_filtered.iterrows():
-                gameday = row["gameday"].date()
-                week = row['week']
-                for d in range(-7, 8):
-                    day = gameday + timedelta(days=d)
-                    total_counts[week] = total_counts.get(week, 0) + counts.get(day, 0)
-
-        total_counts_all[season] = total_counts
+    # Days -7..+7 of every game, summed per season and week
+    # (sampled, scaled up by 1/p with lo/hi per week)
+    result = weekly(matrix, all_games, days=7, sample=p)
+    table = result['attention'].unstack('week') if p < 1 else result
+    total_counts_all = {season: row.dropna().round().astype(int).to_dict()  # {season: {week: attention}}
+                        for season, row in table.iterrows()}
 
     # Print total tweets per season
     print("Total tweets per season:")
     for season, counts in total_counts_all.items():
         total_tweets = sum(counts.values())
-        print(f"{season}: {total_tweets}")
+        if p < 1:
+            lo, hi = poisson_interval(table.loc[season].sum() * p, p)
+            print(f"{season}: {total_tweets} ({lo:.0f}-{hi:.0f})")
+        else:
+            print(f"{season}: {total_tweets}")
 
     # Plot line graph
     plt.figure(figsize=(12, 6))
     for season, counts in total_counts_all.items():
         df_season = pd.DataFrame(list(counts.items()), columns=['week', 'attention']).sort_values('week')
-        plt.plot(df_season['week'], df_season['attention'], marker='o', linestyle='-', label=f'{season}')
+        line, = plt.plot(df_season['week'], df_season['attention'], marker='o', linestyle='-', label=f'{season}')
+        if p < 1:
+            bounds = result.loc[season]
+            plt.fill_between(bounds.index, bounds['lo'], bounds['hi'], color=line.get_color(), alpha=0.2)
 
     plt.title('Weekly Attention by Season (2013–2017)')
     plt.xlabel('Week')
@@ -98,5 +78,8 @@ def main():
     return total_counts_all
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sample', type=float, default=1.0, metavar='P',
+                        help='fraction of tweets to sample (default: 1, all)')
+    main(parser.parse_args().sample)
 
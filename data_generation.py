@@ -4,65 +4,46 @@ and game result data will be used to predict attention
 Last updated 1/15 by EK
 """
 
+import argparse
+import numpy as np
 import pandas as pd
 from datetime import timedelta
-from data_mountain_query.query import get_ambient_tweets
 from data_mountain_query.connection import get_connection
+from ekthesis import trace
+from ekthesis.aggregate import get_ambient_counts
+from ekthesis.games import COLUMNS, load_games
+from ekthesis.fetch import count_game_tweets, to_utc
+from ekthesis.incremental import load_output, row_hashes, stale_keys, write_checkpoint
+from ekthesis.winpct import load_pbp, win_pct_table
 import time
 
+OUTPUT_PATH = "/Users/elisabethkollrack/Thesis/EK-thesis/game_attention.csv"
+WIN_PCT_PATH = "/Users/elisabethkollrack/Thesis/EK-Thesis/R data/nfl_r_data.csv"
 
-def main():
-    start_time = time.time()
-    
-    # Load games
-    games = pd.read_csv("/Users/elisabethkollrack/Thesis/EK-thesis/games.csv")
-    games['gameday'] = pd.to_datetime(games['gameday'], format='%m/%d/%y')
-    
-    # Load cumulative win percentages
-    win_pct = pd.read_csv('/Users/elisabethkollrack/Thesis/EK-Thesis/R data/nfl_r_data.csv')
-    
-    # Merge win_pct into games on 'game_id'
-    games = games.merge(
-        win_pct[['game_id', 'home_win_pct', 'away_win_pct', 'lead_changes']],
-        on='game_id',
-        how='left'
-    )
-
-    p = 1.0
-    collection, client = get_connection(user_loc=True)
+# nfl_r_data.csv columns that end up in the output
+WIN_PCT_COLUMNS = ['home_win_pct', 'away_win_pct', 'lead_changes']
 
-    data_rows = []  # store data for final DataFrame
 
-    # Loop over each season 2013–2017
-    for season in range(2010, 2015):
-        # Filter the games for that season
-        games_season = games[games['season'] == season]
+def game_rows(games_chunk, collection, workers=1, max_in_flight=None, count_query=None):
+    """One output row per game in `games_chunk`"""
+    # One query per anchor for the whole chunk, split back to games.
+    # Window ends after day +3 so every counted day is complete
+    day_counts = count_game_tweets(
+        games_chunk, collection,
+        before=timedelta(days=3), after=timedelta(days=4),
+        count_query=count_query, workers=workers, max_in_flight=max_in_flight
+    ).to_dict()
 
-        # Unique matchups (order-insensitive)
-        games_season['matchup_key'] = games_season.apply(
-            lambda r: "_vs_".join(sorted([r['away_team'], r['home_team']])), axis=1
-        )
-
-        for _, row in games_season.iterrows():
-            team1, team2 = row['away_team'], row['home_team']
+    data_rows = []
+    with trace.section('aggregate'):
+        for _, row in games_chunk.iterrows():
             gameday = row['gameday']
             total_score = row['total']
             score_diff = row['result']
 
-            anchors = [f"#{team1}vs{team2}", f"#{team2}vs{team1}"]
-            start_date = gameday - timedelta(days=3)
-            end_date = gameday + timedelta(days=3)
-            dates = pd.date_range(start_date, end_date, freq='D')
-
-            counts = {}
-            for anchor in anchors:
-                tweets_list = [t for t in get_ambient_tweets(anchor, dates, collection)]
-                for tweet in tweets_list:
-                    tweet_day = pd.to_datetime(tweet['tweet_created_at']).date()
-                    counts[tweet_day] = counts.get(tweet_day, 0) + 1
-
             # total attention for this game (sum over the ±3 days)
-            attention = sum(counts.get((gameday + timedelta(days=d)).date(), 0) for d in range(-3, 4))
+            attention = sum(day_counts.get((row['game_id'], to_utc(gameday + timedelta(days=d))), 0)
+                            for d in range(-3, 4))
 
             data_rows.append({
                 'date': gameday.date(),
@@ -81,13 +62,71 @@ def main():
                 'overtime': int(row['overtime']),
                 'attention': attention
             })
+    return data_rows
+
 
-    # Create final DataFrame
-    df = pd.DataFrame(data_rows)
+def main(seasons=range(2010, 2015), incremental=False, output_path=OUTPUT_PATH,
+         workers=1, max_in_flight=None, server_counts=False, pbp_path=None,
+         win_pct_path=WIN_PCT_PATH):
+    start_time = time.time()
+    
+    # Load games
+    games = load_games()
+    
+    # Cumulative win percentages and lead changes: computed from local
+    # play-by-play when given, otherwise the output of R data/data_nfl.R
+    if pbp_path is not None:
+        win_pct = win_pct_table(games[games['season'].isin(list(seasons))],
+                                load_pbp(pbp_path, seasons))
+    else:
+        win_pct = pd.read_csv(win_pct_path)
     
-    # Save to CSV
-    output_path = "/Users/elisabethkollrack/Thesis/EK-thesis/game_attention.csv"
-    df.to_csv(output_path, index=False)
+    # Merge win_pct into games on 'game_id'
+    games = games.merge(
+        win_pct[['game_id'] + WIN_PCT_COLUMNS],
+        on='game_id',
+        how='left'
+    )
+    # Output rows follow the order of games.csv
+    order = pd.Index(games['game_id'])
+
+    games_seasons = games[games['season'].isin(list(seasons))]
+    hashes = row_hashes(games_seasons, COLUMNS + WIN_PCT_COLUMNS)
+
+    if incremental:
+        # Keep finished games whose inputs haven't changed, recompute the rest
+        df, saved = load_output(output_path)
+        todo = stale_keys(hashes, df, saved)
+        if len(df):
+            df = df[order.get_indexer(df['game_id']) >= 0]
+            df = df[~df['game_id'].isin(todo)]
+        saved = saved[saved.index.isin(df['game_id'])] if len(df) else saved.iloc[:0]
+    else:
+        df, saved = pd.DataFrame(), hashes.iloc[:0]
+        todo = hashes.index
+    print(f"{len(todo)} of {len(games_seasons)} games to process")
+
+    p = 1.0
+    collection, client = get_connection(user_loc=True)
+
+    # Checkpoint after every season, the block count_game_tweets batches
+    # anchors over, so a crash only loses the season in progress
+    pending = games_seasons[games_seasons['game_id'].isin(todo)]
+    for season, games_season in pending.groupby('season', sort=True):
+        data_rows = game_rows(games_season, collection, workers=workers, max_in_flight=max_in_flight,
+                              count_query=get_ambient_counts if server_counts else None)
+
+        df = pd.concat([df, pd.DataFrame(data_rows)], ignore_index=True)
+        df = df.iloc[np.argsort(order.get_indexer(df['game_id']), kind='stable')]
+        saved = pd.concat([saved, hashes[games_season['game_id']]])
+        write_checkpoint(output_path, df, saved)
+        print(f"Season {season}: {len(data_rows)} games saved")
+
+    # Nothing was stale, still record the hashes of the current inputs
+    if not len(pending) and len(df):
+        write_checkpoint(output_path, df, saved)
+
+    df = df.reset_index(drop=True)
     
     print(df.head())  # preview
     print(f"\nSaved to: {output_path}")
@@ -100,4 +139,25 @@ def main():
     return df
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--workers', type=int, default=1,
+                        help='threads fetching from the tweet store (1 = serial)')
+    parser.add_argument('--max-in-flight', type=int, default=None,
+                        help='most queries open at once (defaults to --workers)')
+    parser.add_argument('--seasons', type=int, nargs='+', default=list(range(2010, 2015)),
+                        help='seasons to include in the output')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only process games missing from the output or whose inputs changed')
+    parser.add_argument('--output', default=OUTPUT_PATH,
+                        help='where to write game_attention.csv')
+    parser.add_argument('--server-counts', action='store_true',
+                        help='count tweets per day in the store instead of downloading them')
+    parser.add_argument('--pbp', default=None,
+                        help='play-by-play Parquet file to compute win percentages and lead '
+                             'changes from, instead of reading nfl_r_data.csv')
+    trace.add_argument(parser)
+    args = parser.parse_args()
+    trace.enable_from(args.trace)
+    main(seasons=args.seasons, incremental=args.incremental, output_path=args.output,
+         workers=args.workers, max_in_flight=args.max_in_flight,
+         server_counts=args.server_counts, pbp_path=args.pbp)
@@ -0,0 +1,12 @@
+"""
+Shared helpers for the thesis scripts: fetching tweets around games,
+binning them relative to kickoff and aggregating attention.
+"""
+
+import os
+
+# Repository root, used for default paths to the data files
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Derived files (parsed games, feature matrices, ...) that can be rebuilt at any time
+CACHE_DIR = os.environ.get('EKTHESIS_DATA_CACHE', os.path.join(REPO_ROOT, '.cache'))
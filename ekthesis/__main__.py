@@ -0,0 +1,127 @@
+"""
+Run game attention analyses from one fetch.
+
+    python -m ekthesis list
+    python -m ekthesis run time-windows --bin 30min --seasons 2013-2017
+    python -m ekthesis run time-windows ranking weekly percentages --output results --plot
+    python -m ekthesis run ranking --sample 0.05
+
+Every analysis named after `run` reads the same count matrix, built
+through the tweet cache on the first run and read from disk after that.
+Results are printed, and with --output also written as <analysis>.csv
+(and <analysis>.png with --plot). With --sample P the analyses run on a
+fraction P of the tweets, scaled up and with confidence intervals, and
+with --bootstrap N the curves get bands from N resamples of the games.
+"""
+
+import argparse
+import os
+
+from ekthesis import trace
+from ekthesis.analyses import ANALYSES, SEASONS, run
+from ekthesis.counts import DEFAULT_PATH
+from ekthesis.ranking import GROUPINGS
+
+
+def parse_seasons(values):
+    """Seasons from arguments like 2013-2017 or 2013 2015"""
+    seasons = []
+    for value in values:
+        first, _, last = value.partition('-')
+        seasons.extend(range(int(first), int(last or first) + 1))
+    return sorted(set(seasons))
+
+
+def print_stability(summary):
+    verdict = 'stable' if summary['stable'] else 'not stable'
+    print(f"\nOrdering is {verdict} at this sample: {summary['pairs_holding']} of "
+          f"{summary['pairs']} adjacent pairs hold, median Spearman "
+          f"{summary['spearman_median']:.3f}")
+
+
+def plot(name, result, output):
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(12, 6))
+    ANALYSES[name].plot(result, ax)
+    fig.tight_layout()
+    if output is None:
+        plt.show()
+    else:
+        fig.savefig(os.path.join(output, f'{name}.png'))
+    plt.close(fig)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m ekthesis', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('list', help='list the registered analyses')
+
+    run_parser = commands.add_parser('run', help='run analyses from one fetch')
+    run_parser.add_argument('analyses', nargs='+', choices=sorted(ANALYSES), metavar='analysis',
+                            help=f"analyses to run: {', '.join(sorted(ANALYSES))}")
+    run_parser.add_argument('--seasons', nargs='+', default=[f'{SEASONS[0]}-{SEASONS[-1]}'],
+                            help='seasons, as ranges (2013-2017) or single years')
+    run_parser.add_argument('--game-type', default='REG',
+                            help="game_type to keep, or 'all' (default: REG)")
+    run_parser.add_argument('--bin', dest='width', default=None,
+                            help='bin width around kickoff, a multiple of 5min (default: 1h)')
+    run_parser.add_argument('--start', default=None, help='first offset from kickoff (default: -5h)')
+    run_parser.add_argument('--stop', default=None, help='end offset from kickoff (default: 15h)')
+    run_parser.add_argument('--by', nargs='+', default=None, choices=sorted(GROUPINGS),
+                            help='groups ranked by ranking, combined when several (default: team)')
+    run_parser.add_argument('--days', type=int, default=None,
+                            help='days either side of gameday for weekly (default: 7)')
+    run_parser.add_argument('--output', default=None, help='directory to write results to')
+    run_parser.add_argument('--plot', action='store_true',
+                            help='plot results that have a plot (saved to --output if given)')
+    run_parser.add_argument('--matrix', default=None,
+                            help=f'count matrix file (default: {os.path.basename(DEFAULT_PATH)}, '
+                                 'or one inside the archive with --archive)')
+    run_parser.add_argument('--archive', default=None, metavar='PATH',
+                            help='read tweets from a tweet archive instead of the store '
+                                 '(see ekthesis.archive); not with --sample')
+    run_parser.add_argument('--workers', type=int, default=1,
+                            help='threads fetching when the count matrix is built')
+    run_parser.add_argument('--sample', type=float, default=1.0, metavar='P',
+                            help='fraction of tweets to sample, e.g. 0.05 (default: 1, all)')
+    run_parser.add_argument('--bootstrap', type=int, default=None, metavar='N',
+                            help='bootstrap replicates for confidence bands of the curves over '
+                                 'games (time-windows, ranking)')
+    trace.add_argument(run_parser)
+    args = parser.parse_args(argv)
+
+    if args.command == 'list':
+        for name in sorted(ANALYSES):
+            print(f"{name:14s} {ANALYSES[name].help}")
+        return None
+
+    trace.enable_from(args.trace)
+    if not 0 < args.sample <= 1:
+        parser.error('--sample must be in (0, 1]')
+    if args.archive is not None and args.sample < 1:
+        parser.error('--archive holds every tweet and cannot be combined with --sample')
+    if args.output is not None:
+        os.makedirs(args.output, exist_ok=True)
+
+    results = run(args.analyses, seasons=parse_seasons(args.seasons),
+                  game_type=None if args.game_type == 'all' else args.game_type,
+                  matrix_path=args.matrix, workers=args.workers, sample=args.sample,
+                  archive=args.archive,
+                  width=args.width, start=args.start, stop=args.stop, days=args.days, by=args.by,
+                  bootstrap=args.bootstrap)
+    for name, result in results.items():
+        print(f"\n=== {name} ===")
+        print(result.to_string())
+        if 'stability' in result.attrs:
+            print_stability(result.attrs['stability'])
+        if args.output is not None:
+            result.to_csv(os.path.join(args.output, f'{name}.csv'))
+        if args.plot and ANALYSES[name].plot is not None:
+            plot(name, result, args.output)
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Server-side tweet counts.
+
+get_ambient_counts is a stand-in for get_ambient_tweets for workloads
+that only count tweets: it runs an aggregation pipeline on the tweet
+collection that matches the anchor and time range and groups by the
+timestamp truncated to a day or hour, so only (bucket, count) pairs come
+back over the wire instead of every document.
+
+Pass it to count_game_tweets as `count_query`.
+
+The $match stage uses the same filter get_ambient_tweets sends: a
+case-insensitive $text phrase search for the anchor, the time range and
+fastText_lang. Collections without a text index (e.g. mongomock) can
+match a regex on `anchor_field` instead, also settable with
+EKTHESIS_ANCHOR_FIELD.
+"""
+
+import os
+import re
+
+import pandas as pd
+
+from ekthesis.fetch import to_utc
+
+ANCHOR_FIELD = os.environ.get('EKTHESIS_ANCHOR_FIELD')
+
+# $dateToString format of the bucket for each period
+BUCKET_FORMATS = {
+    'D': '%Y-%m-%d',
+    'h': '%Y-%m-%dT%H',
+}
+
+
+def naive_utc(value):
+    """Timestamp as a naive UTC datetime, the way the store keeps dates"""
+    return to_utc(value).tz_localize(None).to_pydatetime()
+
+
+def anchor_filter(anchor, anchor_field=ANCHOR_FIELD, case_sensitive=False):
+    """Anchor part of the $match stage"""
+    if anchor_field is None:
+        return {'$text': {'$search': f'"{anchor}"', '$caseSensitive': case_sensitive}}
+    return {anchor_field: re.compile(re.escape(anchor), 0 if case_sensitive else re.IGNORECASE)}
+
+
+def count_pipeline(anchor, start, end, period='D', lang='en', anchor_field=ANCHOR_FIELD,
+                   case_sensitive=False):
+    """Aggregation pipeline counting `anchor` tweets in [start, end) per period"""
+    if period not in BUCKET_FORMATS:
+        raise ValueError(f"Unknown period: {period!r}")
+    match = anchor_filter(anchor, anchor_field, case_sensitive)
+    match['tweet_created_at'] = {'$gte': naive_utc(start), '$lt': naive_utc(end)}
+    if lang is not None:
+        match['fastText_lang'] = lang
+    return [
+        {'$match': match},
+        {'$group': {
+            '_id': {'$dateToString': {'format': BUCKET_FORMATS[period],
+                                      'date': '$tweet_created_at'}},
+            'count': {'$sum': 1},
+        }},
+        {'$sort': {'_id': 1}},
+    ]
+
+
+def get_ambient_counts(anchor, dates, collection, period='D', lang='en',
+                       anchor_field=ANCHOR_FIELD, case_sensitive=False):
+    """
+    Tweet counts for `anchor` in [dates[0], dates[-1]) as (bucket, count)
+    pairs, where bucket is the UTC start of the day or hour.
+    """
+    pipeline = count_pipeline(anchor, dates[0], dates[-1], period=period, lang=lang,
+                              anchor_field=anchor_field, case_sensitive=case_sensitive)
+    for doc in collection.aggregate(pipeline):
+        yield pd.to_datetime(doc['_id'], format=BUCKET_FORMATS[period], utc=True), doc['count']
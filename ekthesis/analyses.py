@@ -0,0 +1,362 @@
+"""
+Game attention analyses that share one fetch.
+
+The graph scripts each loaded games.csv, picked regular season
+2013-2017, opened a connection and read the count matrix. Here the
+analyses are registered by name and `run` does that part once: it
+selects the games, builds or loads the 5-minute count matrix (the only
+step that touches the tweet store, through the tweet cache), and hands
+the same matrix to every analysis asked for. Each analysis is then a
+slice of the matrix:
+
+- time-windows: average tweets per bin around kickoff (time_windows.py,
+  time_windows_30min.py)
+- ranking: teams, or other groups of games, ranked by average attention
+  per game around kickoff (ranking_attention.py)
+- weekly: season x week attention over gameday ±`days` calendar days
+  (average_att.py, weekly_att_2013_2017.py)
+- percentages: share of the ±7 day tweets in shorter windows around
+  kickoff (percentages.py)
+
+Register another with @analysis(name); it is called with the count
+matrix, the selected games and whichever of run's options it takes as
+keyword arguments. Run them with `python -m ekthesis run`.
+
+With sample=p < 1 the matrix is built from a fraction p of the tweets
+(see ekthesis.sampling), which is much quicker to fetch for a first
+look. Counts are then scaled up by 1/p, every estimate gets lo/hi
+bounds, and the ranking reports whether its ordering holds up.
+
+With bootstrap=n the curves of time-windows and ranking also get
+percentile bands from n bootstrap resamples of the games (see
+ekthesis.bootstrap), so that how far apart two curves are can be read
+against how much they would move with other games.
+"""
+
+import inspect
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from ekthesis.binning import bin_offsets
+from ekthesis.bootstrap import bands
+from ekthesis.counts import DEFAULT_PATH, count_matrix_for
+from ekthesis.games import load_games
+from ekthesis.ranking import group_curves, incidence
+from ekthesis.sampling import (percentile_interval, poisson_interval, rank_stability, replicates,
+                               sample_path)
+from ekthesis.weekly import weekly_attention
+
+SEASONS = range(2013, 2018)
+
+# Windows of the percentages analysis, as [start, stop) hours from kickoff
+PERCENTAGE_WINDOWS = {
+    '-5h to 24h': (-5, 25),
+    '-3h to 14h': (-3, 15),
+    '±72h': (-72, 73),
+    '±7 days': (-168, 169),
+    '±14 days': (-336, 337),
+}
+PERCENTAGE_BASE = '±7 days'
+
+ANALYSES = {}
+
+
+class Analysis:
+    """A registered analysis and, optionally, how to plot its result"""
+
+    def __init__(self, name, func, plot=None):
+        self.name = name
+        self.func = func
+        self.plot = plot
+        self.help = inspect.getdoc(func).split('\n')[0].rstrip('.')
+
+    def __call__(self, matrix, games, **options):
+        """Run on `matrix` and `games` with the options the function takes; None means default"""
+        accepted = inspect.signature(self.func).parameters
+        kwargs = {k: v for k, v in options.items() if k in accepted and v is not None}
+        return self.func(matrix, games, **kwargs)
+
+
+def analysis(name, plot=None):
+    """Register the decorated function as analysis `name`"""
+    def register(func):
+        ANALYSES[name] = Analysis(name, func, plot)
+        return func
+    return register
+
+
+def select_games(seasons=SEASONS, game_type='REG', games=None):
+    """Games of `seasons` and `game_type` (None for every type)"""
+    if games is None:
+        games = load_games()
+    games = games[games['season'].isin(list(seasons))]
+    if game_type is not None:
+        games = games[games['game_type'] == game_type]
+    return games.reset_index(drop=True)
+
+
+def sampled_games(matrix, games):
+    """
+    Which `games` have tweets anywhere in `matrix`. A sampled game can
+    have none in a short window by chance, so it is judged on its whole row.
+    """
+    rows = matrix.rows(games['game_id'])
+    has_tweets = np.zeros(len(rows), dtype=bool)
+    found = rows >= 0
+    has_tweets[found] = matrix.counts[rows[found]].sum(axis=1) > 0
+    return has_tweets
+
+
+def active_groups(games, by, has_tweets):
+    """Incidence matrix and labels of the groups under `by` that have a game with tweets"""
+    groups, labels = incidence(games, by)
+    groups = groups @ sparse.diags(has_tweets.astype(np.float64))
+    n_games = np.asarray(groups.sum(axis=1)).ravel()
+    keep = n_games > 0
+    return groups[keep], labels[keep], n_games[keep]
+
+
+def hour_labels(offsets):
+    return [f"{abs(t):g}h before" if t < 0 else ("Kickoff" if t == 0 else f"{t:g}h after")
+            for t in offsets]
+
+
+def plot_curve(result, ax):
+    ax.plot(result['times'], result['avg_tweets'], marker='o', color='blue', linewidth=2)
+    if 'lo' in result:
+        ax.fill_between(result['times'], result['lo'], result['hi'], color='blue', alpha=0.2)
+    if 'band_lo' in result:
+        ax.fill_between(result['times'], result['band_lo'], result['band_hi'], color='blue',
+                        alpha=0.15, label='Bootstrap band')
+    ax.axvline(0, color='red', linestyle='--', linewidth=1.5, label='Kickoff')
+    ax.set_xlabel("Hours Relative to Kickoff")
+    ax.set_ylabel("Average Tweets per Bin")
+    ax.set_title("Average Attention Around Kickoff")
+    ax.grid(True, linestyle='--', alpha=0.6)
+    ax.legend()
+
+
+@analysis('time-windows', plot=plot_curve)
+def time_windows(matrix, games, width='1h', start='-5h', stop='15h', sample=1.0, bootstrap=0):
+    """
+    Average tweets per `width` bin from `start` to `stop` around kickoff, over games with tweets.
+
+    With `bootstrap` replicates, band_lo/band_hi is the percentile band over resampled games.
+    """
+    counts = matrix.curve(width, start, stop, game_ids=games['game_id'])
+    if sample >= 1:
+        has_tweets = counts.sum(axis=1) > 0
+    else:
+        has_tweets = sampled_games(matrix, games)
+    n_games = has_tweets.sum()
+    sums = counts[has_tweets].sum(axis=0)
+
+    result = pd.DataFrame({
+        'times': bin_offsets(width, start, stop),
+        'avg_tweets': sums / sample / n_games,
+    })
+    if sample < 1:
+        lo, hi = poisson_interval(sums, sample)
+        result['lo'], result['hi'] = lo / n_games, hi / n_games
+    if bootstrap:
+        (band_lo, band_hi), _ = bands(counts[has_tweets] / sample, n=bootstrap)
+        result['band_lo'], result['band_hi'] = band_lo[0], band_hi[0]
+    return result
+
+
+def plot_ranking(result, ax, top=5):
+    curves = result.loc[:, [column for column in result.columns if not isinstance(column, str)]]
+    curves = curves.head(top)
+    offsets = curves.columns.astype(float)
+    band = result.attrs.get('bands', {})
+    for group, row in curves.iterrows():
+        line, = ax.plot(offsets, row.to_numpy(), marker='o', label=group)
+        if group in band:
+            ax.fill_between(offsets, *band[group], color=line.get_color(), alpha=0.15)
+    ax.axvline(0, color='red', linestyle='--', linewidth=1.5, label='Kickoff')
+    ax.set_xticks(offsets, hour_labels(offsets), rotation=45)
+    ax.set_xlabel("Hours Relative to Kickoff")
+    ax.set_ylabel("Average Tweets per Bin")
+    ax.set_title(f"Top {top} by Attention")
+    ax.grid(True, linestyle='--', alpha=0.6)
+    ax.legend()
+
+
+@analysis('ranking', plot=plot_ranking)
+def team_ranking(matrix, games, width='1h', start='-5h', stop='15h', by='team', sample=1.0,
+                 bootstrap=0):
+    """
+    Teams (or other groups of games) ranked by average attention per game around kickoff.
+
+    Each game's counts go to every group it belongs to under `by` (both
+    teams by default; see ekthesis.ranking.GROUPINGS), and a group's curve
+    is its average per game with tweets. Columns are the number of games,
+    the summed curve ('attention') and the curve by bin offset in hours.
+
+    Sampled, 'attention' gets lo/hi bounds and each group its rank
+    interval and 'holds', the share of replicates in which it stays above
+    the next group; the summary is in result.attrs['stability'].
+
+    With `bootstrap` replicates, band_lo/band_hi bound 'attention' over
+    games resampled within each group, and result.attrs['bands'] holds
+    each group's (lo, hi) band of the curve.
+    """
+    counts = matrix.curve(width, start, stop, game_ids=games['game_id'])
+    bins = bin_offsets(width, start, stop)
+    if sample >= 1:
+        has_tweets = counts.sum(axis=1) > 0
+    else:
+        has_tweets = sampled_games(matrix, games)
+    curves = group_curves(counts / sample, games, by=by, bins=bins, has_tweets=has_tweets)
+    if sample >= 1 and not bootstrap:
+        return curves
+    groups, labels, n_games = active_groups(games, by, has_tweets)
+
+    if bootstrap:
+        (curve_lo, curve_hi), (total_lo, total_hi) = bands(counts / sample, groups, n=bootstrap)
+        at = curves.columns.get_loc('attention') + 1
+        curves.insert(at, 'band_lo', pd.Series(total_lo, index=labels).reindex(curves.index))
+        curves.insert(at + 1, 'band_hi', pd.Series(total_hi, index=labels).reindex(curves.index))
+        curves.attrs['bands'] = {label: (list(lo), list(hi))
+                                 for label, lo, hi in zip(labels, curve_lo, curve_hi)}
+    if sample >= 1:
+        return curves
+
+    # Group totals are sums of Poisson counts; replicates go through the same product
+    totals = counts.sum(axis=1).astype(np.float64)
+    lo, hi = poisson_interval(groups @ totals, sample)
+    replicated = (groups @ replicates(totals).T).T / sample / n_games
+    order, table, summary = rank_stability(groups @ totals / sample / n_games, replicated)
+
+    table.index = labels[order]
+    table['attention_lo'] = (lo / n_games)[order]
+    table['attention_hi'] = (hi / n_games)[order]
+    table = table.reindex(curves.index)
+    curves.insert(2, 'attention_lo', table.pop('attention_lo'))
+    curves.insert(3, 'attention_hi', table.pop('attention_hi'))
+    for position, column in enumerate(table.columns):
+        curves.insert(position, column, table[column])
+    curves.attrs['stability'] = summary
+    return curves
+
+
+def plot_weekly(result, ax):
+    if 'lo' in result:
+        result = result['attention'].unstack('week')
+    for season, row in result.iterrows():
+        ax.plot(row.index, row.to_numpy(), marker='o', linestyle='-', label=f'{season}')
+    ax.plot(result.columns, result.mean(axis=0).to_numpy(), color='black', linewidth=2.5,
+            label='Average')
+    ax.set_xlabel('Week')
+    ax.set_ylabel('Attention')
+    ax.set_title('Weekly Attention by Season')
+    ax.grid(True)
+    ax.legend()
+
+
+@analysis('weekly', plot=plot_weekly)
+def weekly(matrix, games, days=7, sample=1.0):
+    """
+    Season x week attention, summing each game's tweets from gameday-`days` to gameday+`days`.
+
+    Sampled, the result is long instead: attention, lo and hi per (season, week).
+    """
+    table = weekly_attention(matrix, games, days)
+    if sample >= 1:
+        return table
+
+    sums = table.stack()
+    lo, hi = poisson_interval(sums.to_numpy(), sample)
+    return pd.DataFrame({'attention': sums / sample, 'lo': lo, 'hi': hi}, index=sums.index)
+
+
+def window_percentages(hourly, sample=1.0):
+    """
+    Tweets in each of PERCENTAGE_WINDOWS and their percentage of the
+    PERCENTAGE_BASE window, from tweets per hour around kickoff starting
+    at the earliest window start (hourly[..., 0] is hour -336).
+    """
+    lo = min(start for start, _ in PERCENTAGE_WINDOWS.values())
+
+    def window_sums(hourly):
+        return np.stack([hourly[..., start - lo:stop - lo].sum(axis=-1)
+                         for start, stop in PERCENTAGE_WINDOWS.values()], axis=-1)
+
+    tweets = pd.Series(window_sums(hourly), index=list(PERCENTAGE_WINDOWS), name='tweets')
+    result = pd.DataFrame({
+        'tweets': tweets / sample if sample < 1 else tweets,
+        'percent': tweets / tweets[PERCENTAGE_BASE] * 100,
+    }).rename_axis('window')
+    if sample >= 1:
+        return result
+
+    # Windows overlap, so the percentages are resampled from the hourly counts
+    result['tweets_lo'], result['tweets_hi'] = poisson_interval(tweets.to_numpy(), sample)
+    replicated = window_sums(replicates(hourly))
+    base = list(PERCENTAGE_WINDOWS).index(PERCENTAGE_BASE)
+    percent = replicated / replicated[:, [base]] * 100
+    result['percent_lo'], result['percent_hi'] = percentile_interval(percent)
+    return result
+
+
+@analysis('percentages')
+def percentages(matrix, games, sample=1.0):
+    """Tweets within windows around kickoff, as a percentage of the tweets within ±7 days"""
+    lo = min(start for start, _ in PERCENTAGE_WINDOWS.values())
+    hi = max(stop for _, stop in PERCENTAGE_WINDOWS.values())
+    hourly = matrix.curve('1h', f'{lo}h', f'{hi}h', game_ids=games['game_id']).sum(axis=0)
+    return window_percentages(hourly, sample)
+
+    # Windows overlap, so the percentages are resampled from the hourly counts
+    result['tweets_lo'], result['tweets_hi'] = poisson_interval(tweets.to_numpy(), sample)
+    replicated = window_sums(replicates(hourly))
+    base = list(PERCENTAGE_WINDOWS).index(PERCENTAGE_BASE)
+    percent = replicated / replicated[:, [base]] * 100
+    result['percent_lo'], result['percent_hi'] = percentile_interval(percent)
+    return result
+
+
+def run(names, seasons=SEASONS, game_type='REG', connect=None, query=None,
+        matrix_path=None, workers=1, sample=1.0, archive=None, **options):
+    """
+    Run the analyses `names` over the games of `seasons` and `game_type`
+    from one count matrix. `connect` returns the tweet collection and is
+    only called if the matrix has to be built; `query` defaults to the
+    tweet cache. With `sample` < 1 the tweets are sampled at that rate,
+    into a cache and matrix of their own. With `archive`, the path of a
+    tweet archive, the tweets are read from it instead, into a matrix
+    kept in the archive. Returns {name: result}.
+    """
+    unknown = [name for name in names if name not in ANALYSES]
+    if unknown:
+        raise ValueError(f"Unknown analyses: {', '.join(unknown)}")
+
+    if archive is not None:
+        from ekthesis.archive import TweetArchive, count_matrix_path
+
+        # The archive holds every tweet, so its counts must not be scaled as a sample
+        if sample < 1:
+            raise ValueError("An archive holds every tweet and cannot be read as a sample")
+        query = TweetArchive(archive).get_ambient_tweets
+        if connect is None:
+            def connect():
+                return None
+        if matrix_path is None:
+            matrix_path = count_matrix_path(archive)
+    if matrix_path is None:
+        matrix_path = DEFAULT_PATH
+
+    if query is None:
+        from ekthesis.cache import DEFAULT_CACHE_DIR, TweetCache
+        query = TweetCache(cache_dir=sample_path(DEFAULT_CACHE_DIR, sample)).get_ambient_tweets
+    if connect is None:
+        def connect():
+            from data_mountain_query.connection import get_connection
+            return get_connection(p=sample)[0]
+
+    games = select_games(seasons, game_type)
+    matrix = count_matrix_for(games, connect, path=sample_path(matrix_path, sample), query=query,
+                              workers=workers)
+    return {name: ANALYSES[name](matrix, games, sample=sample, **options) for name in names}
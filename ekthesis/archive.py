@@ -0,0 +1,314 @@
+"""
+Compact, memory-mapped tweet archive.
+
+The analyses only use four fields of a tweet: its time, the anchor it
+was found under, its id and its coordinates. The archive keeps exactly
+those, as one typed column each:
+
+    time    int64    seconds since the epoch (UTC)
+    anchor  uint16   row of anchors.csv
+    id      uint64   tweet id (12-byte ObjectIds are kept as S12 instead)
+    lat     float32  NaN without coordinates
+    lon     float32
+
+26 bytes a tweet, against over 500 for the same fields as a dict in a
+list. Each column is a .npy file in the archive directory, memory-mapped
+on load. Rows are sorted by (anchor, time) and offsets.npy holds where
+each anchor's rows start, so an (anchor, window) lookup is two binary
+searches on that anchor's times and a slice of every column, without
+copying. Times are kept to the second, so windows are too.
+
+coverage.csv lists the windows each anchor was archived for. A lookup
+outside them is passed to `query` when the archive has one and is an
+error otherwise, so a missing window never reads as a window without
+tweets.
+
+Build one from the tweet cache with `python -m ekthesis.archive build`,
+or from any (anchor, start, end, tweets) chunks with ArchiveWriter, and
+pass `TweetArchive().get_ambient_tweets` wherever a query function is
+taken (`python -m ekthesis run --archive`). A count matrix built from
+an archive is kept inside it (count_matrix_path), apart from the ones
+built from the store, and goes when the archive is rebuilt.
+"""
+
+import argparse
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from ekthesis import REPO_ROOT, trace
+from ekthesis.cache import DEFAULT_CACHE_DIR, frame_to_tweets, missing_windows, tweets_to_frame
+from ekthesis.counts import DEFAULT_PATH as COUNTS_PATH
+from ekthesis.fetch import to_utc
+
+DEFAULT_PATH = os.path.join(REPO_ROOT, 'tweet_archive')
+
+COLUMNS = {
+    'time': np.int64,
+    'anchor': np.uint16,
+    'id': np.uint64,
+    'lat': np.float32,
+    'lon': np.float32,
+}
+
+MAX_ANCHORS = np.iinfo(np.uint16).max + 1
+
+
+def epoch_seconds(values):
+    """Seconds since the epoch of timestamps (naive ones are UTC), floored to the second"""
+    if isinstance(values, (pd.Series, pd.Index)):
+        values = to_utc(values)
+        values = values.dt.tz_localize(None) if isinstance(values, pd.Series) else values.tz_localize(None)
+        return values.to_numpy().astype('datetime64[s]').astype(np.int64)
+    return int(to_utc(values).tz_localize(None).to_datetime64().astype('datetime64[s]').astype(np.int64))
+
+
+def encode_ids(ids):
+    """Tweet ids as uint64, or ObjectId hex strings as 12-byte S12 values"""
+    ids = pd.Series(ids, dtype=str)
+    if ids.str.fullmatch(r'\d+').all():
+        return ids.astype(np.uint64).to_numpy()
+    if ids.str.fullmatch(r'[0-9a-fA-F]{24}').all():
+        return np.frombuffer(bytes.fromhex(''.join(ids)), dtype='S12')
+    raise ValueError("Ids must all be integers or all be ObjectIds")
+
+
+def decode_ids(ids):
+    """encode_ids reversed, as the strings the tweet cache keeps"""
+    if ids.dtype == np.dtype('S12'):
+        return [value.ljust(12, b'\0').hex() for value in ids.tolist()]
+    return [str(value) for value in ids.tolist()]
+
+
+def count_matrix_path(path=DEFAULT_PATH):
+    """Where the count matrix built from the archive at `path` is kept"""
+    return os.path.join(path, os.path.basename(COUNTS_PATH))
+
+
+def merge_windows(windows):
+    """Sorted, disjoint union of the (start, end) `windows`"""
+    merged = []
+    for start, end in sorted(windows):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class ArchiveWriter:
+    """
+    Builds an archive at `path` from chunks of tweets. Chunks are appended
+    to raw column files as they come; close() sorts them into the archive,
+    keeping one row per (anchor, tweet), and replaces any archive at `path`.
+    """
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self.tmp_path = path.rstrip(os.sep) + '.tmp'
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+        os.makedirs(self.tmp_path)
+        self.files = {name: open(os.path.join(self.tmp_path, f'{name}.raw'), 'wb') for name in COLUMNS}
+        self.anchors = {}
+        self.windows = []
+        self.id_dtype = None
+        self.n_rows = 0
+
+    def add(self, anchor, start, end, tweets):
+        """Tweets of `anchor` archived for the window [start, end), as a tweet-cache frame"""
+        code = self.anchors.setdefault(anchor, len(self.anchors))
+        if code >= MAX_ANCHORS:
+            raise ValueError(f"An archive holds at most {MAX_ANCHORS} anchors")
+        self.windows.append((anchor, to_utc(start), to_utc(end)))
+        if not len(tweets):
+            return
+
+        ids = encode_ids(tweets['_id'])
+        if self.id_dtype is None:
+            self.id_dtype = ids.dtype
+        elif ids.dtype != self.id_dtype:
+            raise ValueError("Ids must all be integers or all be ObjectIds")
+
+        columns = {
+            'time': epoch_seconds(tweets['tweet_created_at']),
+            'anchor': np.full(len(tweets), code, dtype=np.uint16),
+            'id': ids,
+            'lat': tweets['lat'].to_numpy(dtype=np.float32),
+            'lon': tweets['lon'].to_numpy(dtype=np.float32),
+        }
+        for name, values in columns.items():
+            self.files[name].write(np.ascontiguousarray(values).tobytes())
+        self.n_rows += len(tweets)
+
+    def _raw(self, name):
+        dtype = self.id_dtype if name == 'id' else COLUMNS[name]
+        path = os.path.join(self.tmp_path, f'{name}.raw')
+        if not self.n_rows:
+            return np.empty(0, dtype=dtype or np.uint64)
+        return np.memmap(path, dtype=dtype, mode='r', shape=(self.n_rows,))
+
+    @trace.timed('aggregate')
+    def close(self):
+        for f in self.files.values():
+            f.close()
+
+        # Anchors are numbered in sorted order in the archive
+        names = sorted(self.anchors)
+        recode = np.empty(len(self.anchors), dtype=np.uint16)
+        recode[[self.anchors[name] for name in names]] = np.arange(len(names))
+        anchor = recode[self._raw('anchor')]
+
+        time, ids = self._raw('time'), self._raw('id')
+        order = np.lexsort((ids, time, anchor))
+        anchor, time, ids = anchor[order], time[order], ids[order]
+        # The same tweet from overlapping windows sorts next to itself
+        keep = np.ones(len(order), dtype=bool)
+        keep[1:] = (anchor[1:] != anchor[:-1]) | (time[1:] != time[:-1]) | (ids[1:] != ids[:-1])
+
+        sorted_columns = {'time': time, 'anchor': anchor, 'id': ids}
+        for name in COLUMNS:
+            values = sorted_columns.get(name)
+            values = self._raw(name)[order] if values is None else values
+            np.save(os.path.join(self.tmp_path, f'{name}.npy'), values[keep])
+            os.remove(os.path.join(self.tmp_path, f'{name}.raw'))
+
+        offsets = np.searchsorted(anchor[keep], np.arange(len(names) + 1), side='left')
+        np.save(os.path.join(self.tmp_path, 'offsets.npy'), offsets.astype(np.int64))
+        pd.DataFrame({'anchor': names}).to_csv(os.path.join(self.tmp_path, 'anchors.csv'), index=False)
+
+        coverage = pd.DataFrame(self.windows, columns=['anchor', 'start', 'end'])
+        coverage = pd.DataFrame(
+            [(name, start, end) for name, group in coverage.groupby('anchor', sort=True)
+             for start, end in merge_windows(zip(group['start'], group['end']))],
+            columns=['anchor', 'start', 'end'])
+        coverage.to_csv(os.path.join(self.tmp_path, 'coverage.csv'), index=False)
+
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.replace(self.tmp_path, self.path)
+        return TweetArchive(self.path)
+
+
+def build_from_cache(path=DEFAULT_PATH, cache_dir=DEFAULT_CACHE_DIR):
+    """Archive every segment of the tweet cache at `cache_dir`"""
+    from ekthesis.cache import TweetCache
+
+    cache = TweetCache(cache_dir=cache_dir)
+    writer = ArchiveWriter(path)
+    for seg in sorted(cache.segments, key=lambda s: (s['anchor'], s['start'])):
+        tweets = pd.read_parquet(os.path.join(cache_dir, seg['file']))
+        writer.add(seg['anchor'], seg['start'], seg['end'], tweets)
+    return writer.close()
+
+
+def build_from_query(windows, collection, path=DEFAULT_PATH, query=None):
+    """
+    Archive the tweets of every (anchor, start, end) row of `windows` (as
+    from ekthesis.fetch.game_windows), one query per run of overlapping
+    windows of an anchor.
+    """
+    from ekthesis.fetch import plan_blocks, window_dates
+    if query is None:
+        from data_mountain_query.query import get_ambient_tweets as query
+
+    writer = ArchiveWriter(path)
+    for _, block in plan_blocks(windows, block='window').groupby('block', sort=True):
+        anchor, start, end = block['anchor'].iloc[0], block['start'].min(), block['end'].max()
+        tweets = tweets_to_frame(query(anchor, window_dates(start, end), collection))
+        times = tweets['tweet_created_at']
+        writer.add(anchor, start, end, tweets[(times >= start) & (times < end)])
+    return writer.close()
+
+
+class TweetArchive:
+    """
+    A memory-mapped archive. Windows it does not cover go to `query`
+    (a get_ambient_tweets-like function) when given.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, query=None):
+        self.path = path
+        self.query = query
+        self.columns = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r')
+                        for name in COLUMNS}
+        self.offsets = np.load(os.path.join(path, 'offsets.npy'))
+        self.anchors = pd.read_csv(os.path.join(path, 'anchors.csv'), keep_default_na=False)['anchor'].tolist()
+        self.codes = {anchor: code for code, anchor in enumerate(self.anchors)}
+
+        coverage = pd.read_csv(os.path.join(path, 'coverage.csv'), keep_default_na=False)
+        self.coverage = {}
+        for anchor, start, end in zip(coverage['anchor'], to_utc(coverage['start']), to_utc(coverage['end'])):
+            self.coverage.setdefault(anchor, []).append((start, end))
+
+    def __len__(self):
+        return len(self.columns['time'])
+
+    @property
+    def nbytes(self):
+        return sum(values.nbytes for values in self.columns.values())
+
+    def covers(self, anchor, start, end):
+        """Whether [start, end) of `anchor` is within the archived windows"""
+        return not missing_windows(to_utc(start), to_utc(end), self.coverage.get(anchor, []))
+
+    def rows(self, anchor, start, end):
+        """Slice of the rows of `anchor` with times in [start, end)"""
+        code = self.codes.get(anchor)
+        if code is None:
+            return slice(0, 0)
+        lo, hi = self.offsets[code], self.offsets[code + 1]
+        first, last = np.searchsorted(self.columns['time'][lo:hi],
+                                      [epoch_seconds(start), epoch_seconds(end)], side='left')
+        return slice(lo + first, lo + last)
+
+    def window(self, anchor, start, end):
+        """Every column of `anchor`'s tweets in [start, end), as views of the archive"""
+        rows = self.rows(anchor, start, end)
+        return {name: values[rows] for name, values in self.columns.items()}
+
+    @trace.timed('parse')
+    def frame(self, anchor, start, end):
+        """`anchor`'s tweets in [start, end) in the tweet cache's columns"""
+        window = self.window(anchor, start, end)
+        return pd.DataFrame({
+            '_id': pd.Series(decode_ids(window['id']), dtype=str),
+            'tweet_created_at': pd.to_datetime(window['time'], unit='s', utc=True),
+            'lon': window['lon'].astype(np.float64),
+            'lat': window['lat'].astype(np.float64),
+        })
+
+    def get_ambient_tweets(self, anchor, dates, collection=None):
+        """Same call as get_ambient_tweets, served from the archive"""
+        start, end = dates[0], dates[-1]
+        covered = self.covers(anchor, start, end)
+        trace.event('archive', anchor=anchor, start=str(start), end=str(end), hit=covered)
+        if not covered:
+            if self.query is None:
+                raise ValueError(f"{anchor} from {start} to {end} is not in the archive at {self.path}")
+            return self.query(anchor, dates, collection)
+        return frame_to_tweets(self.frame(anchor, start, end))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help='archive every segment of the tweet cache')
+    build.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help='tweet cache to archive')
+    build.add_argument('path', nargs='?', default=DEFAULT_PATH, help='archive directory')
+    info = commands.add_parser('info', help='describe an archive')
+    info.add_argument('path', nargs='?', default=DEFAULT_PATH, help='archive directory')
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        archive = build_from_cache(args.path, args.cache_dir)
+    else:
+        archive = TweetArchive(args.path)
+    print(f"{args.path}: {len(archive):,} tweets under {len(archive.anchors):,} anchors, "
+          f"{archive.nbytes / 1e6:.1f} MB ({archive.columns['id'].dtype} ids)")
+    return archive
+
+
+if __name__ == '__main__':
+    main()
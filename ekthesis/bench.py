@@ -0,0 +1,206 @@
+"""
+Benchmarks for the attention pipelines against a synthetic tweet store.
+
+Each run builds a SyntheticStore for a number of seasons and a tweet
+volume, installs it as `data_mountain_query`, and times one entry point
+in a fresh process, so peak RSS and imports start clean. Entry points:
+
+- data_generation: data_generation.main, downloading tweets
+- data_generation_server: the same, counting in the store (--server-counts)
+- weekly: the season x week table behind average_att / weekly_att_2013_2017
+- count_matrix: the 5-minute count matrix behind time_windows and
+  ranking_attention, plus the hourly kickoff curve
+
+Reported per run:
+
+- wall: total wall time
+- fetch, parse, bin, aggregate, other: the stages of an ekthesis.trace
+  trace of the run (without document sizes, which would slow it down)
+- queries, tweets: queries issued and tweets returned
+- peak_rss_mb: peak resident memory, with store_rss_mb after building
+  the store for reference
+
+Results are appended to RESULTS_PATH with the current git commit, so
+`--compare` can line up runs across commits:
+
+    python -m ekthesis.bench --entry weekly count_matrix --seasons 1 5 --volume 1 10
+    python -m ekthesis.bench --compare
+"""
+
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import multiprocessing
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+from ekthesis import REPO_ROOT
+
+RESULTS_PATH = os.path.join(REPO_ROOT, 'benchmarks', 'results.jsonl')
+
+ENTRY_POINTS = ['data_generation', 'data_generation_server', 'weekly', 'count_matrix']
+
+# Seasons used as the scale grows, ending at the thesis seasons where possible
+LAST_SEASON = 2014
+
+
+def season_range(games, n_seasons):
+    """`n_seasons` consecutive seasons of `games`, ending at LAST_SEASON if there are enough"""
+    seasons = sorted(int(s) for s in games['season'].unique())
+    end = seasons.index(LAST_SEASON) + 1 if LAST_SEASON in seasons else len(seasons)
+    end = min(max(end, n_seasons), len(seasons))
+    return seasons[max(end - n_seasons, 0):end]
+
+
+def git_commit():
+    """Short HEAD commit, marked dirty when the tree has changes"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                               cwd=REPO_ROOT, capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return commit + ('-dirty' if dirty else '')
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
+def run_entry(entry, games, seasons, workdir, connect):
+    """Run one entry point over `games` of `seasons`"""
+    from ekthesis.cache import TweetCache
+
+    if entry in ('data_generation', 'data_generation_server'):
+        sys.path.insert(0, REPO_ROOT)
+        import data_generation
+        data_generation.main(seasons=seasons, output_path=os.path.join(workdir, 'game_attention.csv'),
+                             server_counts=entry == 'data_generation_server')
+    elif entry == 'weekly':
+        from ekthesis.counts import count_matrix_for
+        from ekthesis.weekly import weekly_attention
+        reg = games[games['game_type'] == 'REG']
+        cache = TweetCache(cache_dir=os.path.join(workdir, 'tweets'))
+        matrix = count_matrix_for(reg, connect, path=os.path.join(workdir, 'counts.npy'),
+                                  query=cache.get_ambient_tweets)
+        weekly_attention(matrix, reg, days=7)
+        cache.flush()
+    elif entry == 'count_matrix':
+        from ekthesis.counts import count_matrix_for
+        reg = games[games['game_type'] == 'REG']
+        cache = TweetCache(cache_dir=os.path.join(workdir, 'tweets'))
+        matrix = count_matrix_for(reg, connect, path=os.path.join(workdir, 'counts.npy'),
+                                  query=cache.get_ambient_tweets)
+        matrix.curve('1h', '-5h', '15h', game_ids=reg['game_id'])
+        cache.flush()
+    else:
+        raise ValueError(f"Unknown entry point: {entry!r}")
+
+
+def run_one(entry, n_seasons, volume, seed=0):
+    """Time one entry point; meant to run in a fresh process"""
+    from ekthesis import synthetic
+    synthetic.install()
+
+    from ekthesis import trace
+    from ekthesis.games import load_games
+
+    games = load_games()
+    seasons = season_range(games, n_seasons)
+    games = games[games['season'].isin(seasons)]
+    store = synthetic.SyntheticStore(games, volume=volume, seed=seed)
+    synthetic.install(store)
+    store_rss = peak_rss_mb()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        tracer = trace.enable(os.path.join(workdir, 'trace.jsonl'), summary=False, sizes=False)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            run_entry(entry, games, seasons, workdir, lambda: store)
+        wall = time.perf_counter() - start
+        _, stages = tracer.stages()
+        trace.disable()
+
+    return {
+        'entry': entry,
+        'n_seasons': len(seasons),
+        'seasons': f"{seasons[0]}-{seasons[-1]}",
+        'volume': volume,
+        'n_games': len(games),
+        'store_tweets': store.n_tweets,
+        'wall_s': round(wall, 3),
+        **{f'{stage}_s': round(stages[stage], 3) for stage in ['fetch', 'parse', 'bin', 'aggregate', 'other']},
+        'queries': len(store.queries),
+        'tweets': store.tweets_returned,
+        'store_rss_mb': round(store_rss, 1),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    }
+
+
+def run(entries, seasons, volumes, seed=0, results_path=RESULTS_PATH):
+    """Run every entry x seasons x volume in its own process and append the results"""
+    commit = git_commit()
+    ctx = multiprocessing.get_context('spawn')
+    os.makedirs(os.path.dirname(results_path), exist_ok=True)
+    results = []
+    for entry, n_seasons, volume in itertools.product(entries, seasons, volumes):
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+            result = pool.submit(run_one, entry, n_seasons, volume, seed).result()
+        result = {'commit': commit, 'time': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                  **result}
+        results.append(result)
+        with open(results_path, 'a') as f:
+            f.write(json.dumps(result) + '\n')
+        print(f"{entry:24s} {result['seasons']:>9s} x{volume:<4g} wall {result['wall_s']:8.2f}s  "
+              f"fetch {result['fetch_s']:7.2f}s  parse {result['parse_s']:7.2f}s  "
+              f"bin {result['bin_s']:7.2f}s  aggregate {result['aggregate_s']:7.2f}s  "
+              f"other {result['other_s']:7.2f}s  queries {result['queries']:6d}  "
+              f"peak {result['peak_rss_mb']:7.1f} MB")
+    return results
+
+
+def compare(results_path=RESULTS_PATH, metric='wall_s', last=5):
+    """Table of `metric` per entry and scale for the `last` commits benchmarked"""
+    import pandas as pd
+
+    results = pd.read_json(results_path, lines=True)
+    commits = list(dict.fromkeys(results['commit']))[-last:]
+    results = results[results['commit'].isin(commits)]
+    # Latest run of each configuration per commit
+    table = (results.groupby(['entry', 'seasons', 'volume', 'commit'])[metric].last()
+             .unstack('commit').reindex(columns=commits))
+    print(table.to_string())
+    return table
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--entry', nargs='+', choices=ENTRY_POINTS, default=ENTRY_POINTS,
+                        help='entry points to time')
+    parser.add_argument('--seasons', type=int, nargs='+', default=[1],
+                        help='numbers of seasons to run each entry point on (1 to 20)')
+    parser.add_argument('--volume', type=float, nargs='+', default=[1.0],
+                        help='tweet volume multipliers (10 = ten times the tweets)')
+    parser.add_argument('--seed', type=int, default=0, help='synthetic store seed')
+    parser.add_argument('--results', default=RESULTS_PATH, help='JSONL file results are appended to')
+    parser.add_argument('--compare', action='store_true',
+                        help='print saved results per commit instead of running')
+    parser.add_argument('--metric', default='wall_s', help='metric shown by --compare')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(args.results, args.metric)
+    else:
+        run(args.entry, args.seasons, args.volume, seed=args.seed, results_path=args.results)
@@ -0,0 +1,75 @@
+"""
+Kickoff-relative binning of tweet timestamps.
+
+All tweets for all games are binned in one pass: each tweet's offset from
+its game's kickoff is turned into a flat (game, bin) index and counted
+with np.bincount, giving an (n_games x n_bins) matrix. Any bin width and
+offset range can be read off the same tweets.
+
+By default kickoff is floored to the bin width first, so bins line up
+with clock hours / half hours the way the scripts' `.floor('h')` did.
+Flooring happens on UTC epoch time, which matches US/Eastern for any
+width up to an hour.
+"""
+
+import numpy as np
+import pandas as pd
+
+from ekthesis import trace
+from ekthesis.fetch import to_utc
+
+
+def to_ns(values):
+    """Timestamps as int64 nanoseconds since the epoch (UTC)"""
+    values = to_utc(pd.Series(values) if not isinstance(values, (pd.Series, pd.Index)) else values)
+    if isinstance(values, pd.Series):
+        values = values.dt.tz_localize(None)
+    else:
+        values = values.tz_localize(None)
+    return values.to_numpy().astype('datetime64[ns]').view('int64')
+
+
+def bin_offsets(width, start, stop):
+    """Left edge of every bin, in hours relative to kickoff"""
+    width, start, stop = pd.Timedelta(width), pd.Timedelta(start), pd.Timedelta(stop)
+    n_bins = int((stop - start) // width)
+    return (start + width * np.arange(n_bins)) / pd.Timedelta(hours=1)
+
+
+@trace.timed('bin')
+def bin_counts(times, kickoffs, game_idx, n_games, width, start, stop, align=True):
+    """
+    Count tweets per (game, kickoff-relative bin).
+
+    times, kickoffs and game_idx are per tweet; game_idx is the tweet's
+    row in the output. Bins of `width` cover offsets [start, stop).
+    """
+    width, start, stop = pd.Timedelta(width), pd.Timedelta(start), pd.Timedelta(stop)
+    w = width.value
+    n_bins = int((stop - start) // width)
+
+    t = to_ns(times)
+    k = to_ns(kickoffs)
+    if align:
+        k = np.floor_divide(k, w) * w
+
+    rel = t - k - start.value
+    bins = np.floor_divide(rel, w)
+    keep = (rel >= 0) & (bins < n_bins)
+    flat = np.asarray(game_idx)[keep] * n_bins + bins[keep]
+
+    counts = np.bincount(flat, minlength=n_games * n_bins)
+    return counts.reshape(n_games, n_bins)
+
+
+def game_bin_counts(tweets, games, width, start, stop, at='kickoff_utc', align=True):
+    """
+    Bin the output of fetch_game_tweets against the rows of `games`.
+    Row i of the result is games.iloc[i].
+    """
+    game_idx = pd.Index(games['game_id']).get_indexer(tweets['game_id'])
+    known = game_idx >= 0
+    game_idx = game_idx[known]
+    kickoffs = games[at].iloc[game_idx]
+    times = tweets['tweet_created_at'][known]
+    return bin_counts(times, kickoffs, game_idx, len(games), width, start, stop, align=align)
@@ -0,0 +1,87 @@
+"""
+Bootstrap confidence bands for average curves over games.
+
+An average curve (tweets per bin around kickoff, over games) varies
+with which games happen to be in the seasons. The bootstrap resamples
+the games with replacement and recomputes the average, and the band is
+the spread of the averages over the replicates.
+
+Nothing loops over replicates. For games split into groups (the rows of
+a sparse groups x games incidence matrix, as in ekthesis.ranking), the
+resampled games of all groups and replicates are drawn as one integer
+matrix: slot j of group g picks one of g's games. Counting the picks
+gives a (replicates x slots) weight matrix W, and with M the sparse
+(slots x groups*bins) matrix holding each slot's game counts in its
+group's columns, W @ M is every replicate's summed curve per group in
+one product.
+"""
+
+import numpy as np
+from scipy import sparse
+
+# Confidence level of every band
+LEVEL = 0.95
+
+N_REPLICATES = 1000
+
+
+def percentile_interval(values, level=LEVEL, axis=0):
+    """Central `level` interval of `values` along `axis`, as (lo, hi)"""
+    alpha = 1 - level
+    return (np.percentile(values, 100 * alpha / 2, axis=axis),
+            np.percentile(values, 100 * (1 - alpha / 2), axis=axis))
+
+
+def resample_weights(groups, n=N_REPLICATES, seed=0):
+    """
+    (n x slots) times each slot of the csr incidence matrix `groups` is
+    drawn when every group's games are resampled with replacement.
+    """
+    rng = np.random.default_rng(seed)
+    sizes = np.diff(groups.indptr)
+    group = np.repeat(np.arange(len(sizes)), sizes)
+    n_slots = len(group)
+
+    picks = groups.indptr[group] + (rng.random((n, n_slots)) * sizes[group]).astype(np.int64)
+    picks += np.arange(n)[:, None] * n_slots
+    return np.bincount(picks.ravel(), minlength=n * n_slots).reshape(n, n_slots).astype(np.float64)
+
+
+def bootstrap_means(counts, groups=None, n=N_REPLICATES, seed=0):
+    """
+    (n x groups x bins) average curves of the (games x bins) `counts`
+    over n bootstrap resamples of each group's games. `groups` is a
+    sparse (groups x games) 0/1 matrix; by default all games are one group.
+    Groups without games come back as NaN.
+    """
+    counts = np.asarray(counts, dtype=np.float64)
+    n_games, n_bins = counts.shape
+    if groups is None:
+        groups = sparse.csr_matrix(np.ones((1, n_games)))
+    groups = sparse.csr_matrix(groups, copy=True)
+    groups.sort_indices()
+    n_groups = groups.shape[0]
+    sizes = np.diff(groups.indptr)
+    group = np.repeat(np.arange(n_groups), sizes)
+
+    # Slot j's counts in the columns of its group
+    rows = np.repeat(np.arange(len(group)), n_bins)
+    cols = (group[:, None] * n_bins + np.arange(n_bins)[None, :]).ravel()
+    slots = sparse.csr_matrix((counts[groups.indices].ravel(), (rows, cols)),
+                              shape=(len(group), n_groups * n_bins))
+
+    weights = resample_weights(groups, n, seed)
+    sums = np.asarray((slots.T @ weights.T).T).reshape(n, n_groups, n_bins)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return sums / sizes[None, :, None]
+
+
+def bands(counts, groups=None, n=N_REPLICATES, level=LEVEL, seed=0):
+    """
+    Percentile bands of the average curve per group, as (lo, hi) arrays
+    of (groups x bins), plus (lo, hi) of each group's summed curve.
+    """
+    means = bootstrap_means(counts, groups, n, seed)
+    curve_lo, curve_hi = percentile_interval(means, level)
+    total_lo, total_hi = percentile_interval(means.sum(axis=2), level)
+    return (curve_lo, curve_hi), (total_lo, total_hi)
@@ -0,0 +1,316 @@
+"""
+On-disk tweet cache in front of get_ambient_tweets.
+
+Every query result is written to a Parquet segment covering one
+(anchor, [start, end)) window. A later request only fetches the parts of
+its window no segment covers yet, so a ±336h run fills the cache for the
+-5h/+15h runs too. Segments are evicted least recently used first once
+the cache grows past its size cap.
+
+Contiguous segments read together are merged into one file as long as
+it stays under MERGE_MAX_BYTES. Segments are sorted by time and written
+in row groups, and reads pass the window as a Parquet filter, so a short
+lookup into a long merged segment only decodes the row groups it needs.
+
+Only the fields the analyses use are kept: _id (as a string),
+tweet_created_at and the geo coordinates.
+
+The cache is safe to share between fetch workers: the manifest is
+guarded by a lock, and requests for the same anchor are serialized so two
+workers never fetch the same gap twice. Every lookup is reported to
+ekthesis.trace with whether the cache covered it.
+"""
+
+import atexit
+import hashlib
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from data_mountain_query.query import get_ambient_tweets
+
+from ekthesis import REPO_ROOT, trace
+from ekthesis.fetch import to_utc, window_dates
+
+DEFAULT_CACHE_DIR = os.environ.get('EKTHESIS_CACHE_DIR', os.path.join(REPO_ROOT, '.tweet_cache'))
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+# Shortest time between manifest writes; the manifest holds every
+# segment, so writing it after each one is quadratic in their number
+MANIFEST_INTERVAL = 5.0
+
+# Largest segment a merge may produce; a season of one anchor stays far below it
+MERGE_MAX_BYTES = 64 * 1024 ** 2
+
+# Rows per Parquet row group, the unit a filtered read skips by
+ROW_GROUP_ROWS = 50_000
+
+
+def missing_windows(start, end, covered):
+    """Parts of [start, end) not covered by the sorted, disjoint `covered` windows"""
+    gaps = []
+    cursor = start
+    for seg_start, seg_end in covered:
+        if seg_end <= cursor or seg_start >= end:
+            continue
+        if seg_start > cursor:
+            gaps.append((cursor, seg_start))
+        cursor = max(cursor, seg_end)
+    if cursor < end:
+        gaps.append((cursor, end))
+    return gaps
+
+
+def add_window(windows, start, end):
+    """The sorted, disjoint `windows` with [start, end) merged in"""
+    merged = []
+    for seg_start, seg_end in sorted(windows + [(start, end)]):
+        if merged and seg_start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], seg_end))
+        else:
+            merged.append((seg_start, seg_end))
+    return merged
+
+
+@trace.timed('parse')
+def tweets_to_frame(cursor):
+    """Columnar frame of the cached fields from a tweet cursor"""
+    ids, times, lons, lats = [], [], [], []
+    for tweet in cursor:
+        ids.append(str(tweet.get('_id')))
+        times.append(tweet.get('tweet_created_at'))
+        geo = tweet.get('geo')
+        if isinstance(geo, dict) and geo.get('coordinates'):
+            lons.append(geo['coordinates'][0])
+            lats.append(geo['coordinates'][1])
+        else:
+            lons.append(np.nan)
+            lats.append(np.nan)
+
+    return pd.DataFrame({
+        '_id': pd.Series(ids, dtype=str),
+        'tweet_created_at': to_utc(pd.Series(times, dtype=object)),
+        'lon': pd.Series(lons, dtype='float64'),
+        'lat': pd.Series(lats, dtype='float64'),
+    })
+
+
+@trace.timed('parse')
+def frame_to_tweets(frame):
+    """Yield tweet dicts shaped like the store's documents"""
+    for _id, created, lon, lat in zip(frame['_id'], frame['tweet_created_at'],
+                                      frame['lon'], frame['lat']):
+        geo = None if np.isnan(lon) else {'type': 'Point', 'coordinates': [lon, lat]}
+        yield {'_id': _id, 'tweet_created_at': created, 'geo': geo}
+
+
+class TweetCache:
+    """
+    Drop-in replacement for get_ambient_tweets backed by Parquet segments.
+    Pass `cache.get_ambient_tweets` wherever a query function is taken.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES,
+                 refresh=None, query=None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        # Force a refetch of every requested window, once per instance
+        if refresh is None:
+            refresh = os.environ.get('EKTHESIS_CACHE_REFRESH') == '1'
+        self.refresh = refresh
+        self.query = query
+        self.manifest_path = os.path.join(cache_dir, 'manifest.json')
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._anchor_locks = {}
+        # Windows already refetched by this instance with `refresh`, per anchor
+        self._refreshed = {}
+        self._by_anchor = {}
+        self._bytes = 0
+        for seg in self._load_manifest():
+            # A manifest saved before a crash can list segments merged away since
+            if os.path.exists(os.path.join(cache_dir, seg['file'])):
+                self._add(seg)
+
+        # Segment changes are written at most every MANIFEST_INTERVAL
+        # seconds; reads only bump last_used. Whatever is left is written
+        # when the interpreter exits
+        self._dirty = False
+        self._touched = False
+        self._saved_at = time.monotonic()
+        atexit.register(self.flush)
+
+    @property
+    def segments(self):
+        with self._lock:
+            return [seg for segs in self._by_anchor.values() for seg in segs]
+
+    def _load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return []
+        with open(self.manifest_path) as f:
+            return json.load(f)['segments']
+
+    def _save_manifest(self):
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'segments': self.segments}, f)
+        os.replace(tmp_path, self.manifest_path)
+        self._dirty = False
+        self._touched = False
+        self._saved_at = time.monotonic()
+
+    def flush(self):
+        """Write manifest changes that are still pending"""
+        with self._lock:
+            if self._dirty or self._touched:
+                self._save_manifest()
+
+    def _add(self, seg):
+        with self._lock:
+            segs = self._by_anchor.setdefault(seg['anchor'], [])
+            segs.append(seg)
+            segs.sort(key=lambda s: s['start'])
+            self._bytes += seg['bytes']
+            self._dirty = True
+
+    def _anchor_segments(self, anchor):
+        with self._lock:
+            return list(self._by_anchor.get(anchor, []))
+
+    def _anchor_lock(self, anchor):
+        with self._lock:
+            return self._anchor_locks.setdefault(anchor, threading.Lock())
+
+    def _drop(self, seg):
+        with self._lock:
+            segs = self._by_anchor.get(seg['anchor'], [])
+            if seg not in segs:
+                return
+            segs.remove(seg)
+            if not segs:
+                del self._by_anchor[seg['anchor']]
+            self._bytes -= seg['bytes']
+            self._dirty = True
+        path = os.path.join(self.cache_dir, seg['file'])
+        if os.path.exists(path):
+            os.remove(path)
+
+    def _clear(self, anchor, start, end):
+        """Remove [start, end) from the cached windows of `anchor`, keeping the rest of each segment"""
+        with self._lock:
+            for seg in self._anchor_segments(anchor):
+                seg_start, seg_end = pd.Timestamp(seg['start']), pd.Timestamp(seg['end'])
+                if seg_start >= end or seg_end <= start:
+                    continue
+                frame = self._read_segment(seg)
+                times = frame['tweet_created_at']
+                if seg_start < start:
+                    self._write_segment(anchor, seg_start, start, frame[times < start])
+                if seg_end > end:
+                    self._write_segment(anchor, end, seg_end, frame[times >= end])
+                self._drop(seg)
+
+    def _read_segment(self, seg, start=None, end=None):
+        """Tweets of `seg`, only those in [start, end) when given"""
+        filters = None
+        if start is not None:
+            filters = [('tweet_created_at', '>=', start), ('tweet_created_at', '<', end)]
+        return pd.read_parquet(os.path.join(self.cache_dir, seg['file']), filters=filters)
+
+    def _write_segment(self, anchor, start, end, frame):
+        anchor_key = hashlib.sha1(anchor.encode()).hexdigest()[:16]
+        name = f"{anchor_key}_{start:%Y%m%dT%H%M%S}_{end:%Y%m%dT%H%M%S}.parquet"
+        path = os.path.join(self.cache_dir, name)
+        frame = frame.sort_values('tweet_created_at', kind='stable')
+        frame.to_parquet(path, index=False, row_group_size=ROW_GROUP_ROWS)
+        seg = {
+            'anchor': anchor,
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'file': name,
+            'bytes': os.path.getsize(path),
+            'last_used': time.time(),
+        }
+        self._add(seg)
+        return seg
+
+    def _evict(self):
+        with self._lock:
+            if self._bytes > self.max_bytes:
+                for seg in sorted(self.segments, key=lambda s: s['last_used']):
+                    if self._bytes <= self.max_bytes:
+                        break
+                    self._drop(seg)
+            if self._dirty and time.monotonic() - self._saved_at >= MANIFEST_INTERVAL:
+                self._save_manifest()
+
+    def fetch(self, anchor, start, end, collection):
+        """Cached tweets for `anchor` in [start, end) as a columnar DataFrame"""
+        with self._anchor_lock(anchor):
+            return self._fetch(anchor, start, end, collection)
+
+    def _fetch(self, anchor, start, end, collection):
+        query = self.query or get_ambient_tweets
+        start, end = to_utc(start), to_utc(end)
+
+        def overlapping():
+            return [seg for seg in self._anchor_segments(anchor)
+                    if pd.Timestamp(seg['start']) < end and pd.Timestamp(seg['end']) > start]
+
+        # Refetch each window once per instance; the cached tweets around it stay
+        if self.refresh:
+            refreshed = self._refreshed.get(anchor, [])
+            for gap_start, gap_end in missing_windows(start, end, refreshed):
+                self._clear(anchor, gap_start, gap_end)
+            self._refreshed[anchor] = add_window(refreshed, start, end)
+
+        covered = [(pd.Timestamp(s['start']), pd.Timestamp(s['end']))
+                   for s in self._anchor_segments(anchor)]
+        gaps = missing_windows(start, end, covered)
+        fetched = 0
+        for gap_start, gap_end in gaps:
+            frame = tweets_to_frame(query(anchor, window_dates(gap_start, gap_end), collection))
+            times = frame['tweet_created_at']
+            frame = frame[(times >= gap_start) & (times < gap_end)]
+            self._write_segment(anchor, gap_start, gap_end, frame)
+            fetched += len(frame)
+        trace.event('cache', anchor=anchor, start=start.isoformat(), end=end.isoformat(),
+                    hit=not gaps, gaps=len(gaps), fetched=fetched)
+
+        # Read under the lock so another worker's eviction can't remove a file mid-read
+        with self._lock:
+            segs = overlapping()
+
+            # The window is fully covered now, so its segments are contiguous;
+            # merge them so the next read of this window opens a single file,
+            # unless that file would grow past MERGE_MAX_BYTES
+            if len(segs) > 1 and sum(seg['bytes'] for seg in segs) <= MERGE_MAX_BYTES:
+                merged = pd.concat([self._read_segment(seg) for seg in segs], ignore_index=True)
+                self._write_segment(anchor, pd.Timestamp(segs[0]['start']),
+                                    pd.Timestamp(segs[-1]['end']), merged)
+                for seg in segs:
+                    self._drop(seg)
+                frames = [merged]
+            else:
+                frames = [self._read_segment(seg, start, end) for seg in segs]
+                for seg in segs:
+                    seg['last_used'] = time.time()
+                self._touched = True
+            self._evict()
+
+        frames = [f for f in frames if len(f)]
+        if not frames:
+            return tweets_to_frame([])
+        tweets = pd.concat(frames, ignore_index=True)
+        times = tweets['tweet_created_at']
+        tweets = tweets[(times >= start) & (times < end)]
+        return tweets.sort_values('tweet_created_at', kind='stable').reset_index(drop=True)
+
+    def get_ambient_tweets(self, anchor, dates, collection):
+        """Same call as get_ambient_tweets, served from the cache where possible"""
+        return frame_to_tweets(self.fetch(anchor, dates[0], dates[-1], collection))
@@ -0,0 +1,199 @@
+"""
+DBSCAN sweeps over geotagged tweets.
+
+Tweets sharing a coordinate are collapsed to one point weighted by its
+count. The haversine neighbor graph is built once with a BallTree at the
+largest eps; every smaller eps only drops the longer edges from that
+graph, and DBSCAN is read off the remaining edges with a weighted degree
+count and connected components. Cluster and noise counts are the same
+as refitting DBSCAN(metric='haversine') on the raw coordinates for each
+eps; as in DBSCAN itself, a border point next to two clusters may go to
+either.
+
+sweep_groups runs the sweep for every (team, season) group on a process
+pool. From the command line, on a CSV or parquet file of geotagged
+tweets with lat and lon columns plus the grouping columns:
+
+    python -m ekthesis.clusters geo_tweets.parquet --by team season --workers 8 --output sweep.csv
+"""
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+from sklearn.neighbors import NearestNeighbors
+
+EARTH_RADIUS_M = 6371000
+EPS_KM = [25, 50, 75, 100]
+MIN_SAMPLES = 15
+
+
+def eps_radians(eps_km):
+    return eps_km * 1000 / EARTH_RADIUS_M
+
+
+def unique_coords(lat, lon):
+    """Distinct (lat, lon) pairs, their counts, and each input's row among them"""
+    coords = np.column_stack([np.asarray(lat, dtype=float), np.asarray(lon, dtype=float)])
+    unique, inverse, counts = np.unique(coords, axis=0, return_inverse=True, return_counts=True)
+    return unique, counts, inverse.ravel()
+
+
+def dbscan_labels(rows, cols, neighbor_weight, min_samples):
+    """
+    DBSCAN on a symmetric neighbor graph given as (rows, cols) edge
+    lists sorted by row, where `neighbor_weight` is each point's total
+    weight within eps (its own included): core points reach `min_samples`, clusters are connected
+    components of core points, and each border point joins its
+    lowest-numbered neighboring cluster, the one sklearn's expansion
+    reaches first.
+    """
+    n = len(neighbor_weight)
+    core = neighbor_weight >= min_samples
+
+    labels = np.full(n, -1, dtype=np.int64)
+    core_edge = core[rows] & core[cols]
+    # `rows` are sorted (the edges come out of a CSR graph), so the core
+    # subgraph can be laid out as CSR directly without a sort
+    core_rows, core_cols = rows[core_edge], cols[core_edge]
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(core_rows, minlength=n))])
+    adjacency = sparse.csr_matrix((np.ones(len(core_cols)), core_cols, indptr), shape=(n, n))
+    # The graph is symmetric, so its strong components are DBSCAN's
+    # clusters, and finding them needs no transpose
+    _, component = connected_components(adjacency, directed=True, connection='strong')
+    # Number clusters by their lowest core point, as DBSCAN does
+    _, labels[core] = np.unique(component[core], return_inverse=True)
+
+    border_edge = ~core[rows] & core[cols]
+    border, cluster = rows[border_edge], labels[cols[border_edge]]
+    order = np.lexsort((cluster, border))
+    border, first = np.unique(border[order], return_index=True)
+    labels[border] = cluster[order][first]
+    return labels
+
+
+def dbscan_sweep(lat, lon, eps_km=EPS_KM, min_samples=MIN_SAMPLES):
+    """
+    DBSCAN labels of every point for each eps in `eps_km`, as an
+    (n_points x len(eps_km)) array; -1 is noise.
+    """
+    unique, counts, inverse = unique_coords(lat, lon)
+    labels = np.full((len(inverse), len(eps_km)), -1, dtype=np.int64)
+    if not len(unique):
+        return labels
+
+    X = np.radians(unique)
+    tree = NearestNeighbors(radius=eps_radians(max(eps_km)), metric='haversine',
+                            algorithm='ball_tree').fit(X)
+    graph = tree.radius_neighbors_graph(mode='distance')
+    rows = np.repeat(np.arange(len(unique)), np.diff(graph.indptr))
+    cols, dist = graph.indices, graph.data
+    weights = counts.astype(float)
+
+    for j, eps in enumerate(eps_km):
+        keep = dist <= eps_radians(eps)
+        r, c = rows[keep], cols[keep]
+        neighbor_weight = weights + np.bincount(r, weights=weights[c], minlength=len(unique))
+        labels[:, j] = dbscan_labels(r, c, neighbor_weight, min_samples)[inverse]
+    return labels
+
+
+def sweep_summary(labels, eps_km=EPS_KM):
+    """Cluster count and noise share per eps, as the notebook printed them"""
+    rows = []
+    for j, eps in enumerate(eps_km):
+        col = labels[:, j]
+        n_noise = int((col == -1).sum())
+        rows.append({
+            'eps_km': eps,
+            'n_clusters': len(set(col.tolist()) - {-1}),
+            'n_noise': n_noise,
+            'pct_noise': n_noise / len(col) * 100 if len(col) else np.nan,
+        })
+    return rows
+
+
+def _sweep_group(args):
+    key, lat, lon, eps_km, min_samples = args
+    return key, dbscan_sweep(lat, lon, eps_km, min_samples)
+
+
+def sweep_groups(tweets, by=('team', 'season'), eps_km=EPS_KM, min_samples=MIN_SAMPLES,
+                 workers=1):
+    """
+    Run dbscan_sweep for every group of `tweets` (lat/lon columns) on a
+    process pool of `workers`.
+
+    Returns a summary with one row per group and eps, and a frame of
+    cluster_<eps> label columns aligned with `tweets`.
+    """
+    by = list(by)
+    groups = tweets.groupby(by, sort=True).indices
+    tasks = [(key, tweets['lat'].to_numpy()[idx], tweets['lon'].to_numpy()[idx], list(eps_km), min_samples)
+             for key, idx in groups.items()]
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_sweep_group, tasks))
+    else:
+        results = [_sweep_group(t) for t in tasks]
+
+    labels = np.full((len(tweets), len(eps_km)), -1, dtype=np.int64)
+    summary = []
+    for key, group_labels in results:
+        labels[groups[key]] = group_labels
+        key = key if isinstance(key, tuple) else (key,)
+        for row in sweep_summary(group_labels, eps_km):
+            summary.append({**dict(zip(by, key)), **row})
+
+    label_frame = pd.DataFrame(labels, index=tweets.index,
+                               columns=[f'cluster_{eps}' for eps in eps_km])
+    return pd.DataFrame(summary), label_frame
+
+
+def read_tweets(path):
+    """Geotagged tweets from a .parquet or .csv file"""
+    if os.path.splitext(path)[1] == '.parquet':
+        return pd.read_parquet(path)
+    return pd.read_csv(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('tweets', help='CSV or parquet file of tweets with lat and lon columns')
+    parser.add_argument('--by', nargs='+', default=['team', 'season'],
+                        help='columns to sweep each group of (default: team season)')
+    parser.add_argument('--eps', type=float, nargs='+', default=EPS_KM, metavar='KM',
+                        help=f"eps values in km (default: {' '.join(map(str, EPS_KM))})")
+    parser.add_argument('--min-samples', type=int, default=MIN_SAMPLES,
+                        help=f'DBSCAN min_samples (default: {MIN_SAMPLES})')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='sweeping processes')
+    parser.add_argument('--output', help='CSV to write the summary to (default: print it)')
+    parser.add_argument('--labels', help='CSV to write the tweets with their cluster_<eps> columns to')
+    args = parser.parse_args(argv)
+
+    tweets = read_tweets(args.tweets).dropna(subset=['lat', 'lon'])
+    missing = [column for column in args.by if column not in tweets]
+    if missing:
+        parser.error(f"no {', '.join(missing)} column in {args.tweets}")
+    # Whole km stay ints so the label columns read cluster_25, as EPS_KM gives
+    eps_km = [int(eps) if float(eps).is_integer() else eps for eps in args.eps]
+
+    summary, labels = sweep_groups(tweets, by=args.by, eps_km=eps_km, min_samples=args.min_samples,
+                                   workers=args.workers)
+    if args.output:
+        summary.to_csv(args.output, index=False)
+    else:
+        print(summary.to_string(index=False))
+    if args.labels:
+        tweets.join(labels).to_csv(args.labels, index=False)
+    return summary
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,283 @@
+"""
+Persisted per-game tweet counts at fine resolution.
+
+Each game gets a row of 5-minute counts covering 15 days either side of
+its kickoff hour (the ±14 day analyses plus their end bins), stored as a
+uint32 .npy file that is memory-mapped on load. The game_id and kickoff
+of every row are kept in a CSV next to it, and a JSON file records which
+tweet query the counts came from and a hash of that index, so a matrix
+is rebuilt rather than reused when either no longer matches.
+Hourly, half-hourly, ±72h or ±7 day analyses, and daily totals around
+gameday, are then slices and sums of this matrix, with no database access.
+
+Row columns are measured from the kickoff floored to the hour, so any
+bin width that divides an hour can be read off with clock alignment.
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from ekthesis import REPO_ROOT, trace
+from ekthesis.binning import bin_counts
+from ekthesis.fetch import fetch_game_tweets, to_utc
+
+DEFAULT_PATH = os.path.join(REPO_ROOT, 'game_counts_5min.npy')
+
+FINE_WIDTH = pd.Timedelta('5min')
+SPAN = pd.Timedelta(days=15)
+
+# Bump when the layout of the matrix changes, so existing matrices are rebuilt
+COUNTS_VERSION = 1
+
+
+def index_path(path):
+    return os.path.splitext(path)[0] + '_games.csv'
+
+
+def meta_path(path):
+    return os.path.splitext(path)[0] + '_meta.json'
+
+
+def query_identity(query):
+    """
+    Stable description of the tweet `query` counts are made with: module
+    and name for functions, plus the query a cache or archive wraps.
+    """
+    if query is None:
+        return None
+    name = f"{getattr(query, '__module__', '')}.{getattr(query, '__qualname__', type(query).__name__)}"
+    # A TweetCache or TweetArchive method answers from the query it was given
+    owner = getattr(query, '__self__', None)
+    if owner is not None and hasattr(owner, 'query'):
+        name += f"({query_identity(owner.query)})"
+    return name
+
+
+def index_hash(index):
+    """Hash of the game_id and kickoff_utc of every row of a matrix"""
+    kickoff = pd.to_datetime(index['kickoff_utc'], utc=True).dt.as_unit('ns')
+    rows = pd.util.hash_pandas_object(pd.DataFrame({'game_id': index['game_id'].astype(str),
+                                                    'kickoff_utc': kickoff}), index=False)
+    return hashlib.sha1(rows.to_numpy().tobytes()).hexdigest()
+
+
+def save_index(index, path, query):
+    """Write the row index of the matrix at `path` and the metadata that validates it"""
+    index.to_csv(index_path(path), index=False)
+    meta = {'version': COUNTS_VERSION, 'query': query, 'games': index_hash(index)}
+    with open(meta_path(path), 'w') as f:
+        json.dump(meta, f, indent=1)
+
+
+def remove_count_matrix(path):
+    for name in (path, index_path(path), meta_path(path)):
+        if os.path.exists(name):
+            os.remove(name)
+
+
+def build_count_matrix(games, collection, path=DEFAULT_PATH, query=None, workers=1):
+    """
+    Fetch and bin every game in `games` into the fine count matrix at `path`.
+    `games` needs the 'kickoff_utc' column from load_games. Seasons are fetched one at
+    a time so only one season of tweets is in memory.
+    """
+    games = games.dropna(subset=['kickoff_utc']).reset_index(drop=True)
+    origin = games['kickoff_utc'].dt.floor('h')
+    n_bins = int(2 * SPAN // FINE_WIDTH)
+
+    tmp_path = path + '.tmp.npy'
+    counts = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.uint32,
+                                       shape=(len(games), n_bins))
+
+    for season in sorted(games['season'].unique()):
+        rows = np.flatnonzero((games['season'] == season).to_numpy())
+        season_games = games.iloc[rows]
+
+        # Window starts at the floored kickoff, up to an hour before kickoff itself
+        tweets = fetch_game_tweets(
+            season_games, collection, at='kickoff_utc', freq='h', query=query,
+            before=SPAN + pd.Timedelta(hours=1), after=SPAN, workers=workers
+        )
+        game_idx = pd.Index(season_games['game_id']).get_indexer(tweets['game_id'])
+        counts[rows] = bin_counts(
+            tweets['tweet_created_at'], origin.iloc[rows].iloc[game_idx], game_idx,
+            len(rows), FINE_WIDTH, -SPAN, SPAN, align=False
+        )
+
+    counts.flush()
+    del counts
+    os.replace(tmp_path, path)
+
+    index = pd.DataFrame({'game_id': games['game_id'], 'kickoff_utc': games['kickoff_utc']})
+    save_index(index, path, query_identity(query))
+    return load_count_matrix(path)
+
+
+def load_count_matrix(path=DEFAULT_PATH):
+    return CountMatrix(path)
+
+
+def append_count_matrix(matrix, new, path, keep=None, chunk_rows=1024):
+    """
+    Rows of `matrix` (only those where the boolean `keep` is set, if
+    given) followed by those of `new` in one matrix at `path`
+    """
+    if matrix.counts.shape[1] != new.counts.shape[1]:
+        raise ValueError("Count matrices with different bins cannot be merged")
+    kept = np.arange(len(matrix)) if keep is None else np.flatnonzero(keep)
+    tmp_path = path + '.tmp.npy'
+    counts = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.uint32,
+                                       shape=(len(kept) + len(new), matrix.counts.shape[1]))
+    at = 0
+    for part, rows in ((matrix.counts, kept), (new.counts, np.arange(len(new)))):
+        for lo in range(0, len(rows), chunk_rows):
+            chunk = part[rows[lo:lo + chunk_rows]]
+            counts[at:at + len(chunk)] = chunk
+            at += len(chunk)
+    counts.flush()
+    del counts
+    os.replace(tmp_path, path)
+
+    index = pd.concat([matrix.games[['game_id', 'kickoff_utc']].iloc[kept], new.games[['game_id', 'kickoff_utc']]],
+                      ignore_index=True)
+    save_index(index, path, new.meta.get('query'))
+    return load_count_matrix(path)
+
+
+def count_matrix_for(games, connect, path=DEFAULT_PATH, **fetch_kwargs):
+    """
+    Load the count matrix, first adding rows for the games in `games` it
+    is missing. Games without a kickoff_utc never get a row, so they do
+    not count as missing. Only the missing games are fetched, and rows of
+    games outside `games` are kept, so selections sharing a matrix do not
+    evict each other. `connect` is only called when games have to be
+    fetched and should return the tweet collection.
+
+    The matrix is built again from scratch when it was counted with
+    another query (fetch_kwargs['query']), an older COUNTS_VERSION, or
+    its index does not match the hash stored with it. Games whose
+    kickoff_utc has changed since their row was counted are fetched
+    again and their rows replaced.
+    """
+    games = games.dropna(subset=['kickoff_utc'])
+    if not os.path.exists(path):
+        return build_count_matrix(games, connect(), path=path, **fetch_kwargs)
+
+    matrix = load_count_matrix(path)
+    meta = matrix.meta
+    if (meta.get('version') != COUNTS_VERSION
+            or meta.get('query') != query_identity(fetch_kwargs.get('query'))
+            or meta.get('games') != index_hash(matrix.games)
+            or len(matrix.games) != len(matrix.counts)):
+        del matrix
+        remove_count_matrix(path)
+        return build_count_matrix(games, connect(), path=path, **fetch_kwargs)
+
+    rows = matrix.rows(games['game_id'])
+    found = rows >= 0
+    counted = matrix.games['kickoff_utc'].dt.tz_localize(None).to_numpy()[rows[found]]
+    kickoff = to_utc(games['kickoff_utc']).dt.tz_localize(None).to_numpy()[found]
+    stale = np.zeros(len(matrix), dtype=bool)
+    stale[rows[found][counted != kickoff]] = True
+
+    missing = games[~found | stale[rows]]
+    if missing.empty:
+        return matrix
+
+    new_path = os.path.splitext(path)[0] + '_new.npy'
+    new = build_count_matrix(missing, connect(), path=new_path, **fetch_kwargs)
+    matrix = append_count_matrix(matrix, new, path, keep=~stale)
+    del new
+    remove_count_matrix(new_path)
+    return matrix
+
+
+class CountMatrix:
+    """Memory-mapped fine counts plus the game each row belongs to"""
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.counts = np.load(path, mmap_mode='r')
+        self.games = pd.read_csv(index_path(path))
+        self.games['kickoff_utc'] = pd.to_datetime(self.games['kickoff_utc'], utc=True)
+        # Matrices written before the metadata existed have none, and are rebuilt by count_matrix_for
+        self.meta = {}
+        if os.path.exists(meta_path(path)):
+            with open(meta_path(path)) as f:
+                self.meta = json.load(f)
+        self.origin = self.games['kickoff_utc'].dt.floor('h')
+
+    def __len__(self):
+        return len(self.games)
+
+    def rows(self, game_ids):
+        """Row numbers for `game_ids`; games not in the matrix are -1"""
+        return pd.Index(self.games['game_id']).get_indexer(game_ids)
+
+    @trace.timed('aggregate')
+    def curve(self, width, start, stop, game_ids=None, align=True):
+        """
+        (n_games x n_bins) counts in bins of `width` covering offsets
+        [start, stop) from kickoff, floored to `width` when `align` is set.
+        Games not in the matrix come back as rows of zeros.
+        """
+        width, start, stop = pd.Timedelta(width), pd.Timedelta(start), pd.Timedelta(stop)
+        if width % FINE_WIDTH or start % FINE_WIDTH:
+            raise ValueError(f"Bins must be multiples of {FINE_WIDTH}")
+        factor = width // FINE_WIDTH
+        n_bins = int((stop - start) // width)
+
+        rows = np.arange(len(self)) if game_ids is None else self.rows(game_ids)
+        found = rows >= 0
+        kickoff = self.games['kickoff_utc'].iloc[rows[found]]
+        ref = kickoff.dt.floor(width) if align else kickoff
+
+        # Where each game's first bin starts, in fine columns
+        origin = self.origin.iloc[rows[found]]
+        shift = (ref.dt.tz_localize(None).to_numpy() - origin.dt.tz_localize(None).to_numpy()) // FINE_WIDTH.to_timedelta64()
+        first = shift + int((start + SPAN) // FINE_WIDTH)
+        last = first + n_bins * factor
+        if first.min(initial=0) < 0 or last.max(initial=0) > self.counts.shape[1]:
+            raise ValueError(f"Offsets must stay within ±{SPAN} of kickoff")
+
+        cols = first[:, None] + np.arange(n_bins * factor)[None, :]
+        fine = self.counts[rows[found][:, None], cols].astype(np.int64)
+
+        out = np.zeros((len(rows), n_bins), dtype=np.int64)
+        out[found] = fine.reshape(len(fine), n_bins, factor).sum(axis=2)
+        return out
+
+    @trace.timed('aggregate')
+    def span(self, game_ids, starts, width, n_bins):
+        """
+        (n_games x n_bins) counts in bins of `width` from each game's own
+        UTC start time in `starts` (naive values are taken as UTC), e.g.
+        calendar days around gameday. Games not in the matrix come back as
+        rows of zeros.
+        """
+        width = pd.Timedelta(width)
+        if width % FINE_WIDTH:
+            raise ValueError(f"Bins must be multiples of {FINE_WIDTH}")
+        factor = width // FINE_WIDTH
+
+        rows = self.rows(game_ids)
+        found = rows >= 0
+        starts = to_utc(pd.Series(starts)).dt.tz_localize(None).to_numpy()[found]
+        origin = self.origin.iloc[rows[found]].dt.tz_localize(None).to_numpy()
+        offset = starts - (origin - SPAN.to_timedelta64())
+        if (offset % FINE_WIDTH.to_timedelta64()).any():
+            raise ValueError(f"Start times must fall on the {FINE_WIDTH} grid of the matrix")
+        first = offset // FINE_WIDTH.to_timedelta64()
+        last = first + n_bins * factor
+        if first.min(initial=0) < 0 or last.max(initial=0) > self.counts.shape[1]:
+            raise ValueError(f"Bins must stay within ±{SPAN} of kickoff")
+
+        cols = first[:, None] + np.arange(n_bins * factor)[None, :]
+        fine = self.counts[rows[found][:, None], cols].astype(np.int64)
+
+        out = np.zeros((len(rows), n_bins), dtype=np.int64)
+        out[found] = fine.reshape(len(fine), n_bins, factor).sum(axis=2)
+        return out
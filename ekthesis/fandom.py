@@ -0,0 +1,257 @@
+"""
+Fandom radius of every team.
+
+Geotagged tweets around each team's games (its own anchors plus both
+matchup hashtags, ±3 days) are fetched with one query per run of
+overlapping windows of an anchor, for all teams together, since a
+matchup's hashtags serve both of its teams, and routed to each team's
+windows. Broad team anchors are tweeted all season, so they are only
+queried around games; block='season' queries each anchor once over the
+whole season instead. They are then assigned
+to metro areas in one bulk lookup for all teams (MetroIndex or the
+cached MetroGrid), and their distance to the team's home city is
+computed in one vectorized step. Distances are measured in the
+EPSG:5070 equal-area projection, as fandom_radius_all_teams.csv was.
+
+Per team and season (and overall), metros are sorted by mean tweet
+distance, a baseline activity level is taken from the outer 70% of
+cumulative metro population, and the radius is the smallest distance at
+which tweets per 100k residents fall to that baseline.
+"""
+
+import threading
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+from data_mountain_query.query import get_ambient_tweets
+from pyproj import Transformer
+
+from ekthesis.fetch import (MATCHUP_ANCHORS, game_windows, map_blocks, object_array, parse_times,
+                            plan_blocks, query_block)
+from ekthesis.metros import POP_YEARS
+from ekthesis.teams import TEAM_CONFIG
+
+DISTANCE_CRS = "EPSG:5070"
+POP_BASELINE_FRAC = 0.7
+SEASON_MIN = 2011
+SEASON_MAX = 2014
+
+TWEET_FIELDS = ["_id", "tweet_created_at", "geo"]
+
+
+def geo_coordinates(geo):
+    """lon and lat arrays from tweet `geo` fields, NaN where a tweet has none"""
+    lon = np.full(len(geo), np.nan)
+    lat = np.full(len(geo), np.nan)
+    for i, g in enumerate(geo):
+        if isinstance(g, dict) and g.get("coordinates"):
+            lon[i], lat[i] = g["coordinates"][0], g["coordinates"][1]
+    return lon, lat
+
+
+def team_windows(games, teams=TEAM_CONFIG, seasons=(SEASON_MIN, SEASON_MAX)):
+    """
+    One row per (team, game, anchor) with its window: the team's own
+    anchors and both matchup hashtags over [gameday-3d, gameday+3d), the
+    window fandom_radius_all_teams.csv was built from. A game's matchup
+    windows appear once for each of its teams.
+    """
+    frames = []
+    for team, cfg in teams.items():
+        team_games = games[
+            games["season"].between(*seasons) &
+            ((games["home_team"] == team) | (games["away_team"] == team))
+        ]
+        # The team's own anchors are the same for every game; the matchup
+        # templates give #TEAMvsOPP and #OPPvsTEAM
+        windows = game_windows(team_games, before=timedelta(days=3), after=timedelta(days=3),
+                               anchors=list(cfg["anchors"]) + MATCHUP_ANCHORS)
+        windows.insert(0, "team", team)
+        frames.append(windows)
+    return pd.concat(frames, ignore_index=True)
+
+
+def route_block(columns, block_windows, team_codes):
+    """
+    Geotagged tweets of one query, routed to every window of the block
+    they fall in: team code, season, _id, lon and lat per (window, tweet).
+    """
+    lon, lat = geo_coordinates(columns["geo"])
+    has_geo = ~(np.isnan(lon) | np.isnan(lat))
+    ids = object_array(columns["_id"])[has_geo]
+    lon, lat = lon[has_geo], lat[has_geo]
+    times = parse_times(object_array(columns["tweet_created_at"])[has_geo])
+    order = np.argsort(times, kind="stable")
+    sorted_times = times[order]
+
+    lo = np.searchsorted(sorted_times, block_windows["start"].dt.tz_localize(None).to_numpy(), side="left")
+    hi = np.searchsorted(sorted_times, block_windows["end"].dt.tz_localize(None).to_numpy(), side="left")
+    n = np.maximum(hi - lo, 0)
+
+    # Positions lo..hi-1 of every window, back to back
+    window = np.repeat(np.arange(len(block_windows)), n)
+    pos = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n) + np.repeat(lo, n)
+    idx = order[pos]
+    return {
+        "team": team_codes.get_indexer(block_windows["team"])[window],
+        "season": block_windows["season"].to_numpy(dtype=np.int64)[window],
+        "_id": ids[idx],
+        "lon": lon[idx],
+        "lat": lat[idx],
+    }
+
+
+def fetch_team_tweets(games, collection, teams=TEAM_CONFIG, seasons=(SEASON_MIN, SEASON_MAX),
+                      query=None, workers=1, block="window"):
+    """
+    Geotagged tweets within 3 days of every game of every team in `teams`.
+    One row per (team, tweet) with team, season, lon and lat; a tweet
+    seen around several games of a team counts once, for the earliest.
+
+    The windows of all teams are planned together: each anchor is queried
+    once per block (per run of overlapping windows, or per season with
+    block='season'), however many teams and games need it, and its
+    tweets are routed to every (team, game) window they fall in.
+    """
+    if query is None:
+        query = get_ambient_tweets
+    team_codes = pd.Index(list(teams))
+    windows = plan_blocks(team_windows(games, teams, seasons), block)
+    blocks = [w for _, w in windows.groupby("block", sort=True)]
+    in_flight = threading.BoundedSemaphore(workers)
+
+    def run(block_windows):
+        columns = query_block(block_windows, collection, query, TWEET_FIELDS, "D", in_flight)
+        return route_block(columns, block_windows, team_codes)
+
+    routed = map_blocks(run, blocks, workers)
+    routed = {key: np.concatenate([r[key] for r in routed] or [np.empty(0)])
+              for key in ["team", "season", "_id", "lon", "lat"]}
+
+    # Deduplicate by _id while routing: per team, keep the earliest season
+    # a tweet falls in (ties keep the first routed)
+    team = routed["team"].astype(np.int64)
+    season = routed["season"].astype(np.int64)
+    tweet = pd.factorize(routed["_id"])[0]
+    order = np.lexsort((np.arange(len(team)), season, tweet, team))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = (team[order][1:] != team[order][:-1]) | (tweet[order][1:] != tweet[order][:-1])
+    keep = np.sort(order[first])
+    keep = keep[np.lexsort((season[keep], team[keep]))]
+
+    return pd.DataFrame({
+        "team": team_codes.to_numpy()[team[keep]] if len(keep) else np.empty(0, dtype=object),
+        "season": season[keep].astype(int),
+        "lon": routed["lon"][keep].astype(float),
+        "lat": routed["lat"][keep].astype(float),
+    })
+
+
+def fandom_radius(metro_dist, baseline_frac=POP_BASELINE_FRAC):
+    """
+    Radius in km for one team from its per-metro tweet_count,
+    mean_distance_km and population; also returns the metros with
+    tweets_per_100k and cum_population added.
+    """
+    metro_dist = metro_dist.copy()
+    metro_dist["tweets_per_100k"] = metro_dist["tweet_count"] / metro_dist["population"] * 100_000
+    metro_dist = metro_dist.sort_values("mean_distance_km")
+    metro_dist["cum_population"] = metro_dist["population"].cumsum()
+
+    # Distance where the outer baseline population begins
+    pop_baseline = baseline_frac * metro_dist["population"].sum()
+    baseline_start_dist = metro_dist.loc[
+        metro_dist["cum_population"] >= pop_baseline, "mean_distance_km"
+    ].min()
+
+    # Average activity in baseline region
+    baseline_activity = metro_dist.loc[
+        metro_dist["mean_distance_km"] >= baseline_start_dist, "tweets_per_100k"
+    ].mean()
+
+    # Radius where activity drops to baseline, or the farthest metro if it never does
+    radius_km = metro_dist.loc[
+        metro_dist["tweets_per_100k"] <= baseline_activity, "mean_distance_km"
+    ].min()
+    if pd.isna(radius_km):
+        radius_km = metro_dist["mean_distance_km"].max()
+    return radius_km, metro_dist
+
+
+def metro_table(tweets, metros, keys, population):
+    """Tweet count, mean distance and population per `keys` + metro, in CBSAFP order"""
+    in_metro = tweets[tweets["metro"] >= 0]
+    grouped = (
+        in_metro.groupby(keys + ["metro"], sort=False)
+        .agg(tweet_count=("distance_km", "size"), mean_distance_km=("distance_km", "mean"),
+             lat=("lat", "mean"), lon=("lon", "mean"))
+        .reset_index()
+    )
+    rows = grouped["metro"].to_numpy()
+    grouped["CBSAFP"] = metros["CBSAFP"].to_numpy()[rows]
+    grouped["NAME"] = metros["NAME"].to_numpy()[rows]
+    grouped["population"] = population(grouped)
+    grouped = grouped.dropna(subset=["population"])
+    return grouped.sort_values(keys + ["CBSAFP", "NAME"], kind="stable").reset_index(drop=True)
+
+
+def fandom_radii(tweets, index, teams=TEAM_CONFIG):
+    """
+    Fandom radius per team and season plus an 'overall' row per team, in
+    the layout of fandom_radius_all_teams.csv. Also returns the overall
+    per-metro table (with mean tweet lat/lon) for mapping.
+    """
+    metros = index.metros
+    tweets = tweets.copy()
+    tweets["metro"] = index.assign(tweets["lon"], tweets["lat"])
+
+    # Tweets go through the metros' CRS first, the way the sjoin output was projected
+    team_codes = list(teams)
+    team_idx = pd.Index(team_codes).get_indexer(tweets["team"])
+    to_distance = Transformer.from_crs(metros.crs, DISTANCE_CRS, always_xy=True)
+    x, y = to_distance.transform(*index.project(tweets["lon"], tweets["lat"]))
+    cx, cy = Transformer.from_crs("EPSG:4326", DISTANCE_CRS, always_xy=True).transform(
+        np.array([teams[t]["lon"] for t in team_codes], dtype=float),
+        np.array([teams[t]["lat"] for t in team_codes], dtype=float),
+    )
+    tweets["distance_km"] = np.hypot(x - cx[team_idx], y - cy[team_idx]) / 1000
+
+    pop_by_year = {year: metros[f"population_{year}"].to_numpy() for year in POP_YEARS}
+
+    def season_population(table):
+        out = np.full(len(table), np.nan)
+        for season, pop in pop_by_year.items():
+            mask = (table["season"] == season).to_numpy()
+            out[mask] = pop[table["metro"].to_numpy()[mask]]
+        return out
+
+    seasons = metro_table(tweets, metros, ["team", "season"], season_population)
+    overall = metro_table(tweets, metros, ["team"],
+                          lambda t: metros["population_avg_2011_2014"].to_numpy()[t["metro"].to_numpy()])
+
+    n_tweets = tweets.groupby(["team", "season"]).size()
+    season_groups = dict(list(seasons.groupby(["team", "season"], sort=False)))
+    overall_groups = dict(list(overall.groupby("team", sort=False)))
+
+    results, overall_metros = [], []
+    for team in team_codes:
+        cfg = teams[team]
+        row = {"team_name": cfg["name"], "city": cfg["city"], "lat": cfg["lat"], "lon": cfg["lon"]}
+        if team not in n_tweets.index.get_level_values("team"):
+            continue
+
+        for season, count in n_tweets.loc[team].items():
+            metro_dist = season_groups.get((team, season), seasons.iloc[:0])
+            radius_km, metro_dist = fandom_radius(metro_dist)
+            results.append({**row, "season": int(season), "radius_km": radius_km,
+                             "n_tweets": int(count), "n_metros": len(metro_dist)})
+
+        radius_km, metro_dist = fandom_radius(overall_groups.get(team, overall.iloc[:0]))
+        results.append({**row, "season": "overall", "radius_km": radius_km,
+                        "n_tweets": int(n_tweets.loc[team].sum()), "n_metros": len(metro_dist)})
+        overall_metros.append(metro_dist)
+
+    columns = ["team_name", "city", "season", "lat", "lon", "radius_km", "n_tweets", "n_metros"]
+    overall_metros = pd.concat(overall_metros, ignore_index=True) if overall_metros else overall.iloc[:0]
+    return pd.DataFrame(results, columns=columns), overall_metros
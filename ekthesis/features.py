@@ -0,0 +1,126 @@
+"""
+Model features from game_attention.csv.
+
+design_matrix builds the design matrix the modeling notebooks each built
+inline:
+- gametime as minutes after midnight
+- the numeric columns as they are
+- weekday and both teams one-hot encoded with the first level dropped
+
+Its columns are in the order pd.get_dummies gave them. The matrix is a
+sparse float32 CSR, since all but a handful of entries per row are team
+dummies. It is cached under CACHE_DIR keyed by the hash of the CSV, the
+column spec and FEATURES_VERSION, so loading it again is one .npz read.
+
+The target is chosen at load time with attention_target: 'log1p' (the
+tree models) or 'log10' (the linear models, which drop zero-attention
+games first). It stays float64, as the notebooks fit it.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from ekthesis import CACHE_DIR, REPO_ROOT
+from ekthesis.games import file_hash
+
+ATTENTION_PATH = os.path.join(REPO_ROOT, 'game_attention.csv')
+
+NUMERIC_COLUMNS = [
+    'season', 'week', 'gametime', 'home_win_pct', 'away_win_pct', 'num_lead_changes',
+    'total_score', 'score_differential', 'overtime',
+]
+CATEGORICAL_COLUMNS = ['weekday', 'home_team', 'away_team']
+
+# Per-game columns kept next to the matrix for splitting and labelling
+ID_COLUMNS = ['game_id', 'date', 'home_team', 'away_team', 'attention']
+
+# Bump whenever encode changes the matrix it builds, so cached matrices are rebuilt
+FEATURES_VERSION = 1
+
+TARGETS = {
+    'log1p': np.log1p,
+    'log10': np.log10,
+}
+
+
+def gametime_minutes(gametime):
+    """'HH:MM' kickoff strings as minutes after midnight"""
+    parts = gametime.str.split(':', expand=True).astype(int)
+    return parts[0] * 60 + parts[1]
+
+
+def load_attention(path=ATTENTION_PATH):
+    """game_attention.csv with log_attention, a parsed date and gametime in minutes"""
+    games = pd.read_csv(path)
+    games['log_attention'] = np.log1p(games['attention'])
+    games['date'] = pd.to_datetime(games['date'])
+    games['gametime'] = gametime_minutes(games['gametime'])
+    return games
+
+
+def encode(games):
+    """Sparse float32 design matrix of `games` and its column names"""
+    blocks = [sparse.csr_matrix(games[NUMERIC_COLUMNS].to_numpy(dtype=np.float32))]
+    names = list(NUMERIC_COLUMNS)
+    rows = np.arange(len(games))
+
+    for column in CATEGORICAL_COLUMNS:
+        codes = pd.Categorical(games[column])
+        levels = list(codes.categories)[1:]
+        # Level 0 is the dropped one, so it gets no column
+        present = codes.codes > 0
+        blocks.append(sparse.csr_matrix(
+            (np.ones(present.sum(), dtype=np.float32), (rows[present], codes.codes[present] - 1)),
+            shape=(len(games), len(levels)),
+        ))
+        names += [f'{column}_{level}' for level in levels]
+
+    return sparse.hstack(blocks, format='csr', dtype=np.float32), names
+
+
+def design_matrix(path=ATTENTION_PATH, cache=True):
+    """
+    Design matrix X of every game in `path`, its column names, and a frame
+    of ID_COLUMNS with one row per row of X. Read from the cache when the
+    file and the encoding are unchanged.
+    """
+    spec = (FEATURES_VERSION, NUMERIC_COLUMNS, CATEGORICAL_COLUMNS, ID_COLUMNS, np.dtype(np.float32).str)
+    cache_path = os.path.join(CACHE_DIR, f"features_{file_hash(path, repr(spec).encode())[:16]}.npz")
+    if cache and os.path.exists(cache_path):
+        saved = np.load(cache_path, allow_pickle=False)
+        X = sparse.csr_matrix((saved['data'], saved['indices'], saved['indptr']),
+                              shape=tuple(saved['shape']))
+        games = pd.DataFrame({column: saved[column] for column in ID_COLUMNS})
+        return X, saved['names'].tolist(), games
+
+    games = load_attention(path)
+    X, names = encode(games)
+    games = games[ID_COLUMNS].reset_index(drop=True)
+    if cache:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        # Plain arrays only (strings as fixed-width unicode), so no pickles
+        columns = {column: games[column].to_numpy() for column in ID_COLUMNS}
+        for column in ['game_id', 'home_team', 'away_team']:
+            columns[column] = columns[column].astype(str)
+        np.savez(cache_path, data=X.data, indices=X.indices, indptr=X.indptr,
+                 shape=np.array(X.shape), names=np.array(names), **columns)
+    return X, names, games
+
+
+def attention_target(games, target='log1p'):
+    """Model target from the games' attention"""
+    return TARGETS[target](games['attention'].to_numpy())
+
+
+def attention_features(path=ATTENTION_PATH, target='log1p', min_attention=0, cache=True):
+    """
+    X, y, column names and per-game frame for every game with at least
+    `min_attention` tweets (1 for a log10 target).
+    """
+    X, names, games = design_matrix(path, cache=cache)
+    keep = (games['attention'] >= min_attention).to_numpy()
+    games = games[keep].reset_index(drop=True)
+    return X[keep], attention_target(games, target), names, games
@@ -0,0 +1,332 @@
+"""
+Batched tweet fetching for many games at once.
+
+The scripts used to call get_ambient_tweets once per anchor per game.
+Here the games are grouped into blocks (a whole season, or a run of
+overlapping windows) and every anchor is queried once per block. The
+tweets that come back are split to the games whose window they fall in,
+so a season costs one query per anchor instead of one per anchor per game.
+
+Windows are half-open [start, end) in UTC. Naive timestamps are taken to
+be UTC, which is how the tweet store compares them.
+
+Blocks can be fetched on a thread pool. All workers share the one
+collection from get_connection (pymongo clients are thread-safe), and a
+semaphore caps how many queries are open against the store at once.
+Results are assembled in block order, so the output does not depend on
+which worker finishes first.
+
+When only counts are needed, count_game_tweets consumes each cursor
+lazily instead: timestamps are parsed in fixed-size batches and folded
+into per-game period counts, so memory does not grow with the number of
+tweets an anchor returns. Given a `count_query` such as
+ekthesis.aggregate.get_ambient_counts, the counting is pushed into the
+store instead and only (bucket, count) pairs are transferred.
+
+Queries and the parse and bin steps report to ekthesis.trace, which
+records them when tracing is enabled.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from data_mountain_query.query import get_ambient_tweets
+
+from ekthesis import trace
+
+# Matchup hashtags used by every script, filled in per game
+MATCHUP_ANCHORS = ["#{away}vs{home}", "#{home}vs{away}"]
+
+# Tweet fields kept from each document
+FIELDS = ["_id", "tweet_created_at"]
+
+# Tweets parsed at a time when counting
+BATCH_SIZE = 65536
+
+
+def to_utc(values):
+    """Parse timestamps to UTC, treating naive values as UTC"""
+    if isinstance(values, (pd.Series, pd.Index)):
+        values = pd.to_datetime(values)
+        if isinstance(values, pd.Series):
+            tz = values.dt.tz
+            return values.dt.tz_localize('UTC') if tz is None else values.dt.tz_convert('UTC')
+        return values.tz_localize('UTC') if values.tz is None else values.tz_convert('UTC')
+
+    ts = pd.Timestamp(values)
+    return ts.tz_localize('UTC') if ts.tz is None else ts.tz_convert('UTC')
+
+
+def window_dates(start, end, freq='D'):
+    """Dates to hand to get_ambient_tweets so the query spans [start, end]"""
+    dates = pd.date_range(start, end, freq=freq)
+    if len(dates) == 0 or dates[-1] != end:
+        dates = dates.append(pd.DatetimeIndex([end]))
+    return dates
+
+
+def game_windows(games, before, after, at='gameday', anchors=MATCHUP_ANCHORS):
+    """
+    One row per (game, anchor) with the UTC window to fetch.
+    `at` names the column the window is centered on (gameday or kickoff).
+    """
+    center = to_utc(games[at]).reset_index(drop=True)
+    frames = []
+    for template in anchors:
+        frames.append(pd.DataFrame({
+            'game_id': games['game_id'].to_numpy(),
+            'season': games['season'].to_numpy(),
+            'anchor': [template.format(away=a, home=h)
+                       for a, h in zip(games['away_team'], games['home_team'])],
+            'start': center - before,
+            'end': center + after,
+        }))
+
+    windows = pd.concat(frames, ignore_index=True)
+    return windows.dropna(subset=['start', 'end'])
+
+
+def plan_blocks(windows, block='season'):
+    """
+    Label each window with the query block it is fetched in.
+    block='season' queries each anchor once per season; block='window'
+    only merges windows of the same anchor that overlap.
+    """
+    windows = windows.sort_values(['anchor', 'start']).reset_index(drop=True)
+
+    if block == 'season':
+        keys = windows[['anchor', 'season']]
+        windows['block'] = keys.groupby(['anchor', 'season'], sort=False).ngroup()
+    elif block == 'window':
+        # A new block starts whenever a window begins after every earlier one ended
+        running_end = windows.groupby('anchor')['end'].cummax()
+        prev_end = running_end.groupby(windows['anchor']).shift()
+        new_block = prev_end.isna() | (windows['start'] > prev_end)
+        windows['block'] = new_block.cumsum() - 1
+    else:
+        raise ValueError(f"Unknown block mode: {block!r}")
+
+    return windows
+
+
+@trace.timed('parse')
+def collect_fields(cursor, fields=FIELDS):
+    """Pull only `fields` out of each tweet document, column by column"""
+    columns = {f: [] for f in fields}
+    for tweet in cursor:
+        for f in fields:
+            columns[f].append(tweet.get(f))
+    return columns
+
+
+@trace.timed('parse')
+def object_array(values):
+    """1-d object array, even when the values are themselves lists or dicts"""
+    arr = np.empty(len(values), dtype=object)
+    arr[:] = values
+    return arr
+
+
+@trace.timed('parse')
+def parse_times(values):
+    """Naive UTC datetime64 values, so they sort and compare as plain numbers"""
+    return to_utc(pd.Series(values, dtype=object)).dt.tz_localize(None).to_numpy()
+
+
+@trace.timed('parse')
+def iter_time_batches(cursor, batch_size=BATCH_SIZE, dedup=False):
+    """
+    Parsed tweet_created_at values from `cursor`, `batch_size` tweets at a
+    time. With `dedup`, tweets whose _id was already seen are skipped; only
+    the ids are kept for that, not the documents.
+    """
+    seen = set() if dedup else None
+    batch = []
+    for tweet in cursor:
+        if seen is not None:
+            _id = tweet.get('_id')
+            if _id in seen:
+                continue
+            seen.add(_id)
+        batch.append(tweet.get('tweet_created_at'))
+        if len(batch) == batch_size:
+            yield parse_times(batch)
+            batch = []
+    if batch:
+        yield parse_times(batch)
+
+
+@trace.timed('bin')
+def split_block(columns, block_windows):
+    """Route one block's tweets to every game window they fall in"""
+    times = parse_times(columns['tweet_created_at'])
+    order = np.argsort(times, kind='stable')
+    sorted_times = times[order]
+
+    pieces = []
+    for w in block_windows.itertuples(index=False):
+        lo = np.searchsorted(sorted_times, w.start.to_datetime64(), side='left')
+        hi = np.searchsorted(sorted_times, w.end.to_datetime64(), side='left')
+        if hi > lo:
+            pieces.append((w.game_id, w.anchor, order[lo:hi]))
+    return times, pieces
+
+
+def query_block(block_windows, collection, query, fields, freq, in_flight):
+    """`fields` of every tweet one anchor returns over the span of a block's windows"""
+    anchor = block_windows['anchor'].iloc[0]
+    dates = window_dates(block_windows['start'].min(), block_windows['end'].max(), freq)
+
+    with in_flight:
+        cursor = trace.query(query, anchor, dates, collection, games=block_windows['game_id'].unique())
+        return collect_fields(cursor, fields)
+
+
+def fetch_block(block_windows, collection, query, fields, freq, in_flight):
+    """Query one anchor over one block and cut the result into per-game frames"""
+    columns = query_block(block_windows, collection, query, fields, freq, in_flight)
+    if not columns['tweet_created_at']:
+        return []
+
+    times, pieces = split_block(columns, block_windows)
+    values = {f: object_array(columns[f]) for f in fields if f != 'tweet_created_at'}
+    frames = []
+    with trace.section('bin'):
+        for game_id, game_anchor, idx in pieces:
+            frame = {f: v[idx] for f, v in values.items()}
+            frame['tweet_created_at'] = times[idx]
+            frame = pd.DataFrame(frame, columns=fields)
+            frame.insert(0, 'anchor', game_anchor)
+            frame.insert(0, 'game_id', game_id)
+            frames.append(frame)
+    return frames
+
+
+def count_block(block_windows, collection, query, freq, period, in_flight, batch_size, dedup):
+    """Stream one anchor's tweets over one block into {(game_id, period): count}"""
+    anchor = block_windows['anchor'].iloc[0]
+    dates = window_dates(block_windows['start'].min(), block_windows['end'].max(), freq)
+    starts = block_windows['start'].dt.tz_localize(None).to_numpy()
+    ends = block_windows['end'].dt.tz_localize(None).to_numpy()
+    game_ids = block_windows['game_id'].to_numpy()
+
+    counts = {}
+    with in_flight:
+        cursor = trace.query(query, anchor, dates, collection, games=np.unique(game_ids))
+        for times in iter_time_batches(cursor, batch_size, dedup):
+            with trace.section('bin'):
+                times = np.sort(times)
+                lo = np.searchsorted(times, starts, side='left')
+                hi = np.searchsorted(times, ends, side='left')
+                for game_id, a, b in zip(game_ids, lo, hi):
+                    if b <= a:
+                        continue
+                    periods, n = np.unique(times[a:b].astype(f'datetime64[{period}]'), return_counts=True)
+                    for key, c in zip(periods, n):
+                        counts[game_id, key] = counts.get((game_id, key), 0) + int(c)
+    return counts
+
+
+def count_windows(block_windows, collection, count_query, period, in_flight):
+    """Server-side counts for each window of one block, {(game_id, period): count}"""
+    counts = {}
+    for w in block_windows.itertuples(index=False):
+        with in_flight:
+            pairs = list(trace.query(count_query, w.anchor, [w.start, w.end], collection,
+                                     games=[w.game_id], kind='count', period=period))
+        for bucket, n in pairs:
+            key = (w.game_id, bucket.tz_localize(None).to_datetime64())
+            counts[key] = counts.get(key, 0) + int(n)
+    return counts
+
+
+def map_blocks(run, blocks, workers=1):
+    """run(block) for every block, on a thread pool when workers > 1, in block order"""
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(run, blocks))
+    return [run(w) for w in blocks]
+
+
+def fetch_game_tweets(games, collection, before, after, at='gameday',
+                      anchors=MATCHUP_ANCHORS, block='season', freq='D',
+                      fields=FIELDS, query=None, workers=1, max_in_flight=None):
+    """
+    Fetch tweets for every game in `games` with one query per anchor per block.
+
+    With workers > 1 the blocks are fetched on a thread pool, with at most
+    `max_in_flight` queries open at once (defaults to `workers`).
+
+    Returns a DataFrame with one row per (game, anchor, tweet) holding
+    game_id, anchor and `fields`; tweet_created_at is parsed to UTC.
+    """
+    if query is None:
+        query = get_ambient_tweets
+    if 'tweet_created_at' not in fields:
+        fields = list(fields) + ['tweet_created_at']
+
+    windows = plan_blocks(game_windows(games, before, after, at=at, anchors=anchors), block)
+    blocks = [w for _, w in windows.groupby('block', sort=True)]
+    in_flight = threading.BoundedSemaphore(max_in_flight or workers)
+
+    def run(block_windows):
+        return fetch_block(block_windows, collection, query, fields, freq, in_flight)
+
+    results = map_blocks(run, blocks, workers)
+    frames = [frame for block_frames in results for frame in block_frames]
+    if not frames:
+        empty = pd.DataFrame(columns=['game_id', 'anchor'] + list(fields))
+        empty['tweet_created_at'] = pd.to_datetime(empty['tweet_created_at'], utc=True)
+        return empty
+
+    with trace.section('parse'):
+        tweets = pd.concat(frames, ignore_index=True)
+        tweets['tweet_created_at'] = pd.to_datetime(tweets['tweet_created_at'], utc=True)
+    return tweets
+
+
+def count_game_tweets(games, collection, before, after, at='gameday',
+                      anchors=MATCHUP_ANCHORS, block='season', freq='D', period='D',
+                      query=None, count_query=None, workers=1, max_in_flight=None,
+                      batch_size=BATCH_SIZE, dedup=False):
+    """
+    Tweet counts per game and `period` ('D' for UTC days, 'h' for hours),
+    taken over the same windows and blocks as fetch_game_tweets without
+    keeping any tweets around. With `dedup`, a tweet returned twice by
+    one query is only counted once.
+
+    With a `count_query` (called like get_ambient_tweets plus `period`,
+    yielding (bucket, count) pairs) each game window is counted by the
+    store and no tweets are transferred at all; `dedup` does not apply.
+
+    Returns a Series of counts indexed by (game_id, period start in UTC),
+    leaving out empty periods.
+    """
+    if query is None:
+        query = get_ambient_tweets
+
+    windows = plan_blocks(game_windows(games, before, after, at=at, anchors=anchors), block)
+    blocks = [w for _, w in windows.groupby('block', sort=True)]
+    in_flight = threading.BoundedSemaphore(max_in_flight or workers)
+
+    def run(block_windows):
+        if count_query is not None:
+            return count_windows(block_windows, collection, count_query, period, in_flight)
+        return count_block(block_windows, collection, query, freq, period, in_flight,
+                           batch_size, dedup)
+
+    counts = {}
+    results = map_blocks(run, blocks, workers)
+    with trace.section('aggregate'):
+        for block_counts in results:
+            for key, n in block_counts.items():
+                counts[key] = counts.get(key, 0) + n
+
+        index = pd.MultiIndex.from_arrays([
+            object_array([game_id for game_id, _ in counts]),
+            to_utc(pd.DatetimeIndex([key for _, key in counts], dtype='datetime64[ns]')),
+        ], names=['game_id', 'period'])
+        series = pd.Series(list(counts.values()), index=index, dtype='int64', name='count')
+        return series.sort_index()
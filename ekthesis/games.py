@@ -0,0 +1,71 @@
+"""
+Typed loader for games.csv.
+
+Reads only the columns the scripts use, stores teams, game type and
+weekday as categoricals, and builds a tz-aware `kickoff_utc` column in
+one vectorized step. The parsed frame is cached as Parquet keyed by the
+hash of games.csv, COLUMNS and PARSE_VERSION, so later runs skip CSV
+parsing altogether.
+"""
+
+import hashlib
+import os
+
+import pandas as pd
+
+from ekthesis import CACHE_DIR, REPO_ROOT
+
+GAMES_PATH = os.path.join(REPO_ROOT, 'games.csv')
+
+COLUMNS = [
+    'game_id', 'season', 'game_type', 'week', 'gameday', 'weekday', 'gametime',
+    'away_team', 'away_score', 'home_team', 'home_score', 'result', 'total',
+    'overtime', 'div_game',
+]
+
+# Bump whenever parse_games changes what it returns, so cached frames are reparsed
+PARSE_VERSION = 1
+
+
+def file_hash(path, extra=b''):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read() + extra).hexdigest()
+
+
+def parse_games(path=GAMES_PATH):
+    """Parse games.csv into typed columns plus kickoff_utc"""
+    games = pd.read_csv(path, usecols=COLUMNS, dtype={'gametime': str})
+
+    # Both team columns share one set of categories so they compare to each other
+    teams = pd.CategoricalDtype(sorted(set(games['away_team']) | set(games['home_team'])))
+    games['away_team'] = games['away_team'].astype(teams)
+    games['home_team'] = games['home_team'].astype(teams)
+    games['game_type'] = games['game_type'].astype('category')
+    games['weekday'] = games['weekday'].astype('category')
+
+    games['gameday'] = pd.to_datetime(games['gameday'], format='%m/%d/%y')
+
+    # Kickoff times are US/Eastern; 1999 games have no gametime and get NaT
+    kickoff = pd.to_datetime(
+        games['gameday'].dt.strftime('%Y-%m-%d') + ' ' + games['gametime'],
+        format='%Y-%m-%d %H:%M', errors='coerce'
+    )
+    games['kickoff_utc'] = (kickoff.dt.tz_localize('US/Eastern', ambiguous='NaT', nonexistent='NaT')
+                            .dt.tz_convert('UTC'))
+    return games
+
+
+def load_games(path=GAMES_PATH, cache=True):
+    """games.csv as a typed DataFrame, read from the Parquet cache when it is current"""
+    if not cache:
+        return parse_games(path)
+
+    key = file_hash(path, repr((PARSE_VERSION, COLUMNS)).encode())
+    cache_path = os.path.join(CACHE_DIR, f"games_{key[:16]}.parquet")
+    if os.path.exists(cache_path):
+        return pd.read_parquet(cache_path)
+
+    games = parse_games(path)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    games.to_parquet(cache_path, index=False)
+    return games
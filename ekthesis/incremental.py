@@ -0,0 +1,61 @@
+"""
+Incremental rebuilds of per-game output tables.
+
+Each output CSV gets a sidecar `<stem>_inputs.csv` holding, per game_id,
+a hash of the input rows the game was computed from. On the next run
+only games that are missing from the output or whose inputs hash
+differently are recomputed; everything else is kept as is.
+
+Output and sidecar are rewritten atomically at every checkpoint, output
+first, so a crash leaves at worst a few finished games without a hash,
+which are simply recomputed.
+"""
+
+import os
+
+import pandas as pd
+
+
+def sidecar_path(path):
+    return os.path.splitext(path)[0] + '_inputs.csv'
+
+
+def row_hashes(frame, columns, key='game_id'):
+    """Stable hash of `columns` for every row, as hex strings indexed by `key`"""
+    hashes = pd.util.hash_pandas_object(frame[columns], index=False)
+    return pd.Series([f"{h:016x}" for h in hashes], index=pd.Index(frame[key], name=key),
+                     name='input_hash')
+
+
+def load_output(path, key='game_id'):
+    """
+    Existing output rows and their input hashes. Both are empty when the
+    output or its sidecar does not exist yet.
+    """
+    if not os.path.exists(path):
+        return pd.DataFrame(), pd.Series(dtype=str, name='input_hash')
+    output = pd.read_csv(path)
+
+    if not os.path.exists(sidecar_path(path)):
+        return output, pd.Series(dtype=str, name='input_hash')
+    hashes = pd.read_csv(sidecar_path(path), dtype=str).set_index(key)['input_hash']
+    return output, hashes
+
+
+def stale_keys(hashes, output, saved, key='game_id'):
+    """Keys of `hashes` that are missing from `output` or were computed from other inputs"""
+    done = pd.Index(output[key]) if len(output) else pd.Index([])
+    current = saved.reindex(hashes.index) == hashes
+    return hashes.index[~hashes.index.isin(done) | ~current.to_numpy()]
+
+
+def write_checkpoint(path, output, hashes, key='game_id'):
+    """Atomically replace the output and its sidecar"""
+    tmp_path = path + '.tmp'
+    output.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+    sidecar = sidecar_path(path)
+    hashes = hashes[hashes.index.isin(output[key])]
+    hashes.rename_axis(key).reset_index().to_csv(sidecar + '.tmp', index=False)
+    os.replace(sidecar + '.tmp', sidecar)
@@ -0,0 +1,161 @@
+"""
+CBSA metro areas and point-in-metro lookups.
+
+The TIGER 2014 CBSA polygons are read once, limited to metropolitan
+statistical areas (LSAD M1) and joined with their 2011-2014 population
+estimates. MetroIndex puts them in an STRtree so a whole array of tweet
+coordinates is assigned to metros in one bulk query.
+
+MetroGrid goes one step further and rasterizes the metros onto a
+lon/lat grid once: cells fully inside one metro or outside all of them
+answer a lookup with a single array index, and only points in cells that
+straddle a metro boundary fall back to the STRtree. The grid is cached
+under CACHE_DIR keyed by the shapefile and the cell size.
+"""
+
+import math
+import os
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+from pyproj import Transformer
+
+from ekthesis import CACHE_DIR, REPO_ROOT
+from ekthesis.games import file_hash
+
+CBSA_PATH = os.path.join(REPO_ROOT, 'tl_2014_us_cbsa', 'tl_2014_us_cbsa.shp')
+POPULATION_PATH = os.path.join(REPO_ROOT, 'cbsa_population.csv')
+
+POP_YEARS = [2011, 2012, 2013, 2014]
+
+# Grid cell size in degrees, about 5 km
+GRID_CELL = 0.05
+
+# Grid values besides metro rows
+OUTSIDE = -1
+BOUNDARY = -2
+
+
+def load_metros(cbsa_path=CBSA_PATH, population_path=POPULATION_PATH):
+    """
+    Metro CBSA polygons with population_<year> columns for POP_YEARS and
+    their mean, population_avg_2011_2014.
+    """
+    cities = gpd.read_file(cbsa_path)
+    pop_data = pd.read_csv(population_path, encoding="latin1", dtype={"CBSA": str})
+
+    pop_columns = {f"POPESTIMATE{year}": f"population_{year}" for year in POP_YEARS}
+    pop_metro = pop_data.loc[
+        pop_data["LSAD"] == "Metropolitan Statistical Area", ["CBSA"] + list(pop_columns)
+    ].rename(columns=pop_columns)
+    pop_metro["population_avg_2011_2014"] = pop_metro[list(pop_columns.values())].mean(axis=1)
+
+    cities = cities.merge(pop_metro, left_on="CBSAFP", right_on="CBSA", how="left")
+    return cities[cities["LSAD"] == "M1"].reset_index(drop=True)
+
+
+class MetroIndex:
+    """STRtree over metro polygons for bulk point lookups"""
+
+    def __init__(self, metros):
+        self.metros = metros
+        self.tree = shapely.STRtree(metros.geometry.values)
+        self.to_metro_crs = Transformer.from_crs("EPSG:4326", metros.crs, always_xy=True)
+
+    def project(self, lon, lat):
+        """WGS84 coordinates in the metros' CRS"""
+        return self.to_metro_crs.transform(np.asarray(lon, dtype=float), np.asarray(lat, dtype=float))
+
+    def assign(self, lon, lat):
+        """Row of `metros` each point lies within, or -1 outside every metro"""
+        x, y = self.project(lon, lat)
+        points = shapely.points(x, y)
+        point_idx, metro_idx = self.tree.query(points, predicate="within")
+
+        # Metro areas don't overlap, so a point is within at most one
+        rows = np.full(len(points), -1, dtype=np.int64)
+        rows[point_idx] = metro_idx
+        return rows
+
+
+def build_grid(metros, cell=GRID_CELL):
+    """
+    Rasterize `metros` onto a grid of `cell`-degree cells in their CRS.
+    Returns the (ny x nx) grid of metro rows / OUTSIDE / BOUNDARY and the
+    grid's lower-left corner.
+    """
+    x_min, y_min, x_max, y_max = metros.total_bounds
+    x0 = math.floor(x_min / cell) * cell
+    y0 = math.floor(y_min / cell) * cell
+    nx = int(math.ceil((x_max - x0) / cell)) + 1
+    ny = int(math.ceil((y_max - y0) / cell)) + 1
+    grid = np.full((ny, nx), OUTSIDE, dtype=np.int32)
+
+    for row, polygon in enumerate(metros.geometry.values):
+        bx0, by0, bx1, by1 = polygon.bounds
+        ix = np.arange(int((bx0 - x0) // cell), min(int((bx1 - x0) // cell) + 1, nx))
+        iy = np.arange(int((by0 - y0) // cell), min(int((by1 - y0) // cell) + 1, ny))
+        iy, ix = (a.ravel() for a in np.meshgrid(iy, ix, indexing='ij'))
+        cells = shapely.box(x0 + ix * cell, y0 + iy * cell, x0 + (ix + 1) * cell, y0 + (iy + 1) * cell)
+
+        shapely.prepare(polygon)
+        inside = shapely.contains_properly(polygon, cells)
+        edge = shapely.intersects(polygon, cells) & ~inside
+        # Metros don't overlap, so a cell inside one can't touch another
+        grid[iy[inside], ix[inside]] = row
+        grid[iy[edge], ix[edge]] = BOUNDARY
+
+    return grid, (x0, y0)
+
+
+class MetroGrid:
+    """
+    Raster lookup over metro polygons with the same interface as
+    MetroIndex; boundary cells are resolved with an STRtree.
+    """
+
+    def __init__(self, metros, grid, origin, cell=GRID_CELL):
+        self.metros = metros
+        self.grid = grid
+        self.origin = origin
+        self.cell = cell
+        self.index = MetroIndex(metros)
+
+    def project(self, lon, lat):
+        return self.index.project(lon, lat)
+
+    def assign(self, lon, lat):
+        """Row of `metros` each point lies within, or -1 outside every metro"""
+        x, y = self.project(lon, lat)
+        ny, nx = self.grid.shape
+        ix = np.floor((x - self.origin[0]) / self.cell)
+        iy = np.floor((y - self.origin[1]) / self.cell)
+        on_grid = (ix >= 0) & (ix < nx) & (iy >= 0) & (iy < ny)
+
+        rows = np.full(len(x), OUTSIDE, dtype=np.int64)
+        rows[on_grid] = self.grid[iy[on_grid].astype(np.int64), ix[on_grid].astype(np.int64)]
+
+        edge = rows == BOUNDARY
+        if edge.any():
+            rows[edge] = self.index.assign(np.asarray(lon, dtype=float)[edge],
+                                           np.asarray(lat, dtype=float)[edge])
+        return rows
+
+
+def load_metro_grid(metros, cbsa_path=CBSA_PATH, cell=GRID_CELL, cache=True):
+    """MetroGrid for `metros`, read from the cache when the shapefile is unchanged"""
+    path = os.path.join(CACHE_DIR, f"metro_grid_{file_hash(cbsa_path)[:16]}_{cell:g}.npz")
+    if cache and os.path.exists(path):
+        saved = np.load(path, allow_pickle=False)
+        # Rows refer to metros in load order; rebuild if that changed
+        if np.array_equal(saved['cbsafp'], metros['CBSAFP'].to_numpy(dtype=str)):
+            return MetroGrid(metros, saved['grid'], tuple(saved['origin']), cell)
+
+    grid, origin = build_grid(metros, cell)
+    if cache:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        np.savez(path, grid=grid, origin=np.array(origin),
+                 cbsafp=metros['CBSAFP'].to_numpy(dtype=str))
+    return MetroGrid(metros, grid, origin, cell)
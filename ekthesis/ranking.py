@@ -0,0 +1,136 @@
+"""
+Attention curves per group of games, from a sparse incidence matrix.
+
+A grouping assigns each game to one or more groups: both of its teams
+('team'), only the home or away team, the division of either team, or
+its kickoff slot. The assignments form a sparse (groups x games)
+incidence matrix A, so with C the (games x bins) counts of the games
+that have tweets, A @ C is every group's summed curve and A @ 1 its
+number of games, in one sparse product whatever the number of groups.
+Groupings combine, e.g. by=['team', 'slot'] gives one curve per team
+and slot.
+
+Divisions are read off games.csv itself: per season, teams that play a
+div_game are in the same division. This follows the 2002 realignment
+without a hard-coded table. Relocated teams are labelled by franchise
+(STL and LA are the Rams), so a division keeps its name across moves.
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+
+# Current code of teams that moved since 1999
+FRANCHISE = {'STL': 'LA', 'SD': 'LAC', 'OAK': 'LV'}
+
+# Kickoff slots by US/Eastern gametime: (label, first hour)
+SLOTS = [('early', 0), ('late', 16), ('primetime', 19)]
+
+
+def team_pairs(games, side=('home_team', 'away_team')):
+    """(game row, team) for the teams on `side` of every game"""
+    rows = np.arange(len(games))
+    return pd.DataFrame({
+        'game': np.concatenate([rows] * len(side)),
+        'group': np.concatenate([games[column].astype(str).to_numpy() for column in side]),
+    })
+
+
+def season_divisions(games):
+    """
+    Division of every (season, team), labelled by its franchises joined
+    with '/'. A team with no division game in `games` is its own division.
+    """
+    teams = team_pairs(games)
+    teams['season'] = games['season'].to_numpy()[teams['game']]
+    teams = teams[['season', 'group']].drop_duplicates().reset_index(drop=True)
+    node = pd.MultiIndex.from_frame(teams)
+
+    div = games[games['div_game'] == 1]
+    home = node.get_indexer(pd.MultiIndex.from_arrays([div['season'], div['home_team'].astype(str)]))
+    away = node.get_indexer(pd.MultiIndex.from_arrays([div['season'], div['away_team'].astype(str)]))
+    graph = sparse.csr_matrix((np.ones(len(div)), (home, away)), shape=(len(node), len(node)))
+    _, component = connected_components(graph, directed=False)
+
+    franchise = teams['group'].replace(FRANCHISE)
+    names = franchise.groupby(component).agg(lambda members: '/'.join(sorted(set(members))))
+    return pd.Series(names.to_numpy()[component], index=node, name='division')
+
+
+def division_pairs(games):
+    """(game row, division) for the divisions of both teams; a division game counts once"""
+    pairs = team_pairs(games)
+    divisions = season_divisions(games)
+    keys = pd.MultiIndex.from_arrays([games['season'].to_numpy()[pairs['game']], pairs['group']])
+    pairs['group'] = divisions.reindex(keys).to_numpy()
+    return pairs.drop_duplicates()
+
+
+def slot_pairs(games):
+    """(game row, kickoff slot); games without a gametime are 'unknown'"""
+    hour = pd.to_numeric(games['gametime'].astype(str).str.split(':').str[0], errors='coerce')
+    starts = [first for _, first in SLOTS]
+    labels = np.array([label for label, _ in SLOTS] + ['unknown'], dtype=object)
+    slot = np.searchsorted(starts, hour.to_numpy(), side='right') - 1
+    slot = np.where(np.isnan(hour.to_numpy()), len(SLOTS), slot)
+    return pd.DataFrame({'game': np.arange(len(games)), 'group': labels[slot]})
+
+
+GROUPINGS = {
+    'team': team_pairs,
+    'home': lambda games: team_pairs(games, side=('home_team',)),
+    'away': lambda games: team_pairs(games, side=('away_team',)),
+    'division': division_pairs,
+    'slot': slot_pairs,
+}
+
+
+def incidence(games, by='team'):
+    """
+    Sparse (groups x games) 0/1 matrix of the groups each row of `games`
+    belongs to under grouping `by` (a name from GROUPINGS or a list of
+    them), and the group labels, a MultiIndex for combined groupings.
+    """
+    by = [by] if isinstance(by, str) else list(by)
+    unknown = [name for name in by if name not in GROUPINGS]
+    if unknown:
+        raise ValueError(f"Unknown groupings: {', '.join(unknown)}")
+
+    pairs = None
+    for name in by:
+        step = GROUPINGS[name](games).rename(columns={'group': name})
+        pairs = step if pairs is None else pairs.merge(step, on='game')
+
+    codes = pairs.groupby(by, sort=True).ngroup().to_numpy()
+    labels = pairs[by].drop_duplicates().sort_values(by)
+    labels = pd.Index(labels[by[0]], name=by[0]) if len(by) == 1 else pd.MultiIndex.from_frame(labels)
+
+    matrix = sparse.csr_matrix((np.ones(len(pairs)), (codes, pairs['game'].to_numpy())),
+                               shape=(len(labels), len(games)))
+    matrix.sum_duplicates()
+    matrix.data[:] = 1
+    return matrix, labels
+
+
+def group_curves(counts, games, by='team', bins=None, has_tweets=None):
+    """
+    Average curve per group of the games in `counts` (rows in the order of
+    `games`) that have tweets, ranked by the curve's sum. Columns are the
+    number of games, 'attention' (the sum) and the curve, labelled by
+    `bins` when given. Groups without a game with tweets are left out.
+    Which games have tweets can be given as a boolean `has_tweets`.
+    """
+    matrix, labels = incidence(games, by)
+    if has_tweets is None:
+        has_tweets = counts.sum(axis=1) > 0
+    matrix = matrix @ sparse.diags(np.asarray(has_tweets, dtype=np.float64))
+
+    n_games = np.asarray(matrix.sum(axis=1)).ravel()
+    totals = matrix @ counts.astype(np.float64)
+    keep = n_games > 0
+    curves = pd.DataFrame(totals[keep] / n_games[keep, None], index=labels[keep],
+                          columns=list(bins) if bins is not None else None)
+    curves.insert(0, 'attention', curves.sum(axis=1))
+    curves.insert(0, 'games', n_games[keep].astype(np.int64))
+    return curves.sort_values('attention', ascending=False, kind='stable')
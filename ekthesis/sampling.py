@@ -0,0 +1,98 @@
+"""
+Approximate analyses from a sample of the tweets.
+
+get_connection(p=...) serves a fraction p of the tweets. A count of n
+sampled tweets is then Poisson with mean p*N, where N is the full count,
+so estimates are n/p, and the exact (Garwood) Poisson interval for the
+mean, divided by p, is a confidence interval for N. Sums over games,
+bins or weeks are sums of Poisson counts and get the same treatment.
+
+Statistics that are not plain sums (window percentages, rankings) are
+resampled instead: each replicate draws every count again from a
+Poisson with the observed count as its mean, which is the sampling
+noise at rate p, and the interval is the spread of the statistic over
+the replicates, as in ekthesis.bootstrap.
+
+Sampled tweets must not mix with full ones, so the tweet cache and the
+count matrix of a sampled run live at sample_path(path, p).
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+from scipy.stats import chi2, spearmanr
+
+from ekthesis.bootstrap import LEVEL, percentile_interval
+
+# Poisson replicates for resampled intervals and ranking stability
+N_REPLICATES = 200
+
+
+def sample_path(path, p):
+    """`path` for a run sampled at rate `p`: _p<p> before the extension, unchanged for p=1"""
+    if p is None or p >= 1:
+        return path
+    stem, ext = os.path.splitext(path.rstrip(os.sep))
+    return f"{stem}_p{p:g}{ext}"
+
+
+def poisson_interval(counts, p=1.0, level=LEVEL):
+    """Interval for the full counts behind sampled `counts`, as (lo, hi) arrays"""
+    counts = np.asarray(counts, dtype=np.float64)
+    alpha = 1 - level
+    lo = np.where(counts > 0, chi2.ppf(alpha / 2, 2 * counts) / 2, 0.0)
+    hi = chi2.ppf(1 - alpha / 2, 2 * counts + 2) / 2
+    return lo / p, hi / p
+
+
+def replicates(counts, n=N_REPLICATES, seed=0):
+    """`n` Poisson redraws of `counts`, stacked on a new first axis"""
+    rng = np.random.default_rng(seed)
+    counts = np.asarray(counts, dtype=np.float64)
+    return rng.poisson(counts, size=(n,) + counts.shape).astype(np.float64)
+
+
+def ranks(values):
+    """Rank of each value within its row of `values`, 1 for the highest"""
+    order = np.argsort(-values, axis=1, kind='stable')
+    out = np.empty_like(order)
+    np.put_along_axis(out, order, np.broadcast_to(np.arange(1, values.shape[1] + 1), values.shape),
+                      axis=1)
+    return out
+
+
+def rank_stability(observed, replicated, level=LEVEL):
+    """
+    How stable the ordering of `observed` (one value per group) is over
+    `replicated` (replicates x groups), in observed rank order.
+
+    Per group: its rank, the rank interval over the replicates, and
+    'holds', the share of replicates in which it stays above the group
+    ranked next. Also returns a summary: the median Spearman correlation
+    of replicate and observed values, and how many adjacent pairs hold in
+    at least `level` of the replicates.
+    """
+    observed = np.asarray(observed, dtype=np.float64)
+    order = np.argsort(-observed, kind='stable')
+    replicated = replicated[:, order]
+
+    rep_ranks = ranks(replicated)
+    rank_lo, rank_hi = percentile_interval(rep_ranks, level)
+    holds = np.append((replicated[:, :-1] > replicated[:, 1:]).mean(axis=0), np.nan)
+
+    spearman = [spearmanr(observed[order], rep).statistic for rep in replicated]
+    n_pairs = len(order) - 1
+    summary = {
+        'spearman_median': float(np.nanmedian(spearman)) if len(spearman) else np.nan,
+        'pairs_holding': int((holds[:-1] >= level).sum()),
+        'pairs': n_pairs,
+        'stable': bool(n_pairs == 0 or (holds[:-1] >= level).all()),
+    }
+    table = pd.DataFrame({
+        'rank': np.arange(1, len(order) + 1),
+        'rank_lo': rank_lo.astype(int),
+        'rank_hi': rank_hi.astype(int),
+        'holds': holds,
+    })
+    return order, table, summary
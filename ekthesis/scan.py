@@ -0,0 +1,294 @@
+"""
+Offline anchor counts from local tweet dumps.
+
+Matching anchors in the remote query means a new set of anchors (team
+hashtags from TEAM_CONFIG, other spellings of a matchup tag) costs
+another round of queries. Here the tweets are exported once to gzipped
+JSON-lines dumps, e.g. with
+
+    mongoexport --collection ... --fields _id,tweet_created_at,text | gzip > tweets-2013.jsonl.gz
+
+or write_dump over a cursor, and any set of anchors is counted in one
+pass over the files: every anchor goes into one Aho-Corasick automaton,
+so each tweet is scanned once whatever the number of anchors. Each
+file is scanned by a worker of a process pool and returns per-anchor
+counts per hour (or any `freq`), which are summed over the files.
+
+Matching is case-insensitive and an anchor has to end at a word
+boundary, so '#Cardinals' does not count '#CardinalsNation'. A tweet
+counts once per anchor it contains. The automaton is pyahocorasick's
+when it is installed and a pure-Python one otherwise; they match the
+same. Lines are matched raw first, and only lines with a hit are parsed
+as JSON and matched again on their text.
+"""
+
+import argparse
+import glob
+import gzip
+import json
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from ekthesis import trace
+
+# Fields written by write_dump
+DUMP_FIELDS = ["_id", "tweet_created_at", "text"]
+
+# Characters that continue a word, so an anchor cannot end before them
+WORD_CHARS = frozenset('abcdefghijklmnopqrstuvwxyz0123456789_')
+
+TWITTER_TIME_FORMAT = '%a %b %d %H:%M:%S %z %Y'
+
+
+class Automaton:
+    """Pure-Python Aho-Corasick automaton with the part of pyahocorasick's interface used here"""
+
+    def __init__(self):
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]
+
+    def add_word(self, key, value):
+        state = 0
+        for char in key:
+            nxt = self.goto[state].get(char)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[state][char] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append([])
+            state = nxt
+        self.out[state] = [value]
+
+    def make_automaton(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self.goto[state].items():
+                queue.append(nxt)
+                fail = self.fail[state]
+                while fail and char not in self.goto[fail]:
+                    fail = self.fail[fail]
+                self.fail[nxt] = self.goto[fail].get(char, 0)
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+
+    def iter(self, text):
+        """(end index, value) of every key in `text`"""
+        goto, fail, out = self.goto, self.fail, self.out
+        state = 0
+        for end, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for value in out[state]:
+                yield end, value
+
+
+def build_automaton(anchors):
+    """
+    Automaton over the lowercased `anchors`. Each key's value is (the
+    numbers of the anchors it stands for, its length).
+    """
+    keys = {}
+    for number, anchor in enumerate(anchors):
+        keys.setdefault(anchor.lower(), []).append(number)
+
+    try:
+        import ahocorasick
+    except ImportError:
+        automaton = Automaton()
+    else:
+        automaton = ahocorasick.Automaton()
+    for key, numbers in keys.items():
+        automaton.add_word(key, (tuple(numbers), len(key)))
+    automaton.make_automaton()
+    return automaton
+
+
+def match_anchors(automaton, text):
+    """Numbers of the anchors in `text` that end at a word boundary"""
+    text = text.lower()
+    found = set()
+    for end, (numbers, _) in automaton.iter(text):
+        if end + 1 == len(text) or text[end + 1] not in WORD_CHARS:
+            found.update(numbers)
+    return found
+
+
+def created_value(doc):
+    """tweet_created_at of `doc` as a string or epoch milliseconds, unwrapping extended JSON"""
+    value = doc.get('tweet_created_at')
+    if isinstance(value, dict):
+        value = value.get('$date')
+        if isinstance(value, dict):
+            value = int(value['$numberLong'])
+    return value
+
+
+def parse_created(values):
+    """UTC DatetimeIndex of created_value results: ISO strings, Twitter's format or epoch ms"""
+    values = pd.Series(values, dtype=object)
+    out = pd.Series(pd.NaT, index=values.index, dtype='datetime64[ns, UTC]')
+    numeric = values.map(lambda v: isinstance(v, (int, float)))
+    if numeric.any():
+        out[numeric] = pd.to_datetime(values[numeric].astype(np.int64), unit='ms', utc=True)
+    text = values[~numeric].astype(str)
+    if len(text):
+        iso = pd.to_datetime(text, utc=True, format='ISO8601', errors='coerce')
+        twitter = iso.isna()
+        if twitter.any():
+            iso[twitter] = pd.to_datetime(text[twitter], utc=True, format=TWITTER_TIME_FORMAT,
+                                          errors='coerce')
+        out[~numeric] = iso
+    return pd.DatetimeIndex(out)
+
+
+def scan_file(path, anchors, freq='h'):
+    """
+    Counts per (anchor number, period start) of the tweets in the dump at
+    `path`, as arrays (anchor, period in ns since the epoch, count), plus
+    the number of tweets in the file.
+    """
+    automaton = build_automaton(anchors)
+    numbers, created = [], []
+    n_tweets = 0
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            n_tweets += 1
+            # A hit anywhere in the raw line is necessary for a hit in the text
+            if next(automaton.iter(line.lower()), None) is None:
+                continue
+            doc = json.loads(line)
+            found = match_anchors(automaton, doc.get('text') or '')
+            if found:
+                value = created_value(doc)
+                numbers.extend(found)
+                created.extend([value] * len(found))
+
+    times = parse_created(created)
+    valid = ~times.isna()
+    periods = times[valid].floor(freq).as_unit('ns').asi8
+    keys = np.stack([np.asarray(numbers, dtype=np.int64)[valid], periods])
+    keys, counts = np.unique(keys.reshape(2, -1), axis=1, return_counts=True)
+    return keys[0], keys[1], counts, n_tweets
+
+
+def _scan_task(task):
+    return scan_file(*task)
+
+
+def dump_files(paths):
+    """Dump files at `paths`, with directories expanded to the *.jsonl.gz files in them"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, '*.jsonl.gz'))))
+        else:
+            files.append(path)
+    return files
+
+
+def scan_dumps(paths, anchors, freq='h', workers=1):
+    """
+    Tweets per anchor per `freq` period in the dumps at `paths`, one file
+    per task on a process pool of `workers`. Columns are anchor, period
+    (UTC start) and tweets; anchors without tweets are left out.
+    """
+    anchors = list(dict.fromkeys(anchors))
+    files = dump_files(paths)
+    tasks = [(path, anchors, freq) for path in files]
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_scan_task, tasks))
+    else:
+        results = [_scan_task(t) for t in tasks]
+
+    for path, (_, _, counts, n_tweets) in zip(files, results):
+        trace.event('scan', file=path, tweets=n_tweets, matches=int(counts.sum()))
+
+    with trace.section('aggregate'):
+        numbers = np.concatenate([np.empty(0, dtype=np.int64)] + [r[0] for r in results])
+        periods = np.concatenate([np.empty(0, dtype=np.int64)] + [r[1] for r in results])
+        counts = np.concatenate([np.empty(0, dtype=np.int64)] + [r[2] for r in results])
+        table = pd.DataFrame({'anchor': numbers, 'period': periods, 'tweets': counts})
+        table = table.groupby(['anchor', 'period'], sort=True, as_index=False)['tweets'].sum()
+    table['anchor'] = np.asarray(anchors, dtype=object)[table['anchor'].to_numpy()]
+    table['period'] = pd.to_datetime(table['period'], utc=True)
+    return table
+
+
+def write_dump(docs, path, fields=DUMP_FIELDS):
+    """Write `fields` of the documents in `docs` (e.g. a cursor) to a jsonl.gz dump; returns the count"""
+    n = 0
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        for doc in docs:
+            f.write(json.dumps({k: doc[k] for k in fields if k in doc}, default=str))
+            f.write('\n')
+            n += 1
+    return n
+
+
+def team_anchors(teams=None):
+    """Every team's own anchors from TEAM_CONFIG"""
+    if teams is None:
+        from ekthesis.teams import TEAM_CONFIG as teams
+    return [anchor for config in teams.values() for anchor in config['anchors']]
+
+
+def matchup_anchors(games, templates=None):
+    """The matchup anchors of every game in `games`"""
+    if templates is None:
+        from ekthesis.fetch import MATCHUP_ANCHORS as templates
+    away = games['away_team'].astype(str)
+    home = games['home_team'].astype(str)
+    return list(dict.fromkeys(template.format(away=a, home=h)
+                              for template in templates for a, h in zip(away, home)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('dumps', nargs='+', help='jsonl.gz dump files, or directories of them')
+    parser.add_argument('--anchor', action='append', default=[], help='an anchor to count')
+    parser.add_argument('--anchors-file', help='file with one anchor per line')
+    parser.add_argument('--teams', action='store_true', help="count every team's anchors")
+    parser.add_argument('--matchups', action='store_true',
+                        help='count the matchup anchors of every game in games.csv')
+    parser.add_argument('--freq', default='h', help='period to count per (default: h)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='scanning processes')
+    parser.add_argument('--output', help='CSV to write the counts to (default: print totals)')
+    trace.add_argument(parser)
+    args = parser.parse_args(argv)
+    trace.enable_from(args.trace)
+
+    anchors = list(args.anchor)
+    if args.anchors_file:
+        with open(args.anchors_file) as f:
+            anchors.extend(line.strip() for line in f if line.strip())
+    if args.teams:
+        anchors.extend(team_anchors())
+    if args.matchups:
+        from ekthesis.games import load_games
+        anchors.extend(matchup_anchors(load_games()))
+    if not anchors:
+        parser.error('no anchors: give --anchor, --anchors-file, --teams or --matchups')
+
+    table = scan_dumps(args.dumps, anchors, freq=args.freq, workers=args.workers)
+    if args.output:
+        table.to_csv(args.output, index=False)
+    else:
+        totals = table.groupby('anchor')['tweets'].sum().sort_values(ascending=False)
+        print(totals.to_string())
+    return table
+
+
+if __name__ == '__main__':
+    main()
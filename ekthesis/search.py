@@ -0,0 +1,225 @@
+"""
+Cached, resumable hyperparameter search for the attention models.
+
+Every (parameters, fold) fit is a call to a joblib.Memory-cached
+function keyed by the estimator, its parameters, the fold's row indices
+and a hash of the training data, so each finished fit is on disk as soon
+as it returns. Rerunning a search, after an interruption or with a few
+grid points added, loads the fits it already has and only fits the rest,
+on a joblib process pool.
+
+Three ways to pick candidates:
+
+- 'grid': every point of the grid, as GridSearchCV.
+- 'random': `n_iter` sampled points, as RandomizedSearchCV.
+- 'halving': successive halving over training rows, as
+  HalvingGridSearchCV. All candidates start on a small subsample, and
+  the best 1/`factor` of them move on to a `factor` times larger one
+  until the full training set.
+
+Run `python -m ekthesis.search --model rf` for the random forest grid
+from Modeling/random_forest.ipynb, or `--model xgb` for the XGBoost grid.
+"""
+
+import argparse
+import math
+import os
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import check_scoring, mean_squared_error, r2_score
+from sklearn.model_selection import KFold, ParameterGrid, ParameterSampler, train_test_split
+
+from ekthesis import CACHE_DIR
+from ekthesis.features import attention_features
+
+SEARCH_DIR = os.path.join(CACHE_DIR, 'search')
+SCORING = 'neg_mean_squared_error'
+
+RF_GRID = {
+    'n_estimators': [200, 400, 600],
+    'max_depth': [10, 20, None],
+    'max_features': ['sqrt', 'log2', 0.5],
+    'min_samples_split': [2, 5, 10],
+    'min_samples_leaf': [1, 2, 4],
+}
+
+XGB_GRID = {
+    'n_estimators': [200, 400, 600, 800],
+    'learning_rate': [0.01, 0.05, 0.1, 0.2],
+    'max_depth': [3, 5, 7, 9],
+    'subsample': [0.6, 0.8, 1.0],
+    'colsample_bytree': [0.6, 0.8, 1.0],
+}
+
+
+def random_forest():
+    return RandomForestRegressor(random_state=42, n_jobs=-1)
+
+
+def xgboost():
+    # xgboost is only needed for this model
+    from xgboost import XGBRegressor
+    return XGBRegressor(random_state=42, objective='reg:squarederror', n_jobs=-1)
+
+
+MODELS = {
+    'rf': (random_forest, RF_GRID),
+    'xgb': (xgboost, XGB_GRID),
+}
+
+
+def take(data, rows):
+    """Rows of a DataFrame/Series, array or sparse matrix"""
+    return data.iloc[rows] if hasattr(data, 'iloc') else data[rows]
+
+
+def fit_fold(estimator, params, data_key, train, test, scoring, X, y):
+    """Test score and fit time of `estimator` with `params` on one fold"""
+    model = clone(estimator).set_params(**params)
+    start = time.time()
+    model.fit(take(X, train), take(y, train))
+    fit_time = time.time() - start
+    score = check_scoring(model, scoring)(model, take(X, test), take(y, test))
+    return {'score': float(score), 'fit_time': fit_time}
+
+
+def evaluate(fit, estimator, candidates, folds, data_key, scoring, X, y, workers=1):
+    """
+    Mean and std test score of each candidate over `folds`. Cached fits
+    are loaded, the rest run on `workers` processes.
+    """
+    calls = [(estimator, params, data_key, train, test, scoring)
+             for params in candidates for train, test in folds]
+    cached = [fit.check_call_in_cache(*args, X=X, y=y) for args in calls]
+    todo = [args for args, hit in zip(calls, cached) if not hit]
+    print(f"{len(calls)} fits, {len(calls) - len(todo)} cached, fitting {len(todo)}")
+
+    fitted = iter(joblib.Parallel(n_jobs=workers)(
+        joblib.delayed(fit)(*args, X=X, y=y) for args in todo
+    ))
+    scores = np.empty(len(calls))
+    fit_times = np.empty(len(calls))
+    for j, (args, hit) in enumerate(zip(calls, cached)):
+        result = fit(*args, X=X, y=y) if hit else next(fitted)
+        scores[j], fit_times[j] = result['score'], result['fit_time']
+
+    n_folds = len(folds)
+    scores = scores.reshape(len(candidates), n_folds)
+    return pd.DataFrame({
+        'params': candidates,
+        'mean_test_score': scores.mean(axis=1),
+        'std_test_score': scores.std(axis=1),
+        'mean_fit_time': fit_times.reshape(len(candidates), n_folds).mean(axis=1),
+    })
+
+
+def search(estimator, param_grid, X, y, method='grid', cv=3, n_iter=25, factor=3,
+           scoring=SCORING, random_state=42, workers=1, cache=True, refit=True):
+    """
+    Cross-validated search of `estimator` over `param_grid` on X, y
+    (DataFrames, arrays or the sparse matrix from design_matrix).
+
+    Returns a results table with one row per candidate and round (for
+    'halving'), ranked by mean test score, and the best estimator refit
+    on all of X, y (or its parameters when `refit` is False).
+    """
+    memory = joblib.Memory(SEARCH_DIR if cache else None, verbose=0)
+    fit = memory.cache(fit_fold, ignore=['X', 'y'])
+    data_key = joblib.hash((X, y))
+
+    # Unshuffled KFold, the splits GridSearchCV(cv=3) used for a regressor
+    folds = list(KFold(cv).split(np.zeros(len(y))))
+
+    if method in ('grid', 'halving'):
+        candidates = list(ParameterGrid(param_grid))
+    elif method == 'random':
+        candidates = list(ParameterSampler(param_grid, n_iter, random_state=random_state))
+    else:
+        raise ValueError(f"Unknown search method: {method!r}")
+
+    if method != 'halving':
+        results = evaluate(fit, estimator, candidates, folds, data_key, scoring, X, y,
+                           workers=workers)
+        results['n_resources'] = min(len(train) for train, _ in folds)
+        results['iter'] = 0
+    else:
+        # Each fold's training rows in a fixed random order; a prefix of
+        # it is the subsample, so every run draws the same rows
+        rng = np.random.default_rng(random_state)
+        orders = [rng.permutation(len(train)) for train, _ in folds]
+        max_resources = min(len(train) for train, _ in folds)
+        n_iters = max(1, math.ceil(math.log(len(candidates), factor)))
+        rounds = []
+        for i in range(n_iters):
+            n_resources = max(max_resources // factor ** (n_iters - 1 - i), 2 * cv)
+            subsample = [(np.sort(train[order[:n_resources]]), test)
+                         for (train, test), order in zip(folds, orders)]
+            round_results = evaluate(fit, estimator, candidates, subsample, data_key, scoring,
+                                     X, y, workers=workers)
+            round_results['n_resources'] = n_resources
+            round_results['iter'] = i
+            rounds.append(round_results)
+
+            keep = max(1, math.ceil(len(candidates) / factor))
+            best = round_results['mean_test_score'].to_numpy().argsort(kind='stable')[::-1][:keep]
+            candidates = [candidates[j] for j in sorted(best)]
+        results = pd.concat(rounds, ignore_index=True)
+
+    # Like sklearn, rank within the last round so its winner is rank 1
+    last = results['iter'] == results['iter'].max()
+    results['rank_test_score'] = (
+        results['mean_test_score'].where(last).rank(ascending=False, method='min')
+    ).astype('Int64')
+    results = results.sort_values(['iter', 'rank_test_score'], ascending=[False, True],
+                                  kind='stable').reset_index(drop=True)
+    params = pd.DataFrame(list(results['params'])).add_prefix('param_')
+    results = pd.concat([results, params], axis=1)
+
+    best_params = results.loc[0, 'params']
+    if not refit:
+        return results, best_params
+    return results, clone(estimator).set_params(**best_params).fit(X, y)
+
+
+def main(model='rf', method='grid', n_iter=25, workers=1, cache=True):
+    make_estimator, param_grid = MODELS[model]
+    X, y, _, _ = attention_features()
+    # Dense for the trees: sklearn's sparse splitter draws differently, and
+    # xgboost reads implicit zeros as missing
+    X = X.toarray()
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+
+    start = time.time()
+    results, best = search(make_estimator(), param_grid, X_train, y_train, method=method,
+                           n_iter=n_iter, workers=workers, cache=cache)
+    print(f"Search took {time.time() - start:.1f}s")
+
+    y_pred = best.predict(X_test)
+    print("Best Parameters Found:")
+    print(results.loc[0, 'params'])
+    print(f"Tuned RMSE: {np.sqrt(mean_squared_error(y_test, y_pred))}")
+    print(f"Tuned R²: {r2_score(y_test, y_pred)}")
+    return results, best
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', choices=sorted(MODELS), default='rf',
+                        help='estimator and parameter grid to search')
+    parser.add_argument('--method', choices=['grid', 'random', 'halving'], default='grid',
+                        help='how candidates are picked from the grid')
+    parser.add_argument('--n-iter', type=int, default=25,
+                        help='candidates sampled by --method random')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='processes fitting folds (-1 = all cores)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='refit every fold instead of reusing cached fits')
+    args = parser.parse_args()
+    main(model=args.model, method=args.method, n_iter=args.n_iter, workers=args.workers,
+         cache=not args.no_cache)
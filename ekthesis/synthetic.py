@@ -0,0 +1,186 @@
+"""
+Synthetic tweet store for benchmarks.
+
+SyntheticStore generates tweets for the matchup anchors of every game
+(#AWAYvsHOME and #HOMEvsAWAY). Their timestamps follow a kickoff-centred
+volume curve: most tweets fall during the game, some in the hours before
+kickoff, and the rest decay away from it over days, out to ±15 days. Per
+anchor the tweets are kept as sorted arrays, and documents shaped like
+the store's (_id, naive UTC tweet_created_at, geo, text, fastText_lang)
+are only built when a query returns them.
+
+install() registers a stand-in `data_mountain_query` package in
+sys.modules, so the scripts' own imports of get_connection and
+get_ambient_tweets reach the synthetic store. Install it before anything
+imports ekthesis.fetch. The collection also answers the count pipeline
+of ekthesis.aggregate, so server-side counting can be benchmarked too.
+
+Every query is recorded in `queries`.
+"""
+
+import re
+import sys
+import types
+
+import numpy as np
+import pandas as pd
+
+# Mean tweets per anchor per game at volume 1
+TWEETS_PER_ANCHOR = 40
+
+# Shares of the volume curve: during the game, the build-up before
+# kickoff, and the background that decays over days
+GAME_SHARE = 0.6
+PREGAME_SHARE = 0.15
+
+GAME_CENTER_H = 1.5
+GAME_SPREAD_H = 1.25
+PREGAME_SCALE_H = 6
+BACKGROUND_SCALE_H = 48
+MAX_OFFSET_H = 15 * 24
+
+# Documents built per step while a cursor is read
+CHUNK_SIZE = 1000
+
+# Bucket unit for each $dateToString format of ekthesis.aggregate
+BUCKET_UNITS = {'%Y-%m-%d': 'D', '%Y-%m-%dT%H': 'h'}
+
+
+def kickoff_offsets(n, rng):
+    """`n` tweet offsets from kickoff in hours, drawn from the volume curve"""
+    kind = rng.choice(3, size=n, p=[GAME_SHARE, PREGAME_SHARE, 1 - GAME_SHARE - PREGAME_SHARE])
+    offsets = np.empty(n)
+    game, pregame, background = (kind == k for k in range(3))
+    offsets[game] = rng.normal(GAME_CENTER_H, GAME_SPREAD_H, game.sum())
+    offsets[pregame] = -rng.exponential(PREGAME_SCALE_H, pregame.sum())
+    offsets[background] = rng.laplace(0, BACKGROUND_SCALE_H, background.sum())
+    return np.clip(offsets, -MAX_OFFSET_H, MAX_OFFSET_H)
+
+
+def naive_ns(value):
+    """Timestamp as naive UTC nanoseconds, the way the store compares dates"""
+    value = pd.Timestamp(value)
+    if value.tzinfo is not None:
+        value = value.tz_convert('UTC').tz_localize(None)
+    return value.as_unit('ns').value
+
+
+class SyntheticStore:
+    """In-memory tweet collection for the matchup anchors of `games`"""
+
+    def __init__(self, games, volume=1.0, seed=0):
+        self.queries = []
+        self.tweets_returned = 0
+        rng = np.random.default_rng(seed)
+
+        # Kickoff in UTC, or 17:00 UTC (1pm Eastern) on gameday for games without a gametime
+        kickoff = games['kickoff_utc'].dt.tz_localize(None).fillna(
+            pd.to_datetime(games['gameday']) + pd.Timedelta(hours=17)
+        ).to_numpy().astype('datetime64[ns]')
+        away = games['away_team'].astype(str).to_numpy()
+        home = games['home_team'].astype(str).to_numpy()
+
+        times = {}
+        for anchors in ([f"#{a}vs{h}" for a, h in zip(away, home)],
+                        [f"#{h}vs{a}" for a, h in zip(away, home)]):
+            n = rng.poisson(TWEETS_PER_ANCHOR * volume, len(games))
+            offsets = (kickoff_offsets(n.sum(), rng) * 3600e9).astype('timedelta64[ns]')
+            game_times = np.repeat(kickoff, n) + offsets
+            for anchor, start, stop in zip(anchors, np.cumsum(n) - n, np.cumsum(n)):
+                times.setdefault(anchor, []).append(game_times[start:stop])
+
+        self.anchors = {}
+        next_id = 0
+        for anchor, parts in times.items():
+            t = np.sort(np.concatenate(parts)).view(np.int64)
+            self.anchors[anchor] = {
+                'times': t,
+                'ids': np.arange(next_id, next_id + len(t)),
+                'lon': rng.uniform(-124, -70, len(t)),
+                'lat': rng.uniform(25, 49, len(t)),
+            }
+            next_id += len(t)
+        self.n_tweets = next_id
+
+    def _range(self, anchor, start, end):
+        tweets = self.anchors.get(anchor)
+        if tweets is None:
+            return None, 0, 0
+        lo, hi = np.searchsorted(tweets['times'], [naive_ns(start), naive_ns(end)], side='left')
+        return tweets, lo, hi
+
+    def find(self, anchor, start, end):
+        """Documents for `anchor` in [start, end), built a chunk at a time"""
+        self.queries.append(('find', anchor, start, end))
+        tweets, lo, hi = self._range(anchor, start, end)
+        for chunk in range(lo, hi, CHUNK_SIZE):
+            sl = slice(chunk, min(chunk + CHUNK_SIZE, hi))
+            created = tweets['times'][sl].view('datetime64[ns]').astype('datetime64[us]').tolist()
+            docs = [
+                {'_id': int(_id), 'tweet_created_at': t, 'fastText_lang': 'en',
+                 'text': f"{anchor} game day",
+                 'geo': {'type': 'Point', 'coordinates': [lon, lat]}}
+                for _id, t, lon, lat in zip(tweets['ids'][sl], created,
+                                            tweets['lon'][sl].tolist(), tweets['lat'][sl].tolist())
+            ]
+            self.tweets_returned += len(docs)
+            yield from docs
+
+    def aggregate(self, pipeline):
+        """Answer an ekthesis.aggregate count pipeline"""
+        match = pipeline[0]['$match']
+        fmt = pipeline[1]['$group']['_id']['$dateToString']['format']
+        created = match['tweet_created_at']
+        if '$text' in match:
+            anchors = [match['$text']['$search'].strip('"')]
+        else:
+            pattern = next(v for k, v in match.items() if isinstance(v, re.Pattern))
+            anchors = [a for a in self.anchors if pattern.search(a)]
+
+        self.queries.append(('aggregate', anchors[0] if len(anchors) == 1 else anchors,
+                             created['$gte'], created['$lt']))
+        ranges = [self._range(a, created['$gte'], created['$lt']) for a in anchors]
+        times = np.concatenate([np.empty(0, dtype=np.int64)] +
+                               [t['times'][lo:hi] for t, lo, hi in ranges if t is not None])
+        unit = BUCKET_UNITS[fmt]
+        buckets, counts = np.unique(times.view('datetime64[ns]').astype(f'datetime64[{unit}]'),
+                                    return_counts=True)
+        docs = [{'_id': str(b), 'count': int(c)} for b, c in zip(buckets, counts)]
+        return iter(docs)
+
+
+def get_ambient_tweets(anchor, dates, collection):
+    """Stand-in for data_mountain_query.query.get_ambient_tweets"""
+    return collection.find(anchor, dates[0], dates[-1])
+
+
+def install(store=None):
+    """
+    Register a `data_mountain_query` package backed by `store`. Can be
+    called without one first, so ekthesis.fetch imports before the store
+    is built, and again once it is.
+    """
+    package = sys.modules.get('data_mountain_query')
+    if getattr(package, '__synthetic__', False):
+        package.connection.STORE = store
+        return package
+
+    package = types.ModuleType('data_mountain_query')
+    package.__synthetic__ = True
+    package.__path__ = []
+    query = types.ModuleType('data_mountain_query.query')
+    query.get_ambient_tweets = get_ambient_tweets
+    connection = types.ModuleType('data_mountain_query.connection')
+    connection.STORE = store
+
+    def get_connection(**kwargs):
+        return connection.STORE, None
+
+    connection.get_connection = get_connection
+    package.query, package.connection = query, connection
+    sys.modules.update({
+        'data_mountain_query': package,
+        'data_mountain_query.query': query,
+        'data_mountain_query.connection': connection,
+    })
+    return package
@@ -0,0 +1,218 @@
+"""
+The teams the fandom analyses cover: full name, home city, the city's
+coordinates and each team's own hashtag anchors.
+"""
+
+# Team name, home city, lat/lon pair, and popular anchors (#TeamName, #Mascot)
+TEAM_CONFIG = {
+    "ARI": {
+        "name": "Arizona Cardinals",
+        "city": "Phoenix",
+        "lat": 33.4483,
+        "lon": -112.0725,
+        "anchors": ["#ArizonaCardinals", "#Cardinals"],
+    },
+    "ATL": {
+        "name": "Atlanta Falcons",
+        "city": "Atlanta",
+        "lat": 33.7501,
+        "lon": -84.3885,
+        "anchors": ["#Falcons", "#AtlantaFalcons"],
+    },
+    "BAL": {
+        "name": "Baltimore Ravens",
+        "city": "Baltimore",
+        "lat": 39.2904,
+        "lon": -76.6104,
+        "anchors": ["#Ravens", "#BaltimoreRavens"],
+    },
+    "BUF": {
+        "name": "Buffalo Bills",
+        "city": "Buffalo",
+        "lat": 42.8869,
+        "lon": -78.8789,
+        "anchors": ["#Bills", "#BuffaloBills"],
+    },
+    "CAR": {
+        "name": "Carolina Panthers",
+        "city": "Charlotte",
+        "lat": 35.2271,
+        "lon": -80.8409,
+        "anchors": ["#Panthers", "#CarolinaPanthers"],
+    },
+    "CHI": {
+        "name": "Chicago Bears",
+        "city": "Chicago",
+        "lat": 41.8832,
+        "lon": -87.6324,
+        "anchors": ["#Bears", "#ChicagoBears"],
+    },
+    "CIN": {
+        "name": "Cincinnati Bengals",
+        "city": "Cincinnati",
+        "lat": 39.1031,
+        "lon": -84.5120,
+        "anchors": ["#Bengals", "#CincinnatiBengals"],
+    },
+    "CLE": {
+        "name": "Cleveland Browns",
+        "city": "Cleveland",
+        "lat": 41.4993,
+        "lon": -81.6944,
+        "anchors": ["#Browns", "#ClevelandBrowns"],
+    },
+    "DAL": {
+        "name": "Dallas Cowboys",
+        "city": "Dallas",
+        "lat": 32.7767,
+        "lon": -96.7970,
+        "anchors": ["#Cowboys", "#DallasCowboys"],
+    },
+    "DEN": {
+        "name": "Denver Broncos",
+        "city": "Denver",
+        "lat": 39.7392,
+        "lon": -104.9903,
+        "anchors": ["#Broncos", "#DenverBroncos"],
+    },
+    "DET": {
+        "name": "Detroit Lions",
+        "city": "Detroit",
+        "lat": 42.3297,
+        "lon": -83.0425,
+        "anchors": ["#Lions", "#DetroitLions"],
+    },
+    "GB": {
+        "name": "Green Bay Packers",
+        "city": "Green Bay",
+        "lat": 44.5133,
+        "lon": -88.0133,
+        "anchors": ["#Packers", "#GreenBayPackers"],
+    },
+    "HOU": {
+        "name": "Houston Texans",
+        "city": "Houston",
+        "lat": 29.7601,
+        "lon": -95.3701,
+        "anchors": ["#Texans", "#HoustonTexans"],
+    },
+    "IND": {
+        "name": "Indianapolis Colts",
+        "city": "Indianapolis",
+        "lat": 39.7691,
+        "lon": -86.1580,
+        "anchors": ["#Colts", "#IndianapolisColts"],
+    },
+    "JAX": {
+        "name": "Jacksonville Jaguars",
+        "city": "Jacksonville",
+        "lat": 30.3298,
+        "lon": -81.6592,
+        "anchors": ["#Jaguars", "#JacksonvilleJaguars"],
+    },
+    "KC": {
+        "name": "Kansas City Chiefs",
+        "city": "Kansas City",
+        "lat": 39.0997,
+        "lon": -94.5786,
+        "anchors": ["#Chiefs", "#KansasCityChiefs"],
+    },
+    "MIA": {
+        "name": "Miami Dolphins",
+        "city": "Miami",
+        "lat": 25.7617,
+        "lon": -80.1918,
+        "anchors": ["#Dolphins", "#MiamiDolphins"],
+    },
+    "MIN": {
+        "name": "Minnesota Vikings",
+        "city": "Minneapolis",
+        "lat": 44.9778,
+        "lon": -93.2650,
+        "anchors": ["#Vikings", "#MinnesotaVikings"],
+    },
+    "NE": {
+        "name": "New England Patriots",
+        "city": "Boston",
+        "lat": 42.3601,
+        "lon": -71.0589,
+        "anchors": ["#Patriots", "#NewEnglandPatriots"],
+    },
+    "NO": {
+        "name": "New Orleans Saints",
+        "city": "New Orleans",
+        "lat": 29.9509,
+        "lon": -90.0758,
+        "anchors": ["#Saints", "#NewOrleansSaints"],
+    },
+    "NYG": {
+        "name": "New York Giants",
+        "city": "New York",
+        "lat": 40.7128,
+        "lon": -74.0060,
+        "anchors": ["#Giants", "#NewYorkGiants"],
+    },
+    "NYJ": {
+        "name": "New York Jets",
+        "city": "New York",
+        "lat": 40.7128,
+        "lon": -74.0060,
+        "anchors": ["#Jets", "#NewYorkJets"],
+    },
+    "OAK": {
+        "name": "Oakland Raiders",
+        "city": "Oakland",
+        "lat": 37.8044,
+        "lon": -122.2712,
+        "anchors": ["#Raiders", "#OaklandRaiders"],
+    },
+    "PHI": {
+        "name": "Philadelphia Eagles",
+        "city": "Philadelphia",
+        "lat": 39.9526,
+        "lon": -75.1652,
+        "anchors": ["#Eagles", "#PhiladelphiaEagles"],
+    },
+    "PIT": {
+        "name": "Pittsburgh Steelers",
+        "city": "Pittsburgh",
+        "lat": 40.4406,
+        "lon": -79.9959,
+        "anchors": ["#Steelers", "#PittsburghSteelers"],
+    },
+    "SEA": {
+        "name": "Seattle Seahawks",
+        "city": "Seattle",
+        "lat": 47.6062,
+        "lon": -122.3321,
+        "anchors": ["#Seahawks", "#SeattleSeahawks"],
+    },
+    "SF": {
+        "name": "San Francisco 49ers",
+        "city": "San Francisco",
+        "lat": 37.7749,
+        "lon": -122.4194,
+        "anchors": ["#49ers", "#Niners"],
+    },
+    "TB": {
+        "name": "Tampa Bay Buccaneers",
+        "city": "Tampa",
+        "lat": 27.9517,
+        "lon": -82.4588,
+        "anchors": ["#Buccaneers", "#TampaBayBuccaneers"],
+    },
+    "TEN": {
+        "name": "Tennessee Titans",
+        "city": "Nashville",
+        "lat": 36.1627,
+        "lon": -86.7816,
+        "anchors": ["#Titans", "#TennesseeTitans"],
+    },
+    "WAS": {
+        "name": "Washington Redskins",
+        "city": "Washington, D.C.",
+        "lat": 38.9073,
+        "lon": -77.0369,
+        "anchors": ["#Redskins", "#WashingtonRedskins"],
+    },
+}
@@ -0,0 +1,387 @@
+"""
+Per-stage timing and query instrumentation for the thesis scripts.
+
+Off by default. Set EKTHESIS_TRACE to a JSONL path (or to 1 for a
+timestamped file under traces/) before running any script, or pass
+`--trace` where a script takes arguments:
+
+    EKTHESIS_TRACE=weekly.jsonl python "code for graphs/average_att.py"
+    python data_generation.py --seasons 2013 --trace
+
+While tracing, time is split exclusively into stages, so time in a
+nested stage only counts there:
+
+- fetch: the store producing a query's results (the query call and every
+  step of its cursor)
+- parse: turning documents into arrays and frames
+- bin: routing tweets to games and kickoff-relative or daily bins
+- aggregate: summing bins into per-game and per-week attention
+- tracing: the instrumentation itself, mostly measuring document sizes
+- other: the rest of the run
+
+Every query is written to the trace as it finishes: anchor, window, the
+games it serves, seconds spent in the query call and its cursor (for a
+tweet cache, including its own reads), the tweets returned (or counted,
+for server-side counts) and bytes transferred. Bytes are the
+documents' BSON size when bson (from pymongo) is importable, otherwise
+their JSON length. Tweet cache lookups are written with whether the
+cache covered the window. At exit the stage totals are appended and a
+summary is printed to stderr: stages, cache hits, and the slowest
+anchors and games, so a heavy matchup stands out. The summary of an
+earlier trace can be printed again with
+
+    python -m ekthesis.trace weekly.jsonl
+"""
+
+import argparse
+import atexit
+import contextlib
+import functools
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from ekthesis import REPO_ROOT
+
+TRACE_ENV = 'EKTHESIS_TRACE'
+TRACE_DIR = os.path.join(REPO_ROOT, 'traces')
+
+STAGES = ['fetch', 'parse', 'bin', 'aggregate', 'tracing']
+
+# Marks the end of a cursor
+_END = object()
+
+# Rows in each table of the summary
+TOP = 10
+
+
+class Stopwatch:
+    """
+    Exclusive wall time per named section: time spent in a nested section
+    is only counted there, not in the sections around it. Sections are
+    tracked per thread.
+    """
+
+    def __init__(self):
+        self.totals = defaultdict(float)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _add(self, name, seconds):
+        with self._lock:
+            self.totals[name] += seconds
+
+    @contextlib.contextmanager
+    def section(self, name):
+        stack = self._local.__dict__.setdefault('stack', [])
+        now = time.perf_counter()
+        if stack:
+            self._add(stack[-1][0], now - stack[-1][1])
+        stack.append([name, now])
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            name, started = stack.pop()
+            self._add(name, now - started)
+            if stack:
+                stack[-1][1] = now
+
+    def items(self, iterable, name):
+        """Items of `iterable`, timing each step as `name`"""
+        items = iter(iterable)
+        while True:
+            with self.section(name):
+                try:
+                    item = next(items)
+                except StopIteration:
+                    return
+            yield item
+
+    def wrap(self, func, name):
+        """`func` timed as `name`; generators are timed per item"""
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def generator(*args, **kwargs):
+                return self.items(func(*args, **kwargs), name)
+            return generator
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with self.section(name):
+                return func(*args, **kwargs)
+        return wrapper
+
+
+def document_size():
+    """Function giving a document's size in bytes, BSON if available"""
+    try:
+        import bson
+    except ImportError:
+        return lambda doc: len(json.dumps(doc, default=str))
+    return lambda doc: len(bson.encode(doc)) if isinstance(doc, dict) else len(json.dumps(doc, default=str))
+
+
+def default_path():
+    script = os.path.splitext(os.path.basename(sys.argv[0] or 'python'))[0] or 'python'
+    return os.path.join(TRACE_DIR, f"{script}_{datetime.now():%Y%m%dT%H%M%S}.jsonl")
+
+
+def timestamp(value):
+    """JSON-friendly form of a window bound"""
+    return value.isoformat() if hasattr(value, 'isoformat') else str(value)
+
+
+class Tracer:
+    """Stage stopwatch plus a JSONL file of query and cache events"""
+
+    def __init__(self, path, summary=True, sizes=True):
+        self.path = path
+        self.summary = summary
+        self.stopwatch = Stopwatch()
+        self.events = []
+        self.size = document_size() if sizes else None
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._closed = False
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Line buffered, so a run that dies still leaves every finished query
+        self._file = open(path, 'w', buffering=1)
+        self.event('start', argv=sys.argv, pid=os.getpid(),
+                   time=datetime.now(timezone.utc).isoformat(timespec='seconds'))
+
+    def event(self, name, **fields):
+        record = {'event': name, **fields}
+        with self._lock:
+            if self._closed:
+                return
+            self.events.append(record)
+            self._file.write(json.dumps(record, default=str) + '\n')
+
+    def stages(self):
+        """Seconds per stage so far, with the remainder of the wall time as 'other'"""
+        totals = {stage: self.stopwatch.totals.get(stage, 0.0) for stage in STAGES}
+        wall = time.perf_counter() - self.started
+        # With fetch workers the stages add up across threads and can exceed wall time
+        totals['other'] = max(wall - sum(totals.values()), 0.0)
+        return wall, totals
+
+    def query(self, query, anchor, dates, collection, games=(), kind='find', **kwargs):
+        """Results of query(anchor, dates, collection, **kwargs), recorded as one event"""
+        started = time.perf_counter()
+        with self.stopwatch.section('fetch'):
+            cursor = iter(query(anchor, dates, collection, **kwargs))
+        fetch_s = time.perf_counter() - started
+        items = tweets = nbytes = 0
+        try:
+            while True:
+                step = time.perf_counter()
+                with self.stopwatch.section('fetch'):
+                    item = next(cursor, _END)
+                fetch_s += time.perf_counter() - step
+                if item is _END:
+                    break
+                if self.size is not None:
+                    with self.stopwatch.section('tracing'):
+                        nbytes += self.size(item)
+                items += 1
+                tweets += 1 if kind == 'find' else int(item[1])
+                yield item
+        finally:
+            self.event('query', kind=kind, anchor=anchor, start=timestamp(dates[0]),
+                       end=timestamp(dates[-1]), games=[str(g) for g in games],
+                       fetch_s=round(fetch_s, 6), wall_s=round(time.perf_counter() - started, 6),
+                       items=items, tweets=tweets, bytes=nbytes,
+                       thread=threading.current_thread().name)
+
+    def close(self):
+        if self._closed:
+            return
+        wall, totals = self.stages()
+        self.event('stages', wall_s=round(wall, 6), **{k: round(v, 6) for k, v in totals.items()})
+        with self._lock:
+            self._closed = True
+            self._file.close()
+        if self.summary:
+            print_summary(self.events, file=sys.stderr)
+            print(f"Trace written to {self.path}", file=sys.stderr)
+
+
+_tracer = None
+
+
+def enable(path=None, summary=True, sizes=True):
+    """
+    Start tracing to `path` (a timestamped file under TRACE_DIR by
+    default), replacing any trace already running. The trace is closed and
+    summarized at exit, or by disable(). Without `sizes`, bytes returned
+    are not measured.
+    """
+    global _tracer
+    disable()
+    _tracer = Tracer(path or default_path(), summary=summary, sizes=sizes)
+    atexit.register(_tracer.close)
+    return _tracer
+
+
+def disable():
+    """Close the running trace, if any, and stop tracing"""
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is not None:
+        tracer.close()
+    return tracer
+
+
+def enabled():
+    return _tracer is not None
+
+
+def section(name):
+    """Context manager timing its body as stage `name` while tracing"""
+    if _tracer is None:
+        return contextlib.nullcontext()
+    return _tracer.stopwatch.section(name)
+
+
+def timed(name):
+    """Decorator timing calls as stage `name` while tracing; generators are timed per item"""
+    def decorate(func):
+        is_generator = inspect.isgeneratorfunction(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            tracer = _tracer
+            if tracer is None:
+                return func(*args, **kwargs)
+            if is_generator:
+                return tracer.stopwatch.items(func(*args, **kwargs), name)
+            with tracer.stopwatch.section(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def query(query, anchor, dates, collection, games=(), kind='find', **kwargs):
+    """
+    query(anchor, dates, collection, **kwargs), recorded as a query event
+    serving `games` while tracing. `kind` is 'find' for tweet documents or
+    'count' for (bucket, count) pairs.
+    """
+    if _tracer is None:
+        return query(anchor, dates, collection, **kwargs)
+    return _tracer.query(query, anchor, dates, collection, games=games, kind=kind, **kwargs)
+
+
+def event(name, **fields):
+    """Write an event to the trace, if tracing"""
+    if _tracer is not None:
+        _tracer.event(name, **fields)
+
+
+def load(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def summarize(events):
+    """Summary tables of a trace: stages, cache use, slowest anchors and games"""
+    import pandas as pd
+
+    stages = next((e for e in reversed(events) if e['event'] == 'stages'), None)
+    tables = {}
+    if stages is not None:
+        seconds = pd.Series({k: stages[k] for k in STAGES + ['other']}, name='seconds')
+        tables['stages'] = pd.DataFrame({
+            'seconds': seconds.round(2),
+            'share': (seconds / max(stages['wall_s'], 1e-9)).round(3),
+        })
+
+    cache = pd.DataFrame([e for e in events if e['event'] == 'cache'])
+    if len(cache):
+        tables['cache'] = pd.DataFrame({
+            'lookups': [len(cache)],
+            'hits': [int(cache['hit'].sum())],
+            'hit_rate': [round(cache['hit'].mean(), 3)],
+            'tweets_fetched': [int(cache['fetched'].sum())],
+        })
+
+    queries = pd.DataFrame([e for e in events if e['event'] == 'query'])
+    if len(queries):
+        by_kind = queries.groupby('kind').agg(
+            queries=('fetch_s', 'size'), fetch_s=('fetch_s', 'sum'),
+            tweets=('tweets', 'sum'), bytes=('bytes', 'sum'),
+        )
+        by_kind['tweets_per_query'] = by_kind['tweets'] / by_kind['queries']
+        by_kind['mb'] = by_kind.pop('bytes') / 1024 ** 2
+        tables['queries'] = by_kind.round(2)
+
+        anchors = queries.groupby('anchor').agg(
+            queries=('fetch_s', 'size'), fetch_s=('fetch_s', 'sum'),
+            tweets=('tweets', 'sum'), bytes=('bytes', 'sum'),
+        )
+        anchors['tweets_per_s'] = anchors['tweets'] / anchors['fetch_s'].where(anchors['fetch_s'] > 0)
+        tables['anchors'] = anchors.sort_values('fetch_s', ascending=False).head(TOP).round(3)
+
+        # A query's cost is shared evenly by the games it serves
+        per_game = queries[queries['games'].str.len() > 0].copy()
+        if len(per_game):
+            n = per_game['games'].str.len()
+            per_game['fetch_s'] /= n
+            per_game['tweets'] /= n
+            per_game['bytes'] /= n
+            per_game = per_game.explode('games').rename(columns={'games': 'game_id'})
+            games = per_game.groupby('game_id').agg(
+                queries=('fetch_s', 'size'), fetch_s=('fetch_s', 'sum'),
+                tweets=('tweets', 'sum'), bytes=('bytes', 'sum'),
+            )
+            tables['games'] = games.sort_values('fetch_s', ascending=False).head(TOP).round(3)
+    return tables
+
+
+TITLES = {
+    'stages': 'Time per stage',
+    'cache': 'Tweet cache',
+    'queries': 'Queries',
+    'anchors': f'Slowest {TOP} anchors',
+    'games': f'Slowest {TOP} games (query time split across the games a query serves)',
+}
+
+
+def print_summary(events, file=None):
+    stages = next((e for e in reversed(events) if e['event'] == 'stages'), None)
+    if stages is not None:
+        print(f"\nTraced run: {stages['wall_s']:.2f}s", file=file)
+    for name, table in summarize(events).items():
+        print(f"\n{TITLES[name]}\n{table.to_string(index=name != 'cache')}",
+              file=file)
+
+
+def add_argument(parser):
+    """--trace [PATH] option for a script's argument parser"""
+    parser.add_argument('--trace', nargs='?', const='1', default=None, metavar='PATH',
+                        help=f'write a per-stage and per-query trace to PATH (default: a '
+                             f'timestamped file under traces/); same as setting {TRACE_ENV}')
+
+
+def enable_from(value):
+    """Enable tracing from a --trace or EKTHESIS_TRACE value ('1' for the default path)"""
+    if value:
+        return enable(None if value == '1' else value)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('path', help='trace file to summarize')
+    args = parser.parse_args()
+    print_summary(load(args.path))
+else:
+    # Scripts without a --trace option are traced through the environment
+    enable_from(os.environ.get(TRACE_ENV))
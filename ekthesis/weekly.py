@@ -0,0 +1,45 @@
+"""
+Season x week attention table.
+
+Every game's tweets are counted per UTC day from gameday-`days` to
+gameday+`days`, read off the 5-minute count matrix (ekthesis.counts), so
+the table needs no fetch of its own once the matrix is built. A game's
+attention is the row sum of those daily counts, and a week's attention
+is the sum over its games, done with one bincount over (season, week).
+
+The `weekly` analysis in ekthesis.analyses, which average_att.py,
+weekly_att_2013_2017.py and `python -m ekthesis run weekly` use, is
+built on weekly_attention.
+"""
+
+import numpy as np
+import pandas as pd
+
+from ekthesis import trace
+
+
+def daily_counts(matrix, games, days=7):
+    """
+    (n_games x 2*days+1) tweet counts of the count `matrix` for each UTC
+    day from gameday-`days` to gameday+`days`; row i is games.iloc[i].
+    """
+    with trace.section('bin'):
+        starts = games['gameday'] - pd.Timedelta(days=days)
+        return matrix.span(games['game_id'], starts, '1D', 2 * days + 1)
+
+
+@trace.timed('aggregate')
+def weekly_table(games, attention):
+    """Sum per-game `attention` into a season x week table (NaN where a season has no such week)"""
+    keys = games[['season', 'week']].reset_index(drop=True)
+    group = keys.groupby(['season', 'week'], sort=True).ngroup().to_numpy()
+    totals = np.bincount(group, weights=attention, minlength=group.max(initial=-1) + 1)
+
+    index = keys.drop_duplicates().sort_values(['season', 'week'])
+    table = pd.Series(totals.astype(np.int64), index=pd.MultiIndex.from_frame(index), name='attention')
+    return table.unstack('week')
+
+
+def weekly_attention(matrix, games, days=7):
+    """Season x week attention of `games`, each game counted over gameday ±`days` days"""
+    return weekly_table(games, daily_counts(matrix, games, days).sum(axis=1))
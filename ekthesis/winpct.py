@@ -0,0 +1,124 @@
+"""
+Pre-game win percentages and lead changes, the columns of nfl_r_data.csv.
+
+R data/data_nfl.R built these with a row loop per season and a grouped
+lag over play-by-play. Here both are single vectorized passes:
+
+- win_pct: the schedule is turned into one row per (game, team), and
+  each team's wins and games before a game are a grouped cumsum minus
+  the game itself. A tie is half a win; unplayed games count for
+  nothing.
+- lead_changes: plays with a possessing team and a non-tied score get a
+  leader (the sign of home minus away score), and a lead change is a
+  leader that differs from the previous such play of the same game.
+
+The play-by-play is read from a local nflverse Parquet file, limited to
+the columns and seasons needed. Adding a season is one more pass over
+its plays.
+"""
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from ekthesis import REPO_ROOT
+from ekthesis.games import load_games
+
+PBP_PATH = os.path.join(REPO_ROOT, 'R data', 'play_by_play.parquet')
+WIN_PCT_PATH = os.path.join(REPO_ROOT, 'R data', 'nfl_r_data.csv')
+
+PBP_COLUMNS = ['game_id', 'play_id', 'posteam', 'total_home_score', 'total_away_score']
+
+TABLE_COLUMNS = [
+    'season', 'game_id', 'gameday', 'home_team', 'away_team', 'home_win_pct', 'away_win_pct',
+    'lead_changes',
+]
+
+
+def load_pbp(path=PBP_PATH, seasons=None):
+    """Play-by-play columns needed for lead changes, optionally only `seasons`"""
+    filters = None
+    if seasons is not None:
+        filters = [('season', 'in', [int(s) for s in seasons])]
+    return pd.read_parquet(path, columns=PBP_COLUMNS, filters=filters)
+
+
+def lead_changes(pbp):
+    """Number of lead changes per game_id"""
+    plays = pbp[pbp['posteam'].notna()]
+    leader = np.sign(plays['total_home_score'].to_numpy() - plays['total_away_score'].to_numpy())
+    plays = pd.DataFrame({'game_id': plays['game_id'].to_numpy(),
+                          'play_id': plays['play_id'].to_numpy(),
+                          'leader': leader})
+    # Ties are ignored, so a lead that goes through a tie back to the same team isn't a change
+    plays = plays[plays['leader'] != 0].sort_values(['game_id', 'play_id'], kind='stable')
+
+    game = plays['game_id'].to_numpy()
+    leader = plays['leader'].to_numpy()
+    change = np.zeros(len(plays), dtype=np.int64)
+    change[1:] = (leader[1:] != leader[:-1]) & (game[1:] == game[:-1])
+    return pd.Series(change, index=pd.Index(game, name='game_id')).groupby(level=0).sum()
+
+
+def win_pct(games):
+    """
+    home_win_pct and away_win_pct of each game: the team's share of wins
+    in the season before that game (0 before its first), in gameday order.
+    """
+    games = games.sort_values(['season', 'gameday'], kind='stable')
+    n = len(games)
+
+    margin = games['home_score'].to_numpy(dtype=float) - games['away_score'].to_numpy(dtype=float)
+    played = ~np.isnan(margin)
+    home_win = np.where(margin > 0, 1.0, np.where(margin < 0, 0.0, 0.5)) * played
+
+    # One row per (game, team); within a season the rows stay in game order
+    teams = pd.DataFrame({
+        'season': np.tile(games['season'].to_numpy(), 2),
+        'team': np.concatenate([games['home_team'].astype(str).to_numpy(),
+                                games['away_team'].astype(str).to_numpy()]),
+        'order': np.tile(np.arange(n), 2),
+        'win': np.concatenate([home_win, (1 - home_win) * played]),
+        'played': np.tile(played.astype(float), 2),
+    }).sort_values('order', kind='stable')
+
+    by_team = teams.groupby(['season', 'team'], sort=False)
+    wins = by_team['win'].cumsum() - teams['win']
+    played_before = by_team['played'].cumsum() - teams['played']
+    pct = np.where(played_before > 0, wins / played_before.where(played_before > 0, 1), 0.0)
+    pct = pd.Series(pct, index=teams.index).sort_index().to_numpy()
+
+    out = games[['season', 'game_id', 'gameday', 'home_team', 'away_team']].copy()
+    out['home_win_pct'] = pct[:n]
+    out['away_win_pct'] = pct[n:]
+    return out
+
+
+def win_pct_table(games, pbp):
+    """nfl_r_data.csv: win percentages plus lead changes (0 without plays) per game"""
+    out = win_pct(games)
+    changes = lead_changes(pbp)
+    out['lead_changes'] = changes.reindex(out['game_id']).fillna(0).astype(np.int64).to_numpy()
+    return out[TABLE_COLUMNS].reset_index(drop=True)
+
+
+def main(seasons=range(2010, 2015), pbp_path=PBP_PATH, output_path=WIN_PCT_PATH):
+    games = load_games()
+    games = games[games['season'].isin(list(seasons))]
+    table = win_pct_table(games, load_pbp(pbp_path, seasons))
+    table.assign(gameday=table['gameday'].dt.strftime('%Y-%m-%d')).to_csv(output_path, index=False)
+    print(f"Saved {len(table)} games to {output_path}")
+    return table
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seasons', type=int, nargs='+', default=list(range(2010, 2015)),
+                        help='seasons to compute')
+    parser.add_argument('--pbp', default=PBP_PATH, help='nflverse play-by-play Parquet file')
+    parser.add_argument('--output', default=WIN_PCT_PATH, help='where to write nfl_r_data.csv')
+    args = parser.parse_args()
+    main(seasons=args.seasons, pbp_path=args.pbp, output_path=args.output)
@@ -1,97 +1,85 @@
 """
 This code calculates the percentage of tweets that are posted plus/minus
 72 hours from kickoff out of the tweets posted plus/minus 1 week of gameday
+
+Hours are counted from the real kickoff in UTC (kickoff_utc). Earlier
+versions used the Eastern kickoff time as if it were UTC, which put
+every window 4 or 5 hours early and gave different percentages; run
+with --local-kickoff to reproduce those numbers.
+
+With --sample P it runs on a fraction P of the tweets: tweet totals are
+scaled up by 1/P and each percentage gets a 95% interval.
 """
 
 
+import argparse
 import pandas as pd
 from datetime import datetime, timedelta
-from data_mountain_query.query import get_ambient_tweets
 from data_mountain_query.connection import get_connection
+from ekthesis.games import load_games
+from ekthesis.analyses import window_percentages
+from ekthesis.cache import DEFAULT_CACHE_DIR, TweetCache
+from ekthesis.counts import DEFAULT_PATH, count_matrix_for
+from ekthesis.sampling import sample_path
 import matplotlib.pyplot as plt
 import warnings
 warnings.filterwarnings("ignore", message="use an explicit session with no_cursor_timeout=True")
 
 
-def main():
-    games = pd.read_csv("/Users/elisabethkollrack/Thesis/EK-thesis/games.csv")
+def main(p=1.0, local_kickoff=False):
+    games = load_games()
     # Only want regular season
     games = games[games['game_type'] == 'REG']
-    games['gameday'] = pd.to_datetime(games['gameday'], format='%m/%d/%y')
-
-    p = 1.0
-    collection, client = get_connection(p=p)
-
-    # Initialize storage for 7 days before kickoff to 7 days after (hours)
-    times = {}
-    for time in range(-336, 337):  # 7 days * 24 hours = 168 hours each direction
-        times[time] = 0
-
-    num_games = 0
 
     # 2013–2017
     all_games = games[(games['season'] >= 2013) & (games['season'] <= 2017)]
 
-    for _, row in all_games.iterrows():
-        away = row['away_team']
-        home = row['home_team']
-        gameday = row['gameday']
-        gametime = row['gametime']
-
-        kickoff = pd.to_datetime(str(gameday.date()) + " " + str(gametime))
-
-        start_time = kickoff - timedelta(hours=336)
-        end_time = kickoff + timedelta(hours=336)
-        dates = pd.date_range(start_time, end_time, freq='h')
-
-        anchors = [f"#{away}vs{home}", f"#{home}vs{away}"]
-
-        tweets = []
-        for anchor in anchors:
-            tweets.extend([t for t in get_ambient_tweets(anchor, dates, collection)])
-
-        if not tweets:
-            continue
-
-        tweets_df = pd.DataFrame(tweets)
-        tweets_df['tweet_created_at'] = pd.to_datetime(tweets_df['tweet_created_at'])
-        tweets_df['hour'] = tweets_df['tweet_created_at'].dt.floor('h')
-
-        hourly_counts = tweets_df.groupby('hour').size().reset_index(name='count')
-        hourly_dict = dict(zip(hourly_counts['hour'], hourly_counts['count']))
-
-        for time in range(-336, 337):
-            time_point = kickoff + timedelta(hours=time)
-            count = hourly_dict.get(time_point.floor('h'), 0)
-            times[time] += count
-
-        num_games += 1
-        print(f"Processed game {num_games}: {away} vs {home} ({kickoff})")
-
-    # Compute average tweets per hour offset
-    avg_tweets_hour = {time: times[time] / num_games for time in times}
-
-    # Convert to DataFrame for plotting
-    attention_times = pd.DataFrame(list(avg_tweets_hour.items()), columns=['times', 'avg_tweets'])
-    attention_times = attention_times.sort_values('times')
-
-    # --- Compute total tweet counts for each time range ---
-    total_5to24 = sum(times[t] for t in range(-5, 25))
-    total_7day = sum(times[t] for t in range(-168, 169))
-    total_14day = sum(times[t] for t in range(-336, 337))
-    total_3to14 = sum(times[t] for t in range(-3, 15))
-    total_72to72 = sum(times[t] for t in range(-72, 73))
-
-
+    # Per-game 5-minute counts, built once through the tweet cache and then read from disk
+    # (a sampled run gets a cache and matrix of its own)
+    matrix = count_matrix_for(
+        all_games, lambda: get_connection(p=p)[0], path=sample_path(DEFAULT_PATH, p),
+        query=TweetCache(cache_dir=sample_path(DEFAULT_CACHE_DIR, p)).get_ambient_tweets
+    )
+
+    # Tweets per game per hour, 14 days before kickoff to 14 days after
+    if local_kickoff:
+        # Hours from the Eastern kickoff clock time read as UTC, floored to the hour
+        local = all_games['kickoff_utc'].dt.tz_convert('US/Eastern').dt.tz_localize(None)
+        starts = local.dt.floor('h') - pd.Timedelta(hours=336)
+        counts = matrix.span(all_games['game_id'], starts, '1h', 673)
+    else:
+        counts = matrix.curve('1h', '-336h', '337h', game_ids=all_games['game_id'])
+
+    # Only games with tweets count towards the average
+    has_tweets = counts.sum(axis=1) > 0
+    num_games = int(has_tweets.sum())
+    hourly = counts[has_tweets].sum(axis=0)
+    print(f"Processed {num_games} games")
+
+    # Compute average tweets per hour offset, scaled up to all tweets when sampled
+    attention_times = pd.DataFrame({'times': range(-336, 337), 'avg_tweets': hourly / p / num_games})
+
+    # --- Tweet totals for each time range, as a share of the ±7 days ---
+    windows = window_percentages(hourly, p)
 
     print("\n=== Total Tweet Volume Comparison ===")
-    pct = (total_5to24 / total_7day) * 100
-    print(f"5 hour to 24 hour / 7 to 7 day: %{pct:.2f}")
-    pct_72to72 = (total_72to72 / total_7day) * 100
-    print(f"72 hour to 72 hour / 7 to 7 day: %{pct_72to72:.2f}")
+    for label, window in [("5 hour to 24 hour / 7 to 7 day", '-5h to 24h'),
+                          ("72 hour to 72 hour / 7 to 7 day", '±72h')]:
+        row = windows.loc[window]
+        if p < 1:
+            print(f"{label}: %{row['percent']:.2f} (%{row['percent_lo']:.2f}-%{row['percent_hi']:.2f})")
+        else:
+            print(f"{label}: %{row['percent']:.2f}")
 
     return attention_times
 
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sample', type=float, default=1.0, metavar='P',
+                        help='fraction of tweets to sample (default: 1, all)')
+    parser.add_argument('--local-kickoff', action='store_true',
+                        help='count hours from the Eastern kickoff time read as UTC, '
+                             'as the original script did')
+    args = parser.parse_args()
+    main(args.sample, local_kickoff=args.local_kickoff)
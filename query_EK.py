@@ -6,14 +6,14 @@ Last updated 10/15 by EK
 
 import pandas as pd
 from datetime import datetime, timedelta
-from data_mountain_query.query import get_ambient_tweets
 from data_mountain_query.connection import get_connection
+from ekthesis.games import load_games
+from ekthesis.fetch import count_game_tweets
 
 
 def main():
-    games = pd.read_csv("/Users/elisabethkollrack/Thesis/EK-thesis/games.csv")
+    games = load_games()
     games = games[games['game_type'] == 'REG']
-    games['gameday'] = pd.to_datetime(games['gameday'], format='%m/%d/%y')
 
     # Assign season year
     games['season_year'] = games['gameday'].apply(
@@ -38,7 +38,7 @@ def main():
         games_filtered = games[
             (games['season_year'] == 2013) &
             info["filter"]
-        ][['gameday', 'total', 'result', 'season_year']]
+        ]
 
         # Get the first matchup of 2013
         if len(games_filtered) > 0:
@@ -48,20 +48,14 @@ def main():
             # Define 3-day window: day before, gameday, day after
             start_date = gameday - timedelta(days=1)
             end_date = gameday + timedelta(days=1)
-            dates = pd.date_range(start_date, end_date, freq='D')
 
-            counts = {}
-            total_tweets = 0
-
-            for anchor in info["anchors"]:
-                tweets_list = [t for t in get_ambient_tweets(anchor, dates, collection)]
-                for tweet in tweets_list:
-                    tweet_day = pd.to_datetime(tweet['tweet_created_at']).date()
-                    if tweet_day in counts:
-                        counts[tweet_day] = counts[tweet_day] + 1
-                    else:
-                        counts[tweet_day] = 1
-                    total_tweets += 1
+            # Both anchors in one call; window ends after the day after gameday
+            day_counts = count_game_tweets(
+                games_filtered.iloc[[0]], collection, anchors=info["anchors"],
+                before=timedelta(days=1), after=timedelta(days=2)
+            )
+            counts = {day.date(): n for (_, day), n in day_counts.items()}
+            total_tweets = int(day_counts.sum())
 
             # Sum counts for the 3-day window
             window_tweets = 0
@@ -0,0 +1,22 @@
+"""
+Test setup: the repository root on sys.path, derived-data and tweet
+caches in a temporary directory, and the synthetic data_mountain_query
+from ekthesis.synthetic when the real one is not installed, so
+ekthesis.fetch imports without a tweet store.
+"""
+
+import os
+import sys
+import tempfile
+
+_cache = tempfile.mkdtemp(prefix='ekthesis-tests-')
+os.environ.setdefault('EKTHESIS_DATA_CACHE', os.path.join(_cache, 'data'))
+os.environ.setdefault('EKTHESIS_CACHE_DIR', os.path.join(_cache, 'tweets'))
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import data_mountain_query  # noqa: F401
+except ImportError:
+    from ekthesis import synthetic
+    synthetic.install()
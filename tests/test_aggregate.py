@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ekthesis.aggregate import get_ambient_counts
+
+mongomock = pytest.importorskip('mongomock')
+
+ANCHOR = '#DALvsNYG'
+START = datetime(2013, 9, 8, 12)
+END = datetime(2013, 9, 10, 6)
+
+
+@pytest.fixture
+def collection():
+    rng = np.random.default_rng(0)
+    offsets = rng.integers(-6 * 3600, 50 * 3600, size=400)
+    docs = [
+        {'text': f"{ANCHOR} go", 'tweet_created_at': START + timedelta(seconds=int(s)), 'fastText_lang': 'en'}
+        for s in offsets
+    ]
+    docs += [
+        # Window edges: the start is in, the end and anything after it are out
+        {'text': f"{ANCHOR.lower()} kickoff", 'tweet_created_at': START, 'fastText_lang': 'en'},
+        {'text': ANCHOR, 'tweet_created_at': END - timedelta(microseconds=1000), 'fastText_lang': 'en'},
+        {'text': ANCHOR, 'tweet_created_at': END, 'fastText_lang': 'en'},
+        {'text': ANCHOR, 'tweet_created_at': START - timedelta(seconds=1), 'fastText_lang': 'en'},
+        # Wrong language or anchor
+        {'text': ANCHOR, 'tweet_created_at': START + timedelta(hours=1), 'fastText_lang': 'es'},
+        {'text': '#NYGvsDAL', 'tweet_created_at': START + timedelta(hours=1), 'fastText_lang': 'en'},
+    ]
+    collection = mongomock.MongoClient().db.tweets
+    collection.insert_many(docs)
+    return collection
+
+
+def streamed_counts(collection, freq):
+    """Counts from every matching document, bucketed client-side"""
+    docs = collection.find({
+        'text': {'$regex': ANCHOR, '$options': 'i'},
+        'fastText_lang': 'en',
+        'tweet_created_at': {'$gte': START, '$lt': END},
+    })
+    times = pd.to_datetime([doc['tweet_created_at'] for doc in docs], utc=True)
+    return times.floor(freq).value_counts().sort_index()
+
+
+@pytest.mark.parametrize('period', ['D', 'h'])
+def test_counts_match_streamed_documents(collection, period):
+    counts = get_ambient_counts(ANCHOR, [START, END], collection, period=period, anchor_field='text')
+    counts = pd.Series(dict(counts)).sort_index()
+    expected = streamed_counts(collection, period)
+
+    assert counts.index.equals(expected.index)
+    assert counts.to_numpy().tolist() == expected.to_numpy().tolist()
+
+
+def test_window_edges(collection):
+    counts = dict(get_ambient_counts(ANCHOR, [START, END], collection, period='h', anchor_field='text'))
+    first = pd.Timestamp(START, tz='UTC')
+    last = pd.Timestamp(END, tz='UTC') - pd.Timedelta(hours=1)
+
+    assert min(counts) == first
+    assert max(counts) == last
+    # The tweet a millisecond before the end is counted, the one at the end is not
+    in_last_hour = collection.count_documents({
+        'tweet_created_at': {'$gte': END - timedelta(hours=1), '$lt': END},
+        'fastText_lang': 'en',
+    })
+    assert counts[last] == in_last_hour
+    assert collection.count_documents({'tweet_created_at': END}) == 1
+
+
+def test_dates_in_other_timezones(collection):
+    start = pd.Timestamp(START, tz='UTC').tz_convert('US/Eastern')
+    end = pd.Timestamp(END, tz='UTC').tz_convert('US/Eastern')
+    local = dict(get_ambient_counts(ANCHOR, [start, end], collection, anchor_field='text'))
+    utc = dict(get_ambient_counts(ANCHOR, [START, END], collection, anchor_field='text'))
+    assert local == utc
@@ -0,0 +1,141 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from ekthesis import synthetic
+from ekthesis.archive import (ArchiveWriter, TweetArchive, build_from_cache, build_from_query,
+                              decode_ids, encode_ids, epoch_seconds)
+from ekthesis.cache import TweetCache, tweets_to_frame
+from ekthesis.counts import SPAN, build_count_matrix
+from ekthesis.fetch import game_windows, window_dates
+from ekthesis.games import load_games
+
+
+def ts(hours):
+    return pd.Timestamp('2013-09-08 17:00', tz='UTC') + pd.Timedelta(hours=hours)
+
+
+@pytest.fixture(scope='module')
+def games():
+    games = load_games()
+    return games[(games['season'] == 2013) & (games['week'] == 1)].reset_index(drop=True)
+
+
+@pytest.fixture
+def store(games):
+    return synthetic.SyntheticStore(games, volume=5)
+
+
+def store_frame(store, anchor, start, end):
+    """The store's tweets in [start, end) as the archive keeps them, times floored to the second"""
+    frame = tweets_to_frame(store.find(anchor, start, end))
+    store.queries.pop()
+    frame['tweet_created_at'] = frame['tweet_created_at'].dt.floor('s').dt.as_unit('ns')
+    return frame.sort_values(['tweet_created_at', '_id'], key=lambda c: c.astype(str) if c.name == '_id' else c,
+                             kind='stable').reset_index(drop=True)
+
+
+def archive_frame(archive, anchor, start, end):
+    frame = archive.frame(anchor, start, end)
+    frame['tweet_created_at'] = frame['tweet_created_at'].dt.as_unit('ns')
+    return frame.sort_values(['tweet_created_at', '_id'], key=lambda c: c.astype(str) if c.name == '_id' else c,
+                             kind='stable').reset_index(drop=True)
+
+
+def test_ids_round_trip():
+    assert decode_ids(encode_ids(['1', '18446744073709551615'])) == ['1', '18446744073709551615']
+    object_ids = ['5a1b2c3d4e5f60718293a4b5', '000000000000000000000000']
+    assert decode_ids(encode_ids(object_ids)) == object_ids
+    with pytest.raises(ValueError):
+        encode_ids(['1', '5a1b2c3d4e5f60718293a4b5'])
+
+
+def test_epoch_seconds_treats_naive_as_utc():
+    aware = pd.Series(pd.to_datetime(['2013-09-08 17:00:00.9'], utc=True))
+    naive = pd.Series(pd.to_datetime(['2013-09-08 17:00:00.9']))
+    assert epoch_seconds(aware).tolist() == epoch_seconds(naive).tolist() == [1378659600]
+    assert epoch_seconds(ts(0)) == 1378659600
+
+
+def test_writer_round_trip_dedups_overlaps(store, tmp_path):
+    anchors = sorted(store.anchors)[:4]
+    writer = ArchiveWriter(str(tmp_path / 'archive'))
+    for anchor in anchors:
+        # Overlapping windows give some tweets twice
+        for start, end in [(ts(-48), ts(6)), (ts(-6), ts(48))]:
+            writer.add(anchor, start, end, tweets_to_frame(store.find(anchor, start, end)))
+    writer.add('#empty', ts(-1), ts(1), tweets_to_frame([]))
+    archive = writer.close()
+
+    assert archive.anchors == sorted(anchors + ['#empty'])
+    assert len(archive) == sum(len(store_frame(store, a, ts(-48), ts(48))) for a in anchors)
+    for anchor in anchors:
+        pd.testing.assert_frame_equal(archive_frame(archive, anchor, ts(-48), ts(48)),
+                                      store_frame(store, anchor, ts(-48), ts(48)))
+        pd.testing.assert_frame_equal(archive_frame(archive, anchor, ts(1), ts(3)),
+                                      store_frame(store, anchor, ts(1), ts(3)))
+        assert archive.covers(anchor, ts(-48), ts(48))
+        assert not archive.covers(anchor, ts(-49), ts(0))
+    assert archive.frame('#empty', ts(-1), ts(1)).empty
+
+    # Reopening reads the same columns
+    again = TweetArchive(archive.path)
+    assert all(np.array_equal(again.columns[c], archive.columns[c]) for c in archive.columns)
+
+
+def test_window_is_a_view(store, tmp_path):
+    anchor = sorted(store.anchors)[0]
+    writer = ArchiveWriter(str(tmp_path / 'archive'))
+    writer.add(anchor, ts(-48), ts(48), tweets_to_frame(store.find(anchor, ts(-48), ts(48))))
+    archive = writer.close()
+    window = archive.window(anchor, ts(-5), ts(15))
+    assert all(np.shares_memory(window[c], archive.columns[c]) for c in window if len(window[c]))
+
+
+def test_uncovered_windows_raise_or_go_to_the_query(store, tmp_path):
+    anchor = sorted(store.anchors)[0]
+    writer = ArchiveWriter(str(tmp_path / 'archive'))
+    writer.add(anchor, ts(-5), ts(15), tweets_to_frame(store.find(anchor, ts(-5), ts(15))))
+    writer.close()
+
+    with pytest.raises(ValueError, match='not in the archive'):
+        TweetArchive(str(tmp_path / 'archive')).get_ambient_tweets(anchor, window_dates(ts(-6), ts(15)))
+    with pytest.raises(ValueError):
+        TweetArchive(str(tmp_path / 'archive')).get_ambient_tweets('#other', window_dates(ts(0), ts(1)))
+
+    archive = TweetArchive(str(tmp_path / 'archive'), query=synthetic.get_ambient_tweets)
+    n_queries = len(store.queries)
+    assert len(list(archive.get_ambient_tweets(anchor, window_dates(ts(-6), ts(15)), store)))
+    assert len(store.queries) == n_queries + 1
+    list(archive.get_ambient_tweets(anchor, window_dates(ts(-5), ts(15)), store))
+    assert len(store.queries) == n_queries + 1
+
+
+def test_build_from_cache(store, tmp_path):
+    cache = TweetCache(cache_dir=str(tmp_path / 'tweets'), query=synthetic.get_ambient_tweets)
+    anchors = sorted(store.anchors)[:3]
+    for anchor in anchors:
+        cache.fetch(anchor, ts(-24), ts(24), store)
+    cache.flush()
+
+    archive = build_from_cache(str(tmp_path / 'archive'), cache_dir=cache.cache_dir)
+    for anchor in anchors:
+        pd.testing.assert_frame_equal(archive_frame(archive, anchor, ts(-24), ts(24)),
+                                      store_frame(store, anchor, ts(-24), ts(24)))
+        assert archive.covers(anchor, ts(-24), ts(24))
+
+
+def test_count_matrix_from_the_archive_matches_the_store(games, store, tmp_path):
+    # The windows build_count_matrix fetches
+    windows = game_windows(games, SPAN + pd.Timedelta(hours=1), SPAN, at='kickoff_utc')
+    archive = build_from_query(windows, store, str(tmp_path / 'archive'), query=synthetic.get_ambient_tweets)
+    # One query per run of overlapping windows of an anchor
+    assert len(store.queries) == windows['anchor'].nunique()
+
+    n_queries = len(store.queries)
+    from_archive = build_count_matrix(games, None, path=str(tmp_path / 'archive_counts.npy'),
+                                      query=archive.get_ambient_tweets)
+    assert len(store.queries) == n_queries
+    from_store = build_count_matrix(games, store, path=str(tmp_path / 'store_counts.npy'),
+                                    query=synthetic.get_ambient_tweets)
+    assert np.array_equal(np.asarray(from_archive.counts), np.asarray(from_store.counts))
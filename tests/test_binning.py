@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from ekthesis.binning import bin_counts, bin_offsets, game_bin_counts
+
+
+def random_tweets(n_games=6, n_tweets=3000, seed=0):
+    rng = np.random.default_rng(seed)
+    kickoffs = pd.Series(pd.to_datetime('2013-09-08 17:00', utc=True)
+                         + pd.to_timedelta(rng.integers(0, 30 * 24 * 60, n_games), unit='min'))
+    game_idx = rng.integers(0, n_games, n_tweets)
+    offsets = pd.to_timedelta(rng.integers(-8 * 3600, 20 * 3600, n_tweets), unit='s')
+    times = kickoffs.iloc[game_idx].reset_index(drop=True) + offsets
+    return times, kickoffs, game_idx
+
+
+def loop_counts(times, kickoffs, game_idx, n_games, width, start, stop, align=True):
+    """The scripts' per-tweet binning: floor kickoff, then bucket the offset"""
+    width, start, stop = pd.Timedelta(width), pd.Timedelta(start), pd.Timedelta(stop)
+    n_bins = int((stop - start) // width)
+    counts = np.zeros((n_games, n_bins), dtype=np.int64)
+    for t, g in zip(times, game_idx):
+        kickoff = kickoffs.iloc[g].floor(width) if align else kickoffs.iloc[g]
+        offset = t - kickoff - start
+        if offset >= pd.Timedelta(0):
+            b = offset // width
+            if b < n_bins:
+                counts[g, b] += 1
+    return counts
+
+
+@pytest.mark.parametrize('width,start,stop,align', [
+    ('1h', '-5h', '15h', True),
+    ('30min', '-5h', '15h', True),
+    ('1h', '-3h', '14h', False),
+    ('5min', '-1h', '1h', True),
+])
+def test_bin_counts_match_loop(width, start, stop, align):
+    times, kickoffs, game_idx = random_tweets()
+    counts = bin_counts(times, kickoffs.iloc[game_idx], game_idx, len(kickoffs), width, start, stop,
+                        align=align)
+    expected = loop_counts(times, kickoffs, game_idx, len(kickoffs), width, start, stop, align=align)
+    assert np.array_equal(counts, expected)
+
+
+def test_bin_edges():
+    kickoff = pd.Timestamp('2013-09-08 20:25', tz='UTC')
+    times = pd.Series(pd.to_datetime([
+        '2013-09-08 15:00',           # first bin, kickoff floored to 20:00
+        '2013-09-08 14:59:59.999',    # before the range
+        '2013-09-09 10:59:59',        # last bin
+        '2013-09-09 11:00',           # at stop, out
+    ], utc=True, format='ISO8601'))
+    counts = bin_counts(times, pd.Series([kickoff] * 4), np.zeros(4, dtype=int), 1, '1h', '-5h', '15h')
+    assert counts.sum() == 2
+    assert counts[0, 0] == 1 and counts[0, -1] == 1
+
+
+def test_naive_times_are_utc():
+    times, kickoffs, game_idx = random_tweets(n_tweets=200)
+    aware = bin_counts(times, kickoffs.iloc[game_idx], game_idx, len(kickoffs), '1h', '-5h', '15h')
+    naive = bin_counts(times.dt.tz_localize(None), kickoffs.iloc[game_idx].dt.tz_localize(None),
+                       game_idx, len(kickoffs), '1h', '-5h', '15h')
+    assert np.array_equal(aware, naive)
+
+
+def test_game_bin_counts_skips_unknown_games():
+    times, kickoffs, game_idx = random_tweets(n_games=3, n_tweets=300)
+    games = pd.DataFrame({'game_id': ['a', 'b', 'c'], 'kickoff_utc': kickoffs})
+    tweets = pd.DataFrame({'game_id': np.array(['a', 'b', 'c'])[game_idx], 'tweet_created_at': times})
+    tweets.loc[::7, 'game_id'] = 'unknown'
+    counts = game_bin_counts(tweets, games, '1h', '-5h', '15h')
+    known = (tweets['game_id'] != 'unknown').to_numpy()
+    expected = loop_counts(times[known], kickoffs, game_idx[known], 3, '1h', '-5h', '15h')
+    assert np.array_equal(counts, expected)
+
+
+def test_bin_offsets():
+    assert bin_offsets('30min', '-1h', '1h').tolist() == [-1.0, -0.5, 0.0, 0.5]
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+from scipy import sparse
+
+from ekthesis.bootstrap import bands, bootstrap_means, percentile_interval, resample_weights
+
+
+@pytest.fixture
+def counts():
+    return np.random.default_rng(1).poisson(20, size=(12, 6))
+
+
+@pytest.fixture
+def groups():
+    incidence = np.zeros((3, 12))
+    incidence[0, [0, 1, 2, 3]] = 1
+    incidence[1, [2, 4, 6, 8, 10]] = 1
+    incidence[2, [11]] = 1
+    return sparse.csr_matrix(incidence)
+
+
+def naive_means(counts, groups, n, seed):
+    """The same draws as resample_weights, one replicate and group at a time"""
+    rng = np.random.default_rng(seed)
+    members = [groups.indices[groups.indptr[g]:groups.indptr[g + 1]] for g in range(groups.shape[0])]
+    sizes = np.array([len(m) for m in members])
+    draws = rng.random((n, sizes.sum()))
+    means = np.empty((n, len(members), counts.shape[1]))
+    for r in range(n):
+        offset = 0
+        for g, m in enumerate(members):
+            picks = m[(draws[r, offset:offset + len(m)] * len(m)).astype(np.int64)]
+            means[r, g] = counts[picks].mean(axis=0)
+            offset += len(m)
+    return means
+
+
+def test_weights_sum_to_group_sizes(groups):
+    weights = resample_weights(groups, n=50, seed=3)
+    sizes = np.diff(groups.indptr)
+    assert weights.shape == (50, sizes.sum())
+    per_group = np.add.reduceat(weights, groups.indptr[:-1], axis=1)
+    assert (per_group == sizes).all()
+
+
+def test_means_match_naive_loop(counts, groups):
+    assert np.allclose(bootstrap_means(counts, groups, n=40, seed=5),
+                       naive_means(counts, groups, 40, 5))
+
+
+def test_means_center_on_group_means(counts, groups):
+    means = bootstrap_means(counts, groups, n=4000, seed=0)
+    expected = np.stack([counts[groups[g].indices].mean(axis=0) for g in range(3)])
+    assert np.allclose(means.mean(axis=0), expected, rtol=0.02)
+    # A single game resamples to itself
+    assert np.allclose(means[:, 2], counts[11])
+
+
+def test_one_group_by_default(counts):
+    means = bootstrap_means(counts, n=30, seed=2)
+    assert means.shape == (30, 1, counts.shape[1])
+    assert np.allclose(means, bootstrap_means(counts, sparse.csr_matrix(np.ones((1, 12))), n=30, seed=2))
+
+
+def test_empty_group_is_nan(counts):
+    incidence = sparse.csr_matrix(np.vstack([np.ones(12), np.zeros(12)]))
+    means = bootstrap_means(counts, incidence, n=10)
+    assert np.isnan(means[:, 1]).all()
+    assert not np.isnan(means[:, 0]).any()
+
+
+def test_bands_are_percentiles_of_means(counts, groups):
+    (curve_lo, curve_hi), (total_lo, total_hi) = bands(counts, groups, n=200, level=0.9, seed=4)
+    means = bootstrap_means(counts, groups, n=200, seed=4)
+    lo, hi = percentile_interval(means, 0.9)
+    assert np.array_equal(curve_lo, lo) and np.array_equal(curve_hi, hi)
+    assert (curve_lo <= curve_hi).all() and (total_lo <= total_hi).all()
+    assert np.allclose(percentile_interval(means.sum(axis=2), 0.9), (total_lo, total_hi))
@@ -0,0 +1,155 @@
+import os
+
+import pandas as pd
+import pytest
+
+from ekthesis import cache as cache_module, synthetic
+from ekthesis.cache import TweetCache, add_window, missing_windows, tweets_to_frame
+from ekthesis.games import load_games
+
+
+def ts(hours):
+    return pd.Timestamp('2013-09-08 17:00', tz='UTC') + pd.Timedelta(hours=hours)
+
+
+@pytest.fixture
+def store():
+    games = load_games()
+    games = games[(games['season'] == 2013) & (games['week'] == 1)].reset_index(drop=True)
+    return synthetic.SyntheticStore(games, volume=20)
+
+
+@pytest.fixture
+def anchor(store):
+    # The busiest anchor, so every window below holds tweets
+    return max(store.anchors, key=lambda a: len(store.anchors[a]['times']))
+
+
+def make_cache(tmp_path, **kwargs):
+    return TweetCache(cache_dir=str(tmp_path / 'tweets'), query=synthetic.get_ambient_tweets, **kwargs)
+
+
+def direct(store, anchor, start, end):
+    """The store's tweets for `anchor` in [start, end), as the cache returns them"""
+    frame = tweets_to_frame(store.find(anchor, start, end))
+    store.queries.pop()
+    return frame.sort_values('tweet_created_at', kind='stable').reset_index(drop=True)
+
+
+def windows(cache, anchor):
+    return [(pd.Timestamp(s['start']), pd.Timestamp(s['end'])) for s in cache._anchor_segments(anchor)]
+
+
+def test_missing_windows():
+    covered = [(ts(0), ts(2)), (ts(4), ts(6))]
+    assert missing_windows(ts(-1), ts(7), covered) == [(ts(-1), ts(0)), (ts(2), ts(4)), (ts(6), ts(7))]
+    assert missing_windows(ts(0), ts(2), covered) == []
+    assert missing_windows(ts(1), ts(5), covered) == [(ts(2), ts(4))]
+    assert missing_windows(ts(7), ts(8), covered) == [(ts(7), ts(8))]
+    assert missing_windows(ts(0), ts(1), []) == [(ts(0), ts(1))]
+    # Touching windows leave no gap between them
+    assert missing_windows(ts(0), ts(4), [(ts(0), ts(2)), (ts(2), ts(4))]) == []
+
+
+def test_add_window():
+    assert add_window([], ts(0), ts(1)) == [(ts(0), ts(1))]
+    assert add_window([(ts(0), ts(2)), (ts(4), ts(6))], ts(1), ts(5)) == [(ts(0), ts(6))]
+    assert add_window([(ts(0), ts(2))], ts(2), ts(3)) == [(ts(0), ts(3))]
+    assert add_window([(ts(4), ts(6))], ts(0), ts(1)) == [(ts(0), ts(1)), (ts(4), ts(6))]
+
+
+def test_only_gaps_are_fetched(store, anchor, tmp_path):
+    cache = make_cache(tmp_path)
+    first = cache.fetch(anchor, ts(-5), ts(15), store)
+    assert first.equals(direct(store, anchor, ts(-5), ts(15)))
+    assert len(store.queries) == 1
+
+    wider = cache.fetch(anchor, ts(-10), ts(20), store)
+    assert [q[2:] for q in store.queries[1:]] == [(ts(-10), ts(-5)), (ts(15), ts(20))]
+    assert wider.equals(direct(store, anchor, ts(-10), ts(20)))
+
+    # Reads inside covered windows make no queries
+    inner = cache.fetch(anchor, ts(0), ts(3), store)
+    assert len(store.queries) == 3
+    assert inner.equals(direct(store, anchor, ts(0), ts(3)))
+
+
+def test_segments_merge_up_to_the_cap(store, anchor, tmp_path, monkeypatch):
+    cache = make_cache(tmp_path)
+    cache.fetch(anchor, ts(-5), ts(15), store)
+    cache.fetch(anchor, ts(-10), ts(20), store)
+    assert windows(cache, anchor) == [(ts(-10), ts(20))]
+    assert len(os.listdir(cache.cache_dir)) == 1
+
+    monkeypatch.setattr(cache_module, 'MERGE_MAX_BYTES', 0)
+    capped = make_cache(tmp_path / 'capped')
+    capped.fetch(anchor, ts(-5), ts(15), store)
+    tweets = capped.fetch(anchor, ts(-10), ts(20), store)
+    assert windows(capped, anchor) == [(ts(-10), ts(-5)), (ts(-5), ts(15)), (ts(15), ts(20))]
+    assert tweets.equals(direct(store, anchor, ts(-10), ts(20)))
+
+
+def test_reads_filter_to_the_window(store, anchor, tmp_path):
+    cache = make_cache(tmp_path)
+    cache.fetch(anchor, ts(-48), ts(48), store)
+    seg = cache._anchor_segments(anchor)[0]
+    part = cache._read_segment(seg, ts(1), ts(2))
+    assert len(part) < len(cache._read_segment(seg))
+    assert part.reset_index(drop=True).equals(direct(store, anchor, ts(1), ts(2)))
+
+
+def test_refresh_trims_overlapping_segments(store, anchor, tmp_path):
+    filled = make_cache(tmp_path)
+    filled.fetch(anchor, ts(-48), ts(48), store)
+    filled.flush()
+    n_queries = len(store.queries)
+
+    cache = make_cache(tmp_path, refresh=True)
+    tweets = cache.fetch(anchor, ts(-5), ts(15), store)
+    assert [q[2:] for q in store.queries[n_queries:]] == [(ts(-5), ts(15))]
+    assert tweets.equals(direct(store, anchor, ts(-5), ts(15)))
+    # The cached tweets on either side of the window are kept
+    assert windows(cache, anchor) == [(ts(-48), ts(-5)), (ts(-5), ts(15)), (ts(15), ts(48))]
+    before = cache._read_segment(cache._anchor_segments(anchor)[0])
+    assert before.reset_index(drop=True).equals(direct(store, anchor, ts(-48), ts(-5)))
+
+    # Each window is refreshed once per instance
+    cache.fetch(anchor, ts(-5), ts(15), store)
+    cache.fetch(anchor, ts(0), ts(10), store)
+    assert len(store.queries) == n_queries + 1
+    cache.fetch(anchor, ts(-48), ts(48), store)
+    assert [q[2:] for q in store.queries[n_queries + 1:]] == [(ts(-48), ts(-5)), (ts(15), ts(48))]
+
+
+def test_least_recently_used_segments_are_evicted(store, tmp_path, monkeypatch):
+    clock = iter(range(1, 1000))
+    monkeypatch.setattr(cache_module.time, 'time', lambda: float(next(clock)))
+    a, b, c = sorted(store.anchors)[:3]
+    cache = make_cache(tmp_path)
+    cache.fetch(a, ts(-48), ts(48), store)
+    cache.fetch(b, ts(-48), ts(48), store)
+    cache.fetch(a, ts(-48), ts(48), store)
+
+    # Room for what is cached now; the next segment pushes the cache over
+    cache.max_bytes = cache._bytes
+    cache.fetch(c, ts(-48), ts(48), store)
+    assert b not in {seg['anchor'] for seg in cache.segments}
+    assert cache._bytes == sum(seg['bytes'] for seg in cache.segments) <= cache.max_bytes
+    cache.flush()
+    assert sorted(os.listdir(cache.cache_dir)) == sorted(['manifest.json'] + [s['file'] for s in cache.segments])
+
+
+def test_manifest_survives_a_new_instance(store, anchor, tmp_path):
+    cache = make_cache(tmp_path)
+    first = cache.fetch(anchor, ts(-5), ts(15), store)
+    cache.flush()
+    n_queries = len(store.queries)
+
+    again = make_cache(tmp_path)
+    assert again.segments == cache.segments
+    assert again.fetch(anchor, ts(-5), ts(15), store).equals(first)
+    assert len(store.queries) == n_queries
+
+    # Segments whose file is gone are forgotten, and fetched again
+    os.remove(os.path.join(cache.cache_dir, cache.segments[0]['file']))
+    assert make_cache(tmp_path).segments == []
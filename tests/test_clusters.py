@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.cluster import DBSCAN
+
+from ekthesis.clusters import EPS_KM, dbscan_sweep, eps_radians, sweep_groups, sweep_summary
+
+
+def city_tweets(seed, n=600):
+    """Tweets scattered around a few cities, with repeated coordinates as geotags have"""
+    rng = np.random.default_rng(seed)
+    cities = np.array([[40.7, -74.0], [41.9, -87.6], [34.0, -118.2], [32.8, -96.8]])
+    city = rng.integers(len(cities), size=n)
+    spread = rng.choice([0.05, 0.3, 1.5], size=n)[:, None]
+    coords = cities[city] + rng.normal(size=(n, 2)) * spread
+    coords = np.round(coords, 2)
+    # Rural noise
+    coords[:n // 10] = np.column_stack([rng.uniform(30, 48, n // 10), rng.uniform(-120, -75, n // 10)])
+    return coords[:, 0], coords[:, 1]
+
+
+def refit(lat, lon, eps_km, min_samples):
+    X = np.radians(np.column_stack([lat, lon]))
+    return np.column_stack([DBSCAN(eps=eps_radians(eps), min_samples=min_samples, metric='haversine')
+                            .fit(X).labels_ for eps in eps_km])
+
+
+def core_partition(labels, core):
+    """Clusters of the core points as a set of frozensets of point numbers"""
+    return {frozenset(np.flatnonzero(core & (labels == c))) for c in set(labels[core].tolist())}
+
+
+@pytest.mark.parametrize('seed,min_samples', [(0, 15), (1, 5), (2, 40)])
+def test_sweep_matches_refit_dbscan(seed, min_samples):
+    lat, lon = city_tweets(seed)
+    labels = dbscan_sweep(lat, lon, EPS_KM, min_samples)
+    expected = refit(lat, lon, EPS_KM, min_samples)
+
+    assert sweep_summary(labels) == sweep_summary(expected)
+    for j, eps in enumerate(EPS_KM):
+        assert np.array_equal(labels[:, j] == -1, expected[:, j] == -1)
+        fit = DBSCAN(eps=eps_radians(eps), min_samples=min_samples, metric='haversine').fit(
+            np.radians(np.column_stack([lat, lon])))
+        core = np.zeros(len(lat), dtype=bool)
+        core[fit.core_sample_indices_] = True
+        assert core_partition(labels[:, j], core) == core_partition(expected[:, j], core)
+
+
+def test_empty_and_all_noise():
+    assert dbscan_sweep([], [], EPS_KM).shape == (0, len(EPS_KM))
+    labels = dbscan_sweep([40.0, 45.0], [-80.0, -100.0], EPS_KM, min_samples=3)
+    assert (labels == -1).all()
+
+
+def test_duplicate_coordinates_count_toward_min_samples():
+    labels = dbscan_sweep([40.0] * 5, [-80.0] * 5, [25], min_samples=5)
+    assert (labels == 0).all()
+    assert (dbscan_sweep([40.0] * 4, [-80.0] * 4, [25], min_samples=5) == -1).all()
+
+
+def test_sweep_groups_matches_per_group_sweeps():
+    frames = []
+    for seed, team in enumerate(['DAL', 'NYG', 'CHI']):
+        lat, lon = city_tweets(seed, n=200)
+        frames.append(pd.DataFrame({'team': team, 'season': 2013, 'lat': lat, 'lon': lon}))
+    tweets = pd.concat(frames, ignore_index=True).sample(frac=1, random_state=0)
+
+    summary, labels = sweep_groups(tweets, min_samples=10, workers=2)
+    assert list(labels.columns) == [f'cluster_{eps}' for eps in EPS_KM]
+    assert labels.index.equals(tweets.index)
+    for team, group in tweets.groupby('team'):
+        expected = dbscan_sweep(group['lat'], group['lon'], EPS_KM, 10)
+        assert np.array_equal(labels.loc[group.index].to_numpy(), expected)
+        rows = summary[summary['team'] == team].drop(columns=['team', 'season']).to_dict('records')
+        assert rows == sweep_summary(expected)
+
+
+def test_main_sweeps_a_tweet_file(tmp_path):
+    from ekthesis.clusters import main
+
+    frames = []
+    for seed, team in enumerate(['DAL', 'NYG']):
+        lat, lon = city_tweets(seed, n=200)
+        frames.append(pd.DataFrame({'team': team, 'season': 2013, 'lat': lat, 'lon': lon}))
+    tweets = pd.concat(frames, ignore_index=True)
+    tweets.to_parquet(tmp_path / 'geo.parquet')
+
+    summary = main([str(tmp_path / 'geo.parquet'), '--eps', '25', '75', '--min-samples', '10',
+                    '--workers', '1', '--output', str(tmp_path / 'sweep.csv'),
+                    '--labels', str(tmp_path / 'labels.csv')])
+    expected, labels = sweep_groups(tweets, eps_km=[25, 75], min_samples=10)
+    pd.testing.assert_frame_equal(summary, expected)
+    pd.testing.assert_frame_equal(pd.read_csv(tmp_path / 'sweep.csv'), expected, check_dtype=False)
+    written = pd.read_csv(tmp_path / 'labels.csv')
+    assert np.array_equal(written[['cluster_25', 'cluster_75']].to_numpy(), labels.to_numpy())
@@ -0,0 +1,174 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ekthesis import synthetic
+from ekthesis.binning import game_bin_counts
+from ekthesis.counts import (SPAN, build_count_matrix, count_matrix_for, index_path, load_count_matrix,
+                             meta_path, query_identity)
+from ekthesis.fetch import fetch_game_tweets
+from ekthesis.games import load_games
+
+
+@pytest.fixture(scope='module')
+def games():
+    games = load_games()
+    week = games[(games['season'] == 2013) & (games['week'].isin([1, 2]))]
+    # 1999 games have no gametime, so no kickoff_utc
+    no_kickoff = games[games['season'] == 1999].head(3)
+    assert no_kickoff['kickoff_utc'].isna().all()
+    return pd.concat([week, no_kickoff], ignore_index=True)
+
+
+@pytest.fixture(scope='module')
+def store(games):
+    return synthetic.SyntheticStore(games.dropna(subset=['kickoff_utc']).reset_index(drop=True))
+
+
+def fetched(games, store, before, after):
+    return fetch_game_tweets(games, store, at='kickoff_utc', freq='h', query=synthetic.get_ambient_tweets,
+                             before=pd.Timedelta(before), after=pd.Timedelta(after))
+
+
+@pytest.fixture(scope='module')
+def matrix(games, store, tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('counts') / 'counts.npy')
+    return build_count_matrix(games, store, path=path, query=synthetic.get_ambient_tweets)
+
+
+@pytest.mark.parametrize('width,start,stop,align', [
+    ('1h', '-5h', '15h', True),
+    ('30min', '-5h', '15h', True),
+    ('1h', '-72h', '73h', True),
+    ('5min', '-3h', '14h', False),
+])
+def test_curve_matches_binning_fetched_tweets(games, store, matrix, width, start, stop, align):
+    timed = games.dropna(subset=['kickoff_utc']).reset_index(drop=True)
+    tweets = fetched(timed, store, '4D', '4D')
+    expected = game_bin_counts(tweets, timed, width, start, stop, align=align)
+    assert np.array_equal(matrix.curve(width, start, stop, game_ids=timed['game_id'], align=align),
+                          expected)
+
+
+def test_games_without_kickoff_have_no_row(games, matrix):
+    no_kickoff = games[games['kickoff_utc'].isna()]
+    assert len(matrix) == games['kickoff_utc'].notna().sum()
+    assert (matrix.rows(no_kickoff['game_id']) == -1).all()
+    assert not matrix.curve('1h', '-5h', '15h', game_ids=no_kickoff['game_id']).any()
+
+
+def test_span_matches_daily_binning(games, store, matrix):
+    timed = games.dropna(subset=['kickoff_utc']).reset_index(drop=True)
+    tweets = fetched(timed, store, '8D', '8D')
+    starts = timed['gameday'] - pd.Timedelta(days=3)
+    daily = matrix.span(timed['game_id'], starts, '1D', 7)
+
+    tweets = tweets.merge(timed[['game_id', 'gameday']], on='game_id')
+    day = (tweets['tweet_created_at'].dt.tz_localize(None) - (tweets['gameday'] - pd.Timedelta(days=3))).dt.days
+    inside = (day >= 0) & (day < 7)
+    expected = np.zeros_like(daily)
+    np.add.at(expected, (pd.Index(timed['game_id']).get_indexer(tweets['game_id'][inside]), day[inside]), 1)
+    assert np.array_equal(daily, expected)
+
+
+def test_offsets_outside_the_span_are_rejected(matrix):
+    with pytest.raises(ValueError):
+        matrix.curve('1h', '-16D', '0h')
+    with pytest.raises(ValueError):
+        matrix.curve('7min', '0h', '1h')
+
+
+def test_count_matrix_for_adds_only_missing_games(games, store, matrix, tmp_path):
+    path = str(tmp_path / 'counts.npy')
+    week1 = games[(games['week'] == 1) | games['kickoff_utc'].isna()]
+    week2 = games[games['week'] == 2]
+
+    def connect():
+        return store
+
+    count_matrix_for(week1, connect, path=path, query=synthetic.get_ambient_tweets)
+    n_queries = len(store.queries)
+    # Games without a kickoff never count as missing
+    count_matrix_for(week1, lambda: pytest.fail("nothing to fetch"), path=path,
+                     query=synthetic.get_ambient_tweets)
+    assert len(store.queries) == n_queries
+
+    merged = count_matrix_for(week2, connect, path=path, query=synthetic.get_ambient_tweets)
+    assert len(merged) == len(matrix)
+    fetched_games = {q[1] for q in store.queries[n_queries:]}
+    assert all(anchor.endswith(tuple(week2['home_team'])) or anchor.endswith(tuple(week2['away_team']))
+               for anchor in fetched_games)
+
+    rows = merged.rows(matrix.games['game_id'])
+    assert np.array_equal(np.asarray(merged.counts)[rows], np.asarray(matrix.counts))
+    assert np.array_equal(load_count_matrix(path).counts, merged.counts)
+
+
+def other_query(*args, **kwargs):
+    return synthetic.get_ambient_tweets(*args, **kwargs)
+
+
+@pytest.fixture
+def built(games, store, tmp_path):
+    path = str(tmp_path / 'counts.npy')
+    count_matrix_for(games, lambda: store, path=path, query=synthetic.get_ambient_tweets)
+    return path
+
+
+def test_matrix_records_its_query(built):
+    assert load_count_matrix(built).meta['query'] == 'ekthesis.synthetic.get_ambient_tweets'
+
+
+def test_query_identity_names_the_wrapped_query(tmp_path):
+    from ekthesis.cache import TweetCache
+
+    cache = TweetCache(cache_dir=str(tmp_path), query=synthetic.get_ambient_tweets)
+    assert query_identity(cache.get_ambient_tweets) == \
+        'ekthesis.cache.TweetCache.get_ambient_tweets(ekthesis.synthetic.get_ambient_tweets)'
+    assert query_identity(None) is None
+
+
+def test_another_query_rebuilds_the_matrix(games, store, matrix, built):
+    n_queries = len(store.queries)
+    rebuilt = count_matrix_for(games, lambda: store, path=built, query=other_query)
+    assert len(store.queries) > n_queries
+    assert rebuilt.meta['query'].endswith('test_counts.other_query')
+    assert np.array_equal(np.asarray(rebuilt.counts), np.asarray(matrix.counts))
+
+
+@pytest.mark.parametrize('damage', ['meta', 'index'])
+def test_unverifiable_matrix_is_rebuilt(games, store, matrix, built, damage):
+    if damage == 'meta':
+        # As written before the metadata existed
+        os.remove(meta_path(built))
+    else:
+        index = pd.read_csv(index_path(built))
+        index.iloc[[0, 1]] = index.iloc[[1, 0]].to_numpy()
+        index.to_csv(index_path(built), index=False)
+
+    n_queries = len(store.queries)
+    rebuilt = count_matrix_for(games, lambda: store, path=built, query=synthetic.get_ambient_tweets)
+    assert len(store.queries) > n_queries
+    rows = rebuilt.rows(matrix.games['game_id'])
+    assert np.array_equal(np.asarray(rebuilt.counts)[rows], np.asarray(matrix.counts))
+
+
+def test_changed_kickoff_refetches_only_that_game(games, store, built):
+    moved = games.copy()
+    changed = moved['kickoff_utc'].first_valid_index()
+    moved.loc[changed, 'kickoff_utc'] += pd.Timedelta(hours=3)
+    before = load_count_matrix(built)
+    others = moved['game_id'][moved['kickoff_utc'].notna() & (moved.index != changed)]
+
+    n_queries = len(store.queries)
+    updated = count_matrix_for(moved, lambda: store, path=built, query=synthetic.get_ambient_tweets)
+    assert 0 < len(store.queries) - n_queries <= 2
+
+    row = updated.rows([moved.loc[changed, 'game_id']])[0]
+    assert updated.games['kickoff_utc'].iloc[row] == moved.loc[changed, 'kickoff_utc']
+    expected = fetched(moved.loc[[changed]], store, SPAN + pd.Timedelta(hours=1), SPAN)
+    assert np.asarray(updated.counts)[row].sum() == len(expected)
+    assert np.array_equal(np.asarray(updated.counts)[updated.rows(others)],
+                          np.asarray(before.counts)[before.rows(others)])
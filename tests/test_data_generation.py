@@ -0,0 +1,45 @@
+import pandas as pd
+import pytest
+
+from ekthesis import synthetic
+from ekthesis.games import load_games
+from ekthesis.scan import matchup_anchors
+from ekthesis.winpct import WIN_PCT_PATH
+
+import data_generation
+
+SEASONS = [2013, 2014]
+
+
+@pytest.fixture
+def store():
+    games = load_games()
+    store = synthetic.SyntheticStore(games[games['season'].isin(SEASONS)].reset_index(drop=True))
+    synthetic.install(store)
+    return store
+
+
+def test_one_query_per_anchor_and_season(store, tmp_path):
+    games = load_games()
+    games = games[games['season'].isin(SEASONS)]
+    df = data_generation.main(seasons=SEASONS, output_path=str(tmp_path / 'game_attention.csv'),
+                              win_pct_path=WIN_PCT_PATH)
+
+    # Division rivals meet twice a season under the same two anchors
+    anchors = sum(len(matchup_anchors(season)) for _, season in games.groupby('season'))
+    assert len(store.queries) == anchors < 2 * len(games)
+    assert len(df) == len(games)
+    assert df['attention'].sum() > 0
+
+
+
+def test_incremental_rerun_queries_nothing(store, tmp_path):
+    path = str(tmp_path / 'game_attention.csv')
+    full = data_generation.main(seasons=SEASONS, output_path=path, win_pct_path=WIN_PCT_PATH)
+    n_queries = len(store.queries)
+
+    again = data_generation.main(seasons=SEASONS, output_path=path, win_pct_path=WIN_PCT_PATH,
+                                 incremental=True)
+    assert len(store.queries) == n_queries
+    pd.testing.assert_frame_equal(again, pd.read_csv(path))
+    assert again['attention'].tolist() == full['attention'].tolist()
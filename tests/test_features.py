@@ -0,0 +1,58 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ekthesis import features
+from ekthesis.features import (ATTENTION_PATH, CATEGORICAL_COLUMNS, NUMERIC_COLUMNS, attention_features,
+                               design_matrix, load_attention)
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(features, 'CACHE_DIR', str(tmp_path))
+    return tmp_path
+
+
+def notebook_matrix(path=ATTENTION_PATH):
+    """The design matrix as the modeling notebooks built it"""
+    games = load_attention(path)
+    X = pd.get_dummies(games[NUMERIC_COLUMNS + CATEGORICAL_COLUMNS], columns=CATEGORICAL_COLUMNS,
+                       drop_first=True)
+    return X.astype(np.float32)
+
+
+def test_matches_get_dummies(cache_dir):
+    X, names, games = design_matrix(cache=False)
+    expected = notebook_matrix()
+    assert names == list(expected.columns)
+    assert X.dtype == np.float32
+    assert np.array_equal(X.toarray(), expected.to_numpy())
+    assert games['game_id'].tolist() == load_attention()['game_id'].tolist()
+
+
+def test_cache_round_trip(cache_dir):
+    X, names, games = design_matrix()
+    assert len(os.listdir(cache_dir)) == 1
+    cached_X, cached_names, cached_games = design_matrix()
+    assert (cached_X != X).nnz == 0 and cached_names == names
+    assert cached_games['game_id'].tolist() == games['game_id'].tolist()
+    np.testing.assert_array_equal(cached_games['attention'], games['attention'])
+
+
+def test_cache_key_covers_the_encoding(cache_dir, monkeypatch):
+    design_matrix()
+    monkeypatch.setattr(features, 'FEATURES_VERSION', features.FEATURES_VERSION + 1)
+    design_matrix()
+    monkeypatch.setattr(features, 'NUMERIC_COLUMNS', NUMERIC_COLUMNS[:-1])
+    X, names, _ = design_matrix()
+    assert len(os.listdir(cache_dir)) == 3
+    assert 'overtime' not in names
+
+
+def test_log10_target_drops_games_without_tweets(cache_dir):
+    X, y, names, games = attention_features(target='log10', min_attention=1, cache=False)
+    assert (games['attention'] >= 1).all()
+    assert X.shape[0] == len(y) == len(games)
+    np.testing.assert_allclose(y, np.log10(games['attention']))
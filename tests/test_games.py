@@ -0,0 +1,67 @@
+import os
+
+import pandas as pd
+import pytest
+
+from ekthesis import games as games_module
+from ekthesis.games import COLUMNS, GAMES_PATH, load_games, parse_games
+
+
+@pytest.fixture(scope='module')
+def games():
+    return parse_games()
+
+
+def kickoff(games, game_id):
+    return games.set_index('game_id').loc[game_id, 'kickoff_utc']
+
+
+def test_kickoff_is_eastern_time_in_utc(games):
+    # Thursday night opener, EDT (UTC-4), kicking off after midnight UTC
+    assert kickoff(games, '2013_01_BAL_DEN') == pd.Timestamp('2013-09-06 00:30', tz='UTC')
+    assert kickoff(games, '2013_01_NE_BUF') == pd.Timestamp('2013-09-08 17:00', tz='UTC')
+    # November, after the switch to EST (UTC-5)
+    assert kickoff(games, '2013_10_WAS_MIN') == pd.Timestamp('2013-11-08 01:25', tz='UTC')
+    assert str(games['kickoff_utc'].dt.tz) == 'UTC'
+
+
+def test_kickoff_matches_row_by_row_localization(games):
+    sample = games.dropna(subset=['kickoff_utc']).sample(200, random_state=0)
+    for _, row in sample.iterrows():
+        local = pd.Timestamp(f"{row['gameday']:%Y-%m-%d} {row['gametime']}").tz_localize('US/Eastern')
+        assert row['kickoff_utc'] == local.tz_convert('UTC')
+
+
+def test_games_without_gametime_have_no_kickoff(games):
+    missing = games['kickoff_utc'].isna()
+    assert missing.any()
+    assert (games.loc[missing, 'season'] == 1999).all()
+    assert games.loc[missing, 'gametime'].isna().all()
+
+
+def test_typed_columns(games):
+    assert set(COLUMNS) <= set(games.columns)
+    assert len(games) == len(pd.read_csv(GAMES_PATH, usecols=['game_id']))
+    # Both team columns compare to each other through shared categories
+    assert games['away_team'].dtype == games['home_team'].dtype
+    assert (games['away_team'] != games['home_team']).all()
+    assert isinstance(games['game_type'].dtype, pd.CategoricalDtype)
+    assert (games['gameday'].dt.normalize() == games['gameday']).all()
+
+
+def test_parquet_cache_round_trip(games, tmp_path, monkeypatch):
+    monkeypatch.setattr(games_module, 'CACHE_DIR', str(tmp_path))
+    first = load_games()
+    assert len(os.listdir(tmp_path)) == 1
+    pd.testing.assert_frame_equal(first, games)
+    pd.testing.assert_frame_equal(load_games(), games)
+
+
+def test_cache_key_covers_the_parse(tmp_path, monkeypatch):
+    monkeypatch.setattr(games_module, 'CACHE_DIR', str(tmp_path))
+    load_games()
+    monkeypatch.setattr(games_module, 'PARSE_VERSION', games_module.PARSE_VERSION + 1)
+    load_games()
+    monkeypatch.setattr(games_module, 'COLUMNS', COLUMNS[:-1])
+    load_games()
+    assert len(os.listdir(tmp_path)) == 3
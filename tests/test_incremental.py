@@ -0,0 +1,55 @@
+import pandas as pd
+
+from ekthesis.incremental import load_output, row_hashes, sidecar_path, stale_keys, write_checkpoint
+
+
+def frame():
+    return pd.DataFrame({'game_id': ['a', 'b', 'c'], 'week': [1, 2, 3], 'total': [40.0, 31.0, None]})
+
+
+def test_hashes_are_stable_and_per_row():
+    hashes = row_hashes(frame(), ['week', 'total'])
+    assert list(hashes.index) == ['a', 'b', 'c']
+    assert hashes.equals(row_hashes(frame().iloc[::-1], ['week', 'total']).loc[hashes.index])
+
+    changed = frame()
+    changed.loc[1, 'total'] = 32.0
+    assert (row_hashes(changed, ['week', 'total']) != hashes).tolist() == [False, True, False]
+    # Columns outside the inputs don't matter
+    changed = frame().assign(other=1)
+    assert row_hashes(changed, ['week', 'total']).equals(hashes)
+
+
+def test_stale_keys_are_missing_or_changed():
+    hashes = row_hashes(frame(), ['week', 'total'])
+    output = pd.DataFrame({'game_id': ['a', 'b']})
+    saved = hashes[['a', 'b']].copy()
+    saved['b'] = '0' * 16
+    assert list(stale_keys(hashes, output, saved)) == ['b', 'c']
+    assert list(stale_keys(hashes, pd.DataFrame(), saved.iloc[:0])) == ['a', 'b', 'c']
+    # An output row without a saved hash is recomputed
+    assert list(stale_keys(hashes, pd.DataFrame({'game_id': ['a', 'b', 'c']}), hashes[['a']])) == ['b', 'c']
+
+
+def test_checkpoint_round_trip(tmp_path):
+    path = str(tmp_path / 'out.csv')
+    assert load_output(path)[0].empty
+
+    hashes = row_hashes(frame(), ['week', 'total'])
+    output = pd.DataFrame({'game_id': ['a', 'c'], 'attention': [5, 7]})
+    write_checkpoint(path, output, hashes)
+    loaded, saved = load_output(path)
+    pd.testing.assert_frame_equal(loaded, output)
+    # Only hashes of games in the output are kept
+    assert saved.to_dict() == hashes[['a', 'c']].to_dict()
+    assert list(stale_keys(hashes, loaded, saved)) == ['b']
+
+
+def test_output_without_sidecar_recomputes_everything(tmp_path):
+    path = str(tmp_path / 'out.csv')
+    hashes = row_hashes(frame(), ['week', 'total'])
+    write_checkpoint(path, pd.DataFrame({'game_id': ['a', 'b', 'c']}), hashes)
+    (tmp_path / 'out_inputs.csv').unlink()
+    assert sidecar_path(path) == str(tmp_path / 'out_inputs.csv')
+    output, saved = load_output(path)
+    assert list(stale_keys(hashes, output, saved)) == ['a', 'b', 'c']
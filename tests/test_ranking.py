@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from ekthesis.games import load_games
+from ekthesis.ranking import group_curves, incidence, season_divisions, slot_pairs
+
+
+@pytest.fixture(scope='module')
+def games():
+    games = load_games()
+    return games[games['season'].between(2013, 2017) & (games['game_type'] == 'REG')].reset_index(drop=True)
+
+
+@pytest.fixture(scope='module')
+def counts(games):
+    rng = np.random.default_rng(0)
+    counts = rng.poisson(30, size=(len(games), 20))
+    # Games without tweets don't count towards an average
+    counts[rng.random(len(games)) < 0.2] = 0
+    return counts
+
+
+def team_loop(games, counts):
+    """The per-team dict accumulation ranking_attention.py started from"""
+    sums, n = {}, {}
+    for row, game in games.iterrows():
+        if not counts[row].sum():
+            continue
+        for team in (str(game['home_team']), str(game['away_team'])):
+            sums[team] = sums.get(team, 0) + counts[row]
+            n[team] = n.get(team, 0) + 1
+    return {team: sums[team] / n[team] for team in sums}, n
+
+
+def test_team_curves_match_a_loop(games, counts):
+    curves = group_curves(counts, games, by='team', bins=range(-5, 15))
+    expected, n = team_loop(games, counts)
+    assert set(curves.index) == set(expected)
+    for team, row in curves.iterrows():
+        np.testing.assert_allclose(row[list(range(-5, 15))].to_numpy(dtype=float), expected[team])
+        assert row['games'] == n[team]
+    np.testing.assert_allclose(curves['attention'], curves[list(range(-5, 15))].sum(axis=1))
+    assert curves['attention'].is_monotonic_decreasing
+
+
+def test_home_and_away_split_the_team_games(games):
+    team, labels = incidence(games, 'team')
+    home, home_labels = incidence(games, 'home')
+    away, away_labels = incidence(games, 'away')
+    assert list(labels) == list(home_labels) == list(away_labels)
+    assert ((home + away) != team).nnz == 0
+    assert (np.asarray(team.sum(axis=0)).ravel() == 2).all()
+
+
+def test_divisions_follow_div_games(games):
+    divisions = season_divisions(games)
+    assert divisions[(2013, 'DAL')] == 'DAL/NYG/PHI/WAS'
+    assert divisions[(2013, 'NE')] == 'BUF/MIA/NE/NYJ'
+    # The Rams keep their division through the move from St. Louis
+    assert divisions[(2015, 'STL')] == divisions[(2016, 'LA')] == 'ARI/LA/SEA/SF'
+    assert divisions.groupby(level=0).nunique().eq(8).all()
+
+
+def test_division_games_count_once(games):
+    matrix, labels = incidence(games, 'division')
+    per_game = np.asarray(matrix.sum(axis=0)).ravel()
+    assert (per_game == np.where(games['div_game'] == 1, 1, 2)).all()
+
+
+def test_kickoff_slots():
+    games = pd.DataFrame({'gametime': ['13:00', '16:25', '20:30', '09:30', None]})
+    assert slot_pairs(games)['group'].tolist() == ['early', 'late', 'primetime', 'early', 'unknown']
+
+
+def test_combined_groupings(games, counts):
+    curves = group_curves(counts, games, by=['team', 'slot'])
+    assert curves.index.names == ['team', 'slot']
+    teams = group_curves(counts, games, by='team')
+    # Every team game with tweets is in exactly one of the team's slots
+    assert curves['games'].groupby(level='team').sum().equals(teams['games'].sort_index())
+
+
+def test_unknown_grouping(games):
+    with pytest.raises(ValueError, match='Unknown groupings'):
+        incidence(games, ['team', 'stadium'])
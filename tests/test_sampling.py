@@ -0,0 +1,95 @@
+import os
+
+import numpy as np
+import pytest
+from scipy.stats import poisson
+
+from ekthesis.sampling import poisson_interval, rank_stability, ranks, replicates, sample_path
+
+
+def test_sample_path():
+    assert sample_path('counts.npy', 1.0) == 'counts.npy'
+    assert sample_path('counts.npy', None) == 'counts.npy'
+    assert sample_path('counts.npy', 0.1) == 'counts_p0.1.npy'
+    assert sample_path(os.path.join('a', '.tweet_cache') + os.sep, 0.05) == os.path.join('a', '.tweet_cache_p0.05')
+
+
+def test_garwood_interval_values():
+    lo, hi = poisson_interval([0, 1, 10])
+    # Exact 95% Poisson limits, e.g. from Garwood (1936)
+    np.testing.assert_allclose(lo, [0.0, 0.0253178, 4.7953887], rtol=1e-6)
+    np.testing.assert_allclose(hi, [3.6888794, 5.5716434, 18.3903560], rtol=1e-6)
+
+    lo_p, hi_p = poisson_interval([0, 1, 10], p=0.1)
+    np.testing.assert_allclose(lo_p, lo / 0.1)
+    np.testing.assert_allclose(hi_p, hi / 0.1)
+
+
+def test_garwood_interval_is_exact():
+    # At the limits, the observed count sits in the 2.5% tail of the Poisson
+    counts = np.arange(1, 200)
+    lo, hi = poisson_interval(counts)
+    np.testing.assert_allclose(poisson.sf(counts - 1, lo), 0.025, rtol=1e-6)
+    np.testing.assert_allclose(poisson.cdf(counts, hi), 0.025, rtol=1e-6)
+
+
+@pytest.mark.parametrize('full,p', [(40, 0.1), (2000, 0.05), (300, 0.5)])
+def test_interval_covers_the_full_count(full, p):
+    rng = np.random.default_rng(0)
+    sampled = rng.binomial(full, p, size=4000)
+    lo, hi = poisson_interval(sampled, p)
+    coverage = ((lo <= full) & (full <= hi)).mean()
+    # Garwood intervals are conservative
+    assert coverage >= 0.94
+
+
+def test_replicates_redraw_each_count():
+    counts = np.array([[0, 5], [50, 500]])
+    reps = replicates(counts, n=4000, seed=1)
+    assert reps.shape == (4000, 2, 2)
+    assert (reps[:, 0, 0] == 0).all()
+    np.testing.assert_allclose(reps.mean(axis=0), counts, rtol=0.03)
+    np.testing.assert_allclose(reps.var(axis=0)[1], counts[1], rtol=0.1)
+    assert np.array_equal(replicates(counts, n=5, seed=2), replicates(counts, n=5, seed=2))
+
+
+def test_ranks():
+    values = np.array([[3.0, 1.0, 2.0], [0.0, 5.0, 5.0]])
+    # Ties keep their column order
+    assert ranks(values).tolist() == [[1, 3, 2], [3, 1, 2]]
+
+
+def test_separated_groups_are_stable():
+    observed = np.array([100.0, 1000.0, 10000.0, 10.0])
+    order, table, summary = rank_stability(observed, replicates(observed, n=300))
+    assert order.tolist() == [2, 1, 0, 3]
+    assert table['rank'].tolist() == [1, 2, 3, 4]
+    assert (table['rank_lo'] == table['rank']).all() and (table['rank_hi'] == table['rank']).all()
+    assert summary == {'spearman_median': 1.0, 'pairs_holding': 3, 'pairs': 3, 'stable': True}
+
+
+def test_close_groups_are_not_stable():
+    observed = np.array([20.0, 21.0, 500.0])
+    order, table, summary = rank_stability(observed, replicates(observed, n=300))
+    assert order.tolist() == [2, 1, 0]
+    # The two close groups swap in a good share of the replicates
+    assert 0.3 < table['holds'].iloc[1] < 0.8
+    assert table['rank_lo'].iloc[1] == 2 and table['rank_hi'].iloc[1] == 3
+    assert summary['pairs_holding'] == 1 and not summary['stable']
+    assert np.isnan(table['holds'].iloc[-1])
+
+
+def test_window_percentages_scale_the_sample():
+    from ekthesis.analyses import PERCENTAGE_BASE, PERCENTAGE_WINDOWS, window_percentages
+
+    hourly = np.random.default_rng(1).poisson(50, 673).astype(np.float64)
+    full = window_percentages(hourly)
+    start, stop = PERCENTAGE_WINDOWS['±72h']
+    assert full.loc['±72h', 'tweets'] == hourly[start + 336:stop + 336].sum()
+    assert full.loc[PERCENTAGE_BASE, 'percent'] == 100
+
+    sampled = window_percentages(hourly, 0.25)
+    assert np.allclose(sampled['tweets'], full['tweets'] / 0.25)
+    assert np.allclose(sampled['percent'], full['percent'])
+    assert (sampled['tweets_lo'] <= sampled['tweets']).all() and (sampled['tweets'] <= sampled['tweets_hi']).all()
+    assert (sampled['percent_lo'] <= sampled['percent']).all() and (sampled['percent'] <= sampled['percent_hi']).all()
@@ -0,0 +1,125 @@
+import gzip
+import json
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ekthesis import scan
+
+ANCHORS = ['#Cardinals', '#DALvsNYG', '#NYG', '#Giants', 'giants', '#nyg']
+
+
+def tweets(seed, n=400):
+    """Documents with anchors, anchor prefixes and every supported time format"""
+    rng = np.random.default_rng(seed)
+    words = ['#Cardinals', '#CardinalsNation', '#DALvsNYG', '#nyg!', '#NYG_fans', 'Giants,',
+             'giant', 'go', 'team', '#dalvsnyg2']
+    start = pd.Timestamp('2013-09-08 12:00', tz='UTC')
+    docs = []
+    for i in range(n):
+        text = ' '.join(rng.choice(words, size=rng.integers(1, 5)))
+        created = start + pd.Timedelta(minutes=int(rng.integers(0, 3 * 24 * 60)))
+        kind = i % 3
+        if kind == 0:
+            value = created.isoformat()
+        elif kind == 1:
+            value = created.strftime(scan.TWITTER_TIME_FORMAT)
+        else:
+            value = {'$date': {'$numberLong': str(created.value // 10**6)}}
+        docs.append({'_id': str(i), 'tweet_created_at': value, 'text': text, '_created': created})
+    return docs
+
+
+def expected_counts(docs, anchors, freq='h'):
+    """Anchor counts by searching each text with str.find"""
+    rows = []
+    for doc in docs:
+        text = doc['text'].lower()
+        for anchor in dict.fromkeys(anchors):
+            key = anchor.lower()
+            at = text.find(key)
+            while at >= 0:
+                end = at + len(key)
+                if end == len(text) or text[end] not in scan.WORD_CHARS:
+                    rows.append((anchor, doc['_created'].floor(freq)))
+                    break
+                at = text.find(key, at + 1)
+    table = pd.DataFrame(rows, columns=['anchor', 'period'])
+    return table.groupby(['anchor', 'period'], as_index=False).size().rename(columns={'size': 'tweets'})
+
+
+@pytest.fixture
+def dumps(tmp_path):
+    paths = []
+    for seed in range(3):
+        path = tmp_path / f'tweets-{seed}.jsonl.gz'
+        docs = tweets(seed)
+        assert scan.write_dump(docs, path) == len(docs)
+        paths.append((path, docs))
+    return paths
+
+
+def sort(table):
+    table = table.sort_values(['anchor', 'period']).reset_index(drop=True)
+    table['period'] = table['period'].dt.as_unit('ns')
+    table['tweets'] = table['tweets'].astype(np.int64)
+    return table
+
+
+def test_fallback_automaton_matches_pyahocorasick(monkeypatch):
+    pytest.importorskip('ahocorasick')
+    texts = [doc['text'] for doc in tweets(5)]
+    native = scan.build_automaton(ANCHORS)
+    monkeypatch.setitem(sys.modules, 'ahocorasick', None)
+    fallback = scan.build_automaton(ANCHORS)
+    assert isinstance(fallback, scan.Automaton)
+    for text in texts:
+        text = text.lower()
+        assert sorted(fallback.iter(text)) == sorted(native.iter(text))
+
+
+def test_anchors_end_at_word_boundary():
+    automaton = scan.build_automaton(['#Cardinals', '#nyg'])
+    assert scan.match_anchors(automaton, 'Go #CARDINALS!') == {0}
+    assert scan.match_anchors(automaton, '#CardinalsNation') == set()
+    assert scan.match_anchors(automaton, '#NYG_fans #nyg2') == set()
+    assert scan.match_anchors(automaton, '#CardinalsNation #Cardinals #nyg') == {0, 1}
+
+
+def test_time_formats_parse_to_the_same_instant():
+    created = pd.Timestamp('2013-09-08 20:31:05', tz='UTC')
+    values = [created.isoformat(), created.strftime(scan.TWITTER_TIME_FORMAT),
+              scan.created_value({'tweet_created_at': {'$date': {'$numberLong': str(created.value // 10**6)}}}),
+              'not a time']
+    parsed = scan.parse_created(values)
+    assert (parsed[:3] == created).all()
+    assert parsed[3] is pd.NaT
+
+
+@pytest.mark.parametrize('freq', ['h', 'D'])
+def test_scan_matches_word_counts(dumps, freq):
+    docs = [doc for _, ds in dumps for doc in ds]
+    table = scan.scan_dumps([str(path) for path, _ in dumps], ANCHORS, freq=freq)
+    pd.testing.assert_frame_equal(sort(table), sort(expected_counts(docs, ANCHORS, freq)))
+
+
+def test_workers_match_serial(dumps, tmp_path):
+    serial = scan.scan_dumps([str(tmp_path)], ANCHORS)
+    parallel = scan.scan_dumps([str(tmp_path)], ANCHORS, workers=3)
+    assert serial['tweets'].sum() > 0
+    pd.testing.assert_frame_equal(sort(parallel), sort(serial))
+
+
+def test_blank_lines_and_misses(tmp_path):
+    path = tmp_path / 'blank.jsonl.gz'
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        f.write(json.dumps({'_id': 1, 'tweet_created_at': '2013-09-08T20:00:00Z', 'text': 'no anchors'}))
+        f.write('\n\n')
+        # The anchor is in another field, not the text
+        f.write(json.dumps({'_id': '#nyg', 'tweet_created_at': '2013-09-08T20:00:00Z', 'text': 'x'}))
+        f.write('\n')
+    numbers, periods, counts, n_tweets = scan.scan_file(str(path), ANCHORS)
+    assert n_tweets == 2
+    assert len(numbers) == len(periods) == len(counts) == 0
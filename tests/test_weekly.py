@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from ekthesis import synthetic
+from ekthesis.analyses import weekly
+from ekthesis.counts import build_count_matrix
+from ekthesis.fetch import fetch_game_tweets
+from ekthesis.games import load_games
+from ekthesis.weekly import weekly_attention, weekly_table
+
+
+@pytest.fixture(scope='module')
+def games():
+    games = load_games()
+    return games[(games['season'] == 2013) & (games['week'] <= 4)].reset_index(drop=True)
+
+
+@pytest.fixture(scope='module')
+def store(games):
+    return synthetic.SyntheticStore(games)
+
+
+@pytest.fixture(scope='module')
+def matrix(games, store, tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('weekly') / 'counts.npy')
+    return build_count_matrix(games, store, path=path, query=synthetic.get_ambient_tweets)
+
+
+def test_weekly_table_sums_games_per_week():
+    games = pd.DataFrame({'season': [2013, 2013, 2013, 2014], 'week': [1, 1, 2, 1]})
+    table = weekly_table(games, np.array([1, 2, 3, 4]))
+    assert table.loc[2013].tolist() == [3, 3]
+    assert table.loc[2014, 1] == 4 and np.isnan(table.loc[2014, 2])
+
+
+@pytest.mark.parametrize('days', [1, 3, 7])
+def test_weekly_attention_counts_calendar_days(games, store, matrix, days):
+    tweets = fetch_game_tweets(games, store, at='gameday', query=synthetic.get_ambient_tweets,
+                               before=pd.Timedelta(days=days), after=pd.Timedelta(days=days + 1))
+    per_game = tweets.groupby('game_id').size().reindex(games['game_id'], fill_value=0)
+    expected = games.assign(attention=per_game.to_numpy()).groupby(['season', 'week'])['attention'].sum()
+    table = weekly_attention(matrix, games, days)
+    assert table.stack().astype(np.int64).equals(expected.astype(np.int64))
+
+
+def test_sampled_weekly_is_scaled_with_bounds(games, matrix):
+    full = weekly(matrix, games)
+    sampled = weekly(matrix, games, sample=0.5)
+    assert list(sampled.columns) == ['attention', 'lo', 'hi']
+    assert np.allclose(sampled['attention'], full.stack() / 0.5)
+    assert ((sampled['lo'] <= sampled['attention']) & (sampled['attention'] <= sampled['hi'])).all()
@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from ekthesis.games import load_games
+from ekthesis.winpct import WIN_PCT_PATH, lead_changes, win_pct, win_pct_table
+
+
+@pytest.fixture(scope='module')
+def reference():
+    return pd.read_csv(WIN_PCT_PATH)
+
+
+@pytest.fixture(scope='module')
+def games(reference):
+    games = load_games()
+    return games[games['season'].isin(reference['season'].unique())]
+
+
+def test_win_pct_matches_nfl_r_data(games, reference):
+    ours = win_pct(games).reset_index(drop=True)
+    assert ours['game_id'].tolist() == reference['game_id'].tolist()
+    # The R script divides in another order; the difference stays within a few ulps
+    for column in ['home_win_pct', 'away_win_pct']:
+        np.testing.assert_allclose(ours[column], reference[column], rtol=0, atol=6e-16)
+
+
+def test_win_pct_counts_ties_as_half_and_skips_unplayed():
+    games = pd.DataFrame({
+        'season': 2020, 'game_id': ['g1', 'g2', 'g3', 'g4'],
+        'gameday': pd.to_datetime(['2020-09-10', '2020-09-17', '2020-09-24', '2020-10-01']),
+        'home_team': ['A', 'B', 'A', 'A'], 'away_team': ['B', 'A', 'B', 'B'],
+        'home_score': [20, 10, np.nan, 3], 'away_score': [10, 10, np.nan, 0],
+    })
+    out = win_pct(games).set_index('game_id')
+    assert out.loc['g1', ['home_win_pct', 'away_win_pct']].tolist() == [0.0, 0.0]
+    # A won g1; B is 0-1
+    assert out.loc['g2', ['home_win_pct', 'away_win_pct']].tolist() == [0.0, 1.0]
+    # The g2 tie is half a win for both
+    assert out.loc['g3', ['home_win_pct', 'away_win_pct']].tolist() == [0.75, 0.25]
+    # g3 was not played
+    assert out.loc['g4', ['home_win_pct', 'away_win_pct']].tolist() == [0.75, 0.25]
+
+
+def reference_lead_changes(pbp):
+    """A play-by-play loop as in data_nfl.R"""
+    out = {}
+    for game_id, plays in pbp.sort_values('play_id').groupby('game_id'):
+        previous, changes = None, 0
+        for _, play in plays.iterrows():
+            if pd.isna(play['posteam']):
+                continue
+            leader = np.sign(play['total_home_score'] - play['total_away_score'])
+            if leader == 0:
+                continue
+            if previous is not None and leader != previous:
+                changes += 1
+            previous = leader
+        out[game_id] = changes
+    return pd.Series(out)
+
+
+def synthetic_pbp(seed=0, n_games=30, n_plays=150):
+    rng = np.random.default_rng(seed)
+    frames = []
+    for g in range(n_games):
+        home = np.cumsum(rng.choice([0, 0, 0, 0, 3, 7], n_plays))
+        away = np.cumsum(rng.choice([0, 0, 0, 0, 3, 7], n_plays))
+        posteam = rng.choice(['HOME', 'AWAY', None], n_plays, p=[0.45, 0.45, 0.1])
+        frames.append(pd.DataFrame({
+            'game_id': f'g{g:02d}', 'play_id': rng.permutation(n_plays) * 10 + 1,
+            'posteam': posteam, 'total_home_score': home, 'total_away_score': away,
+        }))
+    pbp = pd.concat(frames, ignore_index=True)
+    # Scores rise with play_id, not row order
+    pbp = pbp.sort_values(['game_id', 'play_id']).reset_index(drop=True)
+    pbp[['total_home_score', 'total_away_score']] = (
+        pbp.groupby('game_id')[['total_home_score', 'total_away_score']].transform(np.sort))
+    return pbp.sample(frac=1, random_state=seed)
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_lead_changes_match_play_loop(seed):
+    pbp = synthetic_pbp(seed)
+    ours = lead_changes(pbp)
+    expected = reference_lead_changes(pbp)
+    assert ours.reindex(expected.index, fill_value=0).tolist() == expected.tolist()
+    assert expected.sum() > 0
+
+
+def test_lead_through_a_tie_is_not_a_change():
+    pbp = pd.DataFrame({'game_id': 'g', 'play_id': [1, 2, 3, 4, 5],
+                        'posteam': ['A', 'B', 'A', None, 'B'],
+                        'total_home_score': [7, 7, 14, 14, 14], 'total_away_score': [0, 7, 7, 21, 21]})
+    assert lead_changes(pbp).to_dict() == {'g': 1}
+
+
+def test_table_has_zero_lead_changes_without_plays(games, reference):
+    pbp = synthetic_pbp(0, n_games=3).assign(
+        game_id=lambda p: p['game_id'].map(dict(zip(['g00', 'g01', 'g02'], reference['game_id'][:3]))))
+    table = win_pct_table(games, pbp)
+    assert list(table.columns) == list(reference.columns)
+    assert table['lead_changes'].iloc[3:].eq(0).all()
+    assert table['lead_changes'].iloc[:3].tolist() == lead_changes(pbp).reindex(table['game_id'][:3]).tolist()